@@ -1,66 +1,553 @@
 """Cache service using Redis"""
-import redis
+import redis.asyncio as redis
+import asyncio
 import json
-from typing import Optional, Any
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, date, timedelta
+from fnmatch import fnmatchcase
+from typing import Optional, Any, Dict, Tuple, Callable, Awaitable, Iterable, List
 from config import settings
+from serializers import PayloadCodec
 import hashlib
 
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Compare-and-delete so a worker only releases a lock it still owns
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Add a key to its tag sets; each set lives as long as its longest-lived
+# member. PTTL/PEXPIRE instead of EXPIRE NX/GT, which need Redis 7
+TAG_KEY_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+for _, tag_key in ipairs(KEYS) do
+    redis.call('sadd', tag_key, ARGV[1])
+    if redis.call('pttl', tag_key) < ttl then
+        redis.call('pexpire', tag_key, ttl)
+    end
+end
+return 0
+"""
+
+_MISSING = object()
+
+TAG_PREFIX = "tag:"
+DELETE_BATCH_SIZE = 500
+
+# Ranges longer than this are tagged by month instead of by day
+MAX_DAY_TAGS = 62
+
+
+def _to_date(value) -> Optional[date]:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def build_tags(filters: Optional[Dict], metrics: Iterable[str] = ()) -> List[str]:
+    """Invalidation tags for an entry computed from the given filters
+    
+    Entries not restricted to some stores or dates get store:all / date:all
+    so that invalidating a single store or day still reaches them.
+    """
+    filters = filters or {}
+    tags = [f"metric:{metric}" for metric in metrics]
+    
+    store_ids = filters.get('store_ids')
+    tags += [f"store:{store_id}" for store_id in store_ids] if store_ids else ["store:all"]
+    
+    date_range = filters.get('date_range') or {}
+    start = _to_date(date_range.get('start_date'))
+    end = _to_date(date_range.get('end_date'))
+    if not start or not end:
+        tags.append("date:all")
+    elif (end - start).days <= MAX_DAY_TAGS:
+        tags += [f"date:{start + timedelta(days=i)}" for i in range((end - start).days + 1)]
+    else:
+        month = start.replace(day=1)
+        while month <= end:
+            tags.append(f"month:{month:%Y-%m}")
+            month = (month + timedelta(days=32)).replace(day=1)
+    return tags
+
+
+class LocalCache:
+    """Size-bounded in-process LRU cache with per-entry TTL"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+    
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+    
+    def set(self, key: str, value: Any, ttl: int):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def delete(self, key: str):
+        self.entries.pop(key, None)
+    
+    def delete_pattern(self, pattern: str) -> int:
+        keys = [key for key in self.entries if fnmatchcase(key, pattern)]
+        for key in keys:
+            del self.entries[key]
+        return len(keys)
+
 
 class CacheService:
-    """Service for caching query results"""
+    """Service for caching query results
+    
+    Reads go through an in-process LRU of decoded objects before Redis.
+    Writes and deletes are broadcast on a pub/sub channel so every worker
+    evicts its local copy; local entries also expire after
+    settings.local_cache_ttl to bound staleness if a message is missed.
+    """
     
     def __init__(self):
-        self.redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+        self.redis_client = redis.from_url(settings.redis_url)
         self.default_ttl = 300  # 5 minutes
+        self.codec = PayloadCodec(
+            settings.cache_serializer,
+            settings.cache_compression,
+            settings.cache_compress_min_bytes
+        )
+        self.local = LocalCache(settings.local_cache_max_entries)
+        self.instance_id = uuid.uuid4().hex
+        self.stats = {
+            'local': {'hits': 0, 'misses': 0},
+            'redis': {'hits': 0, 'misses': 0},
+            'refreshes': {'computed': 0, 'skipped': 0, 'failed': 0}
+        }
+        self._listener: Optional[asyncio.Task] = None
+        # Loads callers wait on, and background refreshes of stale entries
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
     
-    def get(self, key: str) -> Optional[Any]:
+    async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
+        hit, value = self.local.get(key)
+        if hit:
+            self.stats['local']['hits'] += 1
+            return value
+        self.stats['local']['misses'] += 1
+        
         try:
-            value = self.redis_client.get(key)
-            if value:
-                return json.loads(value)
+            raw, ttl = await self._get_with_ttl(key)
+            if raw:
+                self.stats['redis']['hits'] += 1
+                value = self.codec.decode(raw)
+                self._set_local(key, value, ttl)
+                return value
+            self.stats['redis']['misses'] += 1
             return None
         except Exception as e:
             print(f"Cache get error: {e}")
             return None
     
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        """Set value in cache"""
+    async def peek(self, key: str) -> Optional[Any]:
+        """Get value from cache without counting a hit or miss"""
+        hit, value = self.local.get(key)
+        if hit:
+            return value
+        try:
+            raw = await self.redis_client.get(key)
+            return self.codec.decode(raw) if raw else None
+        except Exception as e:
+            print(f"Cache peek error: {e}")
+            return None
+    
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get several values, reading local misses from Redis in one round trip"""
+        values = {}
+        missing = []
+        for key in keys:
+            hit, value = self.local.get(key)
+            if hit:
+                self.stats['local']['hits'] += 1
+                values[key] = value
+            else:
+                self.stats['local']['misses'] += 1
+                missing.append(key)
+        if not missing:
+            return values
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.mget(missing)
+                for key in missing:
+                    pipe.ttl(key)
+                raws, *ttls = await pipe.execute()
+            for key, raw, ttl in zip(missing, raws, ttls):
+                if raw:
+                    self.stats['redis']['hits'] += 1
+                    value = self.codec.decode(raw)
+                    self._set_local(key, value, ttl)
+                    values[key] = value
+                else:
+                    self.stats['redis']['misses'] += 1
+        except Exception as e:
+            print(f"Cache get many error: {e}")
+        return values
+    
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> bool:
+        """Set value in cache, registering the key under the given tags"""
         try:
             ttl = ttl or self.default_ttl
-            serialized = json.dumps(value, default=str)
-            self.redis_client.setex(key, ttl, serialized)
+            serialized = self.codec.encode(value)
+            tag_keys = [TAG_PREFIX + tag for tag in tags or ()]
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, serialized)
+                if tag_keys:
+                    pipe.eval(TAG_KEY_SCRIPT, len(tag_keys), *tag_keys, key, ttl * 1000)
+                await pipe.execute()
+            # Keep the round-trip so local hits match what Redis returns
+            self._set_local(key, self.codec.decode(serialized), ttl)
+            await self._publish({'keys': [key]})
             return True
         except Exception as e:
             print(f"Cache set error: {e}")
             return False
     
-    def delete(self, key: str) -> bool:
+    async def delete(self, key: str) -> bool:
         """Delete key from cache"""
         try:
-            self.redis_client.delete(key)
+            self.local.delete(key)
+            await self.redis_client.delete(key)
+            await self._publish({'keys': [key]})
             return True
         except Exception as e:
             print(f"Cache delete error: {e}")
             return False
     
-    def clear_pattern(self, pattern: str) -> int:
-        """Clear all keys matching pattern"""
+    async def clear_pattern(self, pattern: str) -> int:
+        """Clear all keys matching pattern, scanning in batches"""
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return self.redis_client.delete(*keys)
-            return 0
+            self.local.delete_pattern(pattern)
+            await self._publish({'pattern': pattern})
+            return await self._unlink_batches(
+                self.redis_client.scan_iter(match=pattern, count=DELETE_BATCH_SIZE)
+            )
         except Exception as e:
             print(f"Cache clear pattern error: {e}")
             return 0
     
+    async def invalidate_tags(self, tags: Iterable[str], match_all: bool = False) -> int:
+        """Delete entries registered under any (or, with match_all, every) tag"""
+        tag_keys = [TAG_PREFIX + tag for tag in tags]
+        if not tag_keys:
+            return 0
+        try:
+            if match_all:
+                keys = await self.redis_client.sinter(tag_keys)
+            else:
+                keys = set()
+                for tag_key in tag_keys:
+                    async for key in self.redis_client.sscan_iter(tag_key, count=DELETE_BATCH_SIZE):
+                        keys.add(key)
+            keys = [key.decode() if isinstance(key, bytes) else key for key in keys]
+            for key in keys:
+                self.local.delete(key)
+            if keys:
+                await self._publish({'keys': keys})
+            count = await self._unlink_batches(keys)
+            if not match_all:
+                await self.redis_client.unlink(*tag_keys)
+            return count
+        except Exception as e:
+            print(f"Cache invalidate tags error: {e}")
+            return 0
+    
+    async def invalidate_sales(self, store_id: int, day: date) -> int:
+        """Invalidate entries that may include sales of one store on one day"""
+        count = 0
+        for store_tag in (f"store:{store_id}", "store:all"):
+            for date_tag in (f"date:{day}", f"month:{day:%Y-%m}", "date:all"):
+                count += await self.invalidate_tags([store_tag, date_tag], match_all=True)
+        return count
+    
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> Any:
+        """Get value from cache, computing it at most once across workers
+        
+        Entries stay fresh for ttl seconds and are then served stale for up
+        to stale_ttl more while a single worker refreshes them in the
+        background. On a miss, concurrent callers in this process share one
+        computation and other processes wait on a Redis lock for its result.
+        """
+        value, task = self._resolve(key, await self.get(key), compute, ttl, stale_ttl, tags)
+        if task is None:
+            return value
+        # Shielded so one cancelled request does not abort the shared load
+        return await asyncio.shield(task)
+    
+    async def refresh(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> str:
+        """Recompute an entry now, unless this or another worker is already loading it
+        
+        Returns 'computed' when the entry was recomputed and stored, 'skipped'
+        when a load was already in progress here or held the lock elsewhere,
+        and 'failed' when computing or storing it raised.
+        """
+        ttl = ttl or self.default_ttl
+        stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        running = self._inflight.get(key) or self._refreshing.get(key)
+        if running is not None:
+            await asyncio.wait([running])
+            return 'skipped'
+        return await asyncio.shield(self._start_refresh(key, compute, ttl, stale_ttl, tags))
+    
+    async def get_or_compute_many(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        """get_or_compute for several entries with a single multi-key cache read
+        
+        Each request holds get_or_compute's keyword arguments. Misses load
+        concurrently; a failed load is returned in its place as the exception.
+        """
+        entries = await self.get_many([request['key'] for request in requests])
+        
+        results = []
+        pending = {}
+        for index, request in enumerate(requests):
+            value, task = self._resolve(
+                request['key'], entries.get(request['key']), request['compute'],
+                request.get('ttl'), request.get('stale_ttl'), request.get('tags')
+            )
+            results.append(value)
+            if task is not None:
+                pending[index] = task
+        
+        loaded = await asyncio.gather(*(asyncio.shield(task) for task in pending.values()), return_exceptions=True)
+        for index, value in zip(pending, loaded):
+            results[index] = value
+        return results
+    
     def generate_cache_key(self, prefix: str, params: dict) -> str:
         """Generate cache key from parameters"""
         # Sort dict for consistent hashing
         param_str = json.dumps(params, sort_keys=True, default=str)
         param_hash = hashlib.md5(param_str.encode()).hexdigest()
         return f"{prefix}:{param_hash}"
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per tier and background refresh outcomes"""
+        return {
+            **{tier: dict(counters) for tier, counters in self.stats.items()},
+            'local_entries': len(self.local.entries)
+        }
+    
+    async def start(self):
+        """Start listening for invalidations from other workers"""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+    
+    def _resolve(self, key, entry, compute, ttl, stale_ttl, tags) -> Tuple[Any, Optional[asyncio.Task]]:
+        """Value of a cached envelope, refreshed in the background once stale, or the task loading it"""
+        ttl = ttl or self.default_ttl
+        stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        
+        if isinstance(entry, dict) and 'fresh_until' in entry:
+            if entry['fresh_until'] <= time.time() and key not in self._inflight and key not in self._refreshing:
+                self._start_refresh(key, compute, ttl, stale_ttl, tags)
+            return entry['value'], None
+        
+        # A background refresh may return nothing, so callers never share one
+        return None, self._inflight.get(key) or self._start_load(key, compute, ttl, stale_ttl, tags)
+    
+    def _start_load(self, key, compute, ttl, stale_ttl, tags) -> asyncio.Task:
+        task = asyncio.create_task(self._load(key, compute, ttl, stale_ttl, tags))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+    
+    def _start_refresh(self, key, compute, ttl, stale_ttl, tags) -> asyncio.Task:
+        task = asyncio.create_task(self._refresh(key, compute, ttl, stale_ttl, tags))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+    
+    async def _load(self, key, compute, ttl, stale_ttl, tags) -> Any:
+        """Value of a missing entry, computed here or by the worker holding its lock"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        acquired = await self._acquire_lock(lock_key, token)
+        
+        if not acquired:
+            value = await self._wait_for_entry(key, lock_key)
+            if value is not _MISSING:
+                return value
+        
+        try:
+            value = await compute()
+            await self._store(key, value, ttl, stale_ttl, tags)
+            return value
+        finally:
+            if acquired:
+                await self._release_lock(lock_key, token)
+    
+    async def _refresh(self, key, compute, ttl, stale_ttl, tags) -> str:
+        """Recompute an entry in the background; returns and counts the outcome"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        if not await self._acquire_lock(lock_key, token):
+            # Another worker is already refreshing this entry
+            outcome = 'skipped'
+        else:
+            try:
+                value = await compute()
+                outcome = 'computed' if await self._store(key, value, ttl, stale_ttl, tags) else 'failed'
+            except Exception as e:
+                print(f"Cache refresh error: {e}")
+                outcome = 'failed'
+            finally:
+                await self._release_lock(lock_key, token)
+        self.stats['refreshes'][outcome] += 1
+        return outcome
+    
+    async def _store(self, key, value, ttl, stale_ttl, tags) -> bool:
+        return await self.set(key, {
+            'value': value,
+            'fresh_until': time.time() + ttl
+        }, ttl=ttl + stale_ttl, tags=tags)
+    
+    async def _acquire_lock(self, lock_key: str, token: str) -> bool:
+        try:
+            return bool(await self.redis_client.set(
+                lock_key, token, nx=True, px=settings.cache_lock_timeout * 1000
+            ))
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            # Without Redis there is nobody to coordinate with
+            return True
+    
+    async def _release_lock(self, lock_key: str, token: str):
+        try:
+            await self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+        except Exception as e:
+            print(f"Cache unlock error: {e}")
+    
+    async def _wait_for_entry(self, key: str, lock_key: str) -> Any:
+        """Poll for the value another worker is computing"""
+        deadline = time.monotonic() + settings.cache_lock_timeout
+        delay = 0.05
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            entry = await self.get(key)
+            if isinstance(entry, dict) and 'fresh_until' in entry:
+                return entry['value']
+            try:
+                if not await self.redis_client.exists(lock_key):
+                    break
+            except Exception:
+                break
+        return _MISSING
+    
+    async def _unlink_batches(self, keys) -> int:
+        """UNLINK keys in fixed-size batches; accepts a list or async iterator"""
+        count = 0
+        batch = []
+        
+        async def flush():
+            nonlocal count, batch
+            if batch:
+                count += await self.redis_client.unlink(*batch)
+                batch = []
+        
+        if hasattr(keys, '__aiter__'):
+            async for key in keys:
+                batch.append(key)
+                if len(batch) >= DELETE_BATCH_SIZE:
+                    await flush()
+        else:
+            for key in keys:
+                batch.append(key)
+                if len(batch) >= DELETE_BATCH_SIZE:
+                    await flush()
+        await flush()
+        return count
+    
+    async def _get_with_ttl(self, key: str) -> Tuple[Optional[bytes], int]:
+        async with self.redis_client.pipeline(transaction=False) as pipe:
+            raw, ttl = await pipe.get(key).ttl(key).execute()
+        return raw, ttl
+    
+    def _set_local(self, key: str, value: Any, ttl: int):
+        local_ttl = min(ttl, settings.local_cache_ttl) if ttl and ttl > 0 else settings.local_cache_ttl
+        if local_ttl > 0:
+            self.local.set(key, value, local_ttl)
+    
+    async def _publish(self, message: Dict[str, Any]):
+        await self.redis_client.publish(
+            INVALIDATION_CHANNEL,
+            json.dumps({**message, 'origin': self.instance_id})
+        )
+    
+    def _apply_invalidation(self, message: Dict[str, Any]):
+        if message.get('origin') == self.instance_id:
+            return
+        for key in message.get('keys', []):
+            self.local.delete(key)
+        if message.get('pattern'):
+            self.local.delete_pattern(message['pattern'])
+    
+    async def _listen(self):
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._apply_invalidation(json.loads(message['data']))
+            except asyncio.CancelledError:
+                await pubsub.reset()
+                raise
+            except Exception as e:
+                print(f"Cache invalidation listener error: {e}")
+                # Anything may have changed while disconnected
+                self.local.entries.clear()
+                await pubsub.reset()
+                await asyncio.sleep(1)
 
 
 # Global cache instance
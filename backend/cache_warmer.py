@@ -0,0 +1,110 @@
+"""Background recomputation of popular cache entries before they expire"""
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import time
+
+from config import settings
+from cache_service import cache_service
+
+# Request scores are multiplied by this once per warm-up cycle
+SCORE_DECAY = 0.9
+
+
+class CacheWarmer:
+    """Learns popular queries from request counts and keeps them fresh
+    
+    Endpoints report each request with a stable name and a function that
+    builds its cache plan (key, compute, ttl, tags). The plan is rebuilt on
+    every cycle, so queries over the default range follow it when it moves
+    to the next hour instead of warming a key nobody will ask for again.
+    Entries of the most requested plans are recomputed once they are within
+    cache_warm_margin seconds of going stale, or if they are missing.
+    """
+    
+    def __init__(self):
+        self.tracked: Dict[str, Dict[str, Any]] = {}
+        self.stats = {'cycles': 0, 'warmed': 0, 'skipped': 0, 'errors': 0}
+        self._task: Optional[asyncio.Task] = None
+    
+    def track(self, name: str, build_plan: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Count a request for name and return its current plan"""
+        entry = self.tracked.get(name)
+        if entry is None:
+            if len(self.tracked) >= settings.cache_warm_max_tracked:
+                coldest = min(self.tracked, key=lambda n: self.tracked[n]['score'])
+                del self.tracked[coldest]
+            entry = self.tracked[name] = {'score': 0.0, 'requests': 0}
+        entry['score'] += 1
+        entry['requests'] += 1
+        entry['build_plan'] = build_plan
+        entry['last_request'] = time.time()
+        return build_plan()
+    
+    def popular(self) -> List[str]:
+        """Names worth keeping warm, most requested first"""
+        names = [n for n, e in self.tracked.items() if e['score'] >= settings.cache_warm_min_score]
+        names.sort(key=lambda n: self.tracked[n]['score'], reverse=True)
+        return names[:settings.cache_warm_max_keys]
+    
+    async def warm(self) -> int:
+        """Refresh popular entries close to expiry; returns how many were recomputed"""
+        warmed = 0
+        for name in self.popular():
+            plan = self.tracked[name]['build_plan']()
+            entry = await cache_service.peek(plan['key'])
+            fresh_until = entry.get('fresh_until', 0) if isinstance(entry, dict) else 0
+            if fresh_until - time.time() > settings.cache_warm_margin:
+                continue
+            try:
+                # One at a time, so warming never competes with traffic for the whole pool
+                outcome = await cache_service.refresh(**plan)
+            except Exception as e:
+                outcome = 'failed'
+                print(f"Cache warm error for {name}: {e}")
+            # Skipped entries are already being loaded here or by another worker
+            if outcome == 'computed':
+                warmed += 1
+            elif outcome == 'skipped':
+                self.stats['skipped'] += 1
+            else:
+                self.stats['errors'] += 1
+        
+        for name in list(self.tracked):
+            self.tracked[name]['score'] *= SCORE_DECAY
+            if self.tracked[name]['score'] < 0.01:
+                del self.tracked[name]
+        self.stats['cycles'] += 1
+        self.stats['warmed'] += warmed
+        return warmed
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'tracked': len(self.tracked),
+            'popular': [
+                {'name': n, 'score': round(self.tracked[n]['score'], 2), 'requests': self.tracked[n]['requests']}
+                for n in self.popular()
+            ]
+        }
+    
+    async def start(self):
+        """Start the warm-up loop on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(settings.cache_warm_interval)
+            try:
+                await self.warm()
+            except Exception as e:
+                print(f"Cache warm-up error: {e}")
+
+
+# Global cache warmer instance
+cache_warmer = CacheWarmer()
@@ -0,0 +1,294 @@
+"""In-process columnar copy of recent sales for vectorized aggregations"""
+from sqlalchemy import func, select, or_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+from database import SessionLocal
+from rollup_service import SALES_LOADED
+import models
+
+COLUMNS = ['id', 'created_at', 'store_id', 'channel_id', 'status', 'total_amount', 'total_discount']
+
+DTYPES = {
+    'id': np.int64,
+    'created_at': np.int64,  # naive timestamps as microseconds, so // HOUR % 24 is the local hour
+    'store_id': np.int32,
+    'channel_id': np.int32,
+    'status': np.int16,
+    'total_amount': np.float64,
+    'total_discount': np.float64
+}
+
+EPOCH = datetime(1970, 1, 1)
+HOUR = 3600 * 10**6
+DAY = 24 * HOUR
+
+# Microseconds per time bucket that maps directly onto epoch microseconds
+BUCKET_SIZES = {'hour': HOUR, 'day': DAY}
+
+
+def to_epoch(value: datetime) -> int:
+    """Microseconds since 1970-01-01, so range bounds compare exactly with created_at"""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_epoch(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=DTYPES[name]) for name in COLUMNS}
+
+
+class ColumnarView:
+    """Completed sales matching a filter, ready for grouped sums"""
+    
+    def __init__(self, created_at: np.ndarray, keys: Dict[str, np.ndarray], amount: np.ndarray, discount: np.ndarray):
+        self.created_at = created_at
+        self.keys = keys
+        self.amount = amount
+        self.discount = discount
+    
+    def totals(self) -> Dict[str, float]:
+        return {
+            'sales_count': len(self.amount),
+            'revenue': float(self.amount.sum()),
+            'total_discount': float(self.discount.sum())
+        }
+    
+    def group(self, key: str) -> List[Dict[str, Any]]:
+        """Sum by store_id, channel_id or hour with np.bincount"""
+        if key == 'hour':
+            codes = (self.created_at // HOUR) % 24
+        else:
+            codes = self.keys[key]
+        if len(codes) == 0:
+            return []
+        
+        counts = np.bincount(codes)
+        revenue = np.bincount(codes, weights=self.amount)
+        discount = np.bincount(codes, weights=self.discount)
+        return [
+            {key: int(k), 'sales_count': int(counts[k]), 'revenue': float(revenue[k]), 'total_discount': float(discount[k])}
+            for k in np.flatnonzero(counts)
+        ]
+    
+    def buckets(self, time_bucket: str) -> List[Dict[str, Any]]:
+        """Sum by time bucket with np.add.reduceat (rows are sorted by created_at)"""
+        if time_bucket == 'week':
+            days = self.created_at // DAY
+            codes = days - (days + 3) % 7  # back to Monday; 1970-01-01 was a Thursday
+            size = DAY
+        else:
+            size = BUCKET_SIZES[time_bucket]
+            codes = self.created_at // size
+        if len(codes) == 0:
+            return []
+        
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+        counts = np.diff(np.append(starts, len(codes)))
+        revenue = np.add.reduceat(self.amount, starts)
+        discount = np.add.reduceat(self.discount, starts)
+        return [
+            {
+                'period': from_epoch(codes[start] * size),
+                'sales_count': int(count),
+                'revenue': float(rev),
+                'total_discount': float(disc)
+            }
+            for start, count, rev, disc in zip(starts, counts, revenue, discount)
+        ]
+
+
+class ColumnarStore:
+    """Recent sales as NumPy columns sorted by created_at
+    
+    Refreshed from Postgres by an id high-water mark: new ids are appended
+    and the lookback window is reloaded to pick up status changes, like the
+    hourly rollups. Readers take a snapshot of the columns together with
+    that mark and add the sales above it from Postgres (see view), so new
+    sales are never missing between refreshes. Only ranges that start
+    inside the loaded window are answered; everything else falls back to SQL.
+    The window is loaded again from scratch after a bulk load (SALES_LOADED).
+    """
+    
+    def __init__(self, days: Optional[int] = None):
+        self.days = days or settings.columnar_days
+        # (columns, high-water id they include), swapped as one by refresh
+        self.snapshot: Tuple[Dict[str, np.ndarray], int] = (_empty(), 0)
+        self.window_start: Optional[int] = None
+        self.refreshed_at: Optional[float] = None
+        # Database time the window was last loaded from scratch
+        self.loaded_at: Optional[datetime] = None
+        self.status_codes: Dict[str, int] = {}
+    
+    @property
+    def data(self) -> Dict[str, np.ndarray]:
+        return self.snapshot[0]
+    
+    @property
+    def last_id(self) -> int:
+        return self.snapshot[1]
+    
+    def covers(self, start: Optional[datetime]) -> bool:
+        """Whether a range starting at start can be answered from memory"""
+        if not settings.columnar_enabled or self.window_start is None or self.refreshed_at is None:
+            return False
+        if time.monotonic() - self.refreshed_at > 2 * settings.columnar_refresh_interval:
+            return False
+        return start is not None and to_epoch(start) >= self.window_start
+    
+    def view(
+        self,
+        filters: Optional[Dict],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        data: Optional[Dict[str, np.ndarray]] = None,
+        recent: Sequence = ()
+    ) -> ColumnarView:
+        """Completed sales matching filters, as masked column slices
+        
+        data is the columns of a snapshot, recent the matching completed sales
+        above its high-water mark as (created_at, store_id, channel_id,
+        total_amount, total_discount) rows read from Postgres.
+        """
+        filters = filters or {}
+        if data is None:
+            data = self.data
+        
+        created_at = data['created_at']
+        lo = np.searchsorted(created_at, to_epoch(start), 'left') if start else 0
+        hi = np.searchsorted(created_at, to_epoch(end), 'right') if end else len(created_at)
+        
+        rows = slice(lo, hi)
+        mask = data['status'][rows] == self.status_codes.get('COMPLETED', -1)
+        if filters.get('status'):
+            mask &= data['status'][rows] == self.status_codes.get(filters['status'], -1)
+        if filters.get('store_ids'):
+            mask &= np.isin(data['store_id'][rows], filters['store_ids'])
+        if filters.get('channel_ids'):
+            mask &= np.isin(data['channel_id'][rows], filters['channel_ids'])
+        
+        columns = {
+            'created_at': created_at[rows][mask],
+            'store_id': data['store_id'][rows][mask],
+            'channel_id': data['channel_id'][rows][mask],
+            'total_amount': data['total_amount'][rows][mask],
+            'total_discount': data['total_discount'][rows][mask]
+        }
+        if recent:
+            columns = self._merge_recent(columns, recent)
+        
+        return ColumnarView(
+            columns['created_at'],
+            {'store_id': columns['store_id'], 'channel_id': columns['channel_id']},
+            columns['total_amount'],
+            columns['total_discount']
+        )
+    
+    def _merge_recent(self, columns: Dict[str, np.ndarray], recent: Sequence) -> Dict[str, np.ndarray]:
+        """Add rows newer than the snapshot, keeping created_at order"""
+        names = ['created_at', 'store_id', 'channel_id', 'total_amount', 'total_discount']
+        extra = {
+            'created_at': np.fromiter((to_epoch(r[0]) for r in recent), DTYPES['created_at'], len(recent)),
+            'store_id': np.fromiter((r[1] for r in recent), DTYPES['store_id'], len(recent)),
+            'channel_id': np.fromiter((r[2] for r in recent), DTYPES['channel_id'], len(recent)),
+            'total_amount': np.fromiter((r[3] or 0 for r in recent), DTYPES['total_amount'], len(recent)),
+            'total_discount': np.fromiter((r[4] or 0 for r in recent), DTYPES['total_discount'], len(recent))
+        }
+        merged = {name: np.concatenate((columns[name], extra[name])) for name in names}
+        order = np.argsort(merged['created_at'], kind='stable')
+        return {name: merged[name][order] for name in names}
+    
+    def refresh(self, db: Session, lookback_hours: Optional[int] = None) -> Dict[str, Any]:
+        """Append new sales and reload the lookback window"""
+        if lookback_hours is None:
+            lookback_hours = settings.columnar_lookback_hours
+        
+        now = datetime.now()
+        window_start = (now - timedelta(days=self.days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        lookback_start = max(window_start, now - timedelta(hours=lookback_hours))
+        loaded = db.get(models.RollupState, SALES_LOADED)
+        first_load = self.window_start is None or (
+            loaded is not None and (self.loaded_at is None or loaded.refreshed_at >= self.loaded_at)
+        )
+        current, last_id = self.snapshot
+        if first_load:
+            current, last_id = _empty(), 0
+            self.loaded_at = db.execute(select(func.localtimestamp())).scalar()
+        
+        sale = models.Sale
+        query = select(
+            sale.id, sale.created_at, sale.store_id, sale.channel_id,
+            sale.sale_status_desc, sale.total_amount, sale.total_discount
+        ).where(sale.created_at >= window_start)
+        if not first_load:
+            query = query.where(or_(sale.id > last_id, sale.created_at >= lookback_start))
+        rows = db.execute(query).all()
+        
+        for row in rows:
+            if row.sale_status_desc not in self.status_codes:
+                self.status_codes[row.sale_status_desc] = len(self.status_codes)
+        
+        fetched = {
+            'id': np.fromiter((r.id for r in rows), DTYPES['id'], len(rows)),
+            'created_at': np.fromiter((to_epoch(r.created_at) for r in rows), DTYPES['created_at'], len(rows)),
+            'store_id': np.fromiter((r.store_id for r in rows), DTYPES['store_id'], len(rows)),
+            'channel_id': np.fromiter((r.channel_id for r in rows), DTYPES['channel_id'], len(rows)),
+            'status': np.fromiter((self.status_codes[r.sale_status_desc] for r in rows), DTYPES['status'], len(rows)),
+            'total_amount': np.fromiter((r.total_amount or 0 for r in rows), DTYPES['total_amount'], len(rows)),
+            'total_discount': np.fromiter((r.total_discount or 0 for r in rows), DTYPES['total_discount'], len(rows))
+        }
+        
+        # Keep loaded rows inside the window but outside the reloaded lookback
+        keep = (current['created_at'] >= to_epoch(window_start)) & (current['created_at'] < to_epoch(lookback_start))
+        if not first_load:
+            keep &= ~np.isin(current['id'], fetched['id'])
+        merged = {name: np.concatenate((current[name][keep], fetched[name])) for name in COLUMNS}
+        order = np.argsort(merged['created_at'], kind='stable')
+        
+        if len(fetched['id']):
+            last_id = max(last_id, int(fetched['id'].max()))
+        self.snapshot = ({name: merged[name][order] for name in COLUMNS}, last_id)
+        self.window_start = to_epoch(window_start)
+        self.refreshed_at = time.monotonic()
+        
+        return {'rows': len(order), 'fetched': len(rows), 'last_id': last_id}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': settings.columnar_enabled,
+            'rows': len(self.data['id']),
+            'bytes': sum(array.nbytes for array in self.data.values()),
+            'window_start': from_epoch(self.window_start).isoformat() if self.window_start is not None else None,
+            'last_id': self.last_id
+        }
+    
+    def start_refresh_loop(self, interval: Optional[int] = None) -> threading.Thread:
+        """Refresh periodically in a daemon thread"""
+        interval = interval or settings.columnar_refresh_interval
+        
+        def loop():
+            while True:
+                db = SessionLocal()
+                try:
+                    self.refresh(db)
+                except Exception as e:
+                    print(f"Columnar store refresh error: {e}")
+                finally:
+                    db.close()
+                time.sleep(interval)
+        
+        thread = threading.Thread(target=loop, name="columnar-refresh", daemon=True)
+        thread.start()
+        return thread
+
+
+# Global columnar store instance
+columnar_store = ColumnarStore()
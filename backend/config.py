@@ -8,6 +8,68 @@ class Settings(BaseSettings):
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379")
     cors_origins: str = os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:5173")
     
+    # Hourly sales rollups
+    rollup_enabled: bool = os.getenv("ROLLUP_ENABLED", "true").lower() == "true"
+    rollup_refresh_interval: int = int(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))  # seconds
+    rollup_lookback_hours: int = int(os.getenv("ROLLUP_LOOKBACK_HOURS", "2"))
+    
+    # In-process cache tier in front of Redis
+    local_cache_max_entries: int = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "1024"))
+    local_cache_ttl: int = int(os.getenv("LOCAL_CACHE_TTL", "60"))  # seconds, caps Redis TTL
+    
+    # Cached payload encoding
+    cache_serializer: str = os.getenv("CACHE_SERIALIZER", "orjson")  # json, orjson, msgpack
+    cache_compression: str = os.getenv("CACHE_COMPRESSION", "zlib")  # none, zlib, lz4
+    cache_compress_min_bytes: int = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+    
+    # Stampede protection
+    cache_stale_ttl: int = int(os.getenv("CACHE_STALE_TTL", "300"))  # seconds stale entries may be served
+    cache_lock_timeout: int = int(os.getenv("CACHE_LOCK_TIMEOUT", "30"))  # seconds
+    
+    # Warm-up of popular cache entries
+    cache_warm_enabled: bool = os.getenv("CACHE_WARM_ENABLED", "true").lower() == "true"
+    cache_warm_interval: int = int(os.getenv("CACHE_WARM_INTERVAL", "30"))  # seconds between cycles
+    cache_warm_margin: int = int(os.getenv("CACHE_WARM_MARGIN", "60"))  # seconds before going stale
+    cache_warm_max_keys: int = int(os.getenv("CACHE_WARM_MAX_KEYS", "20"))
+    cache_warm_min_score: float = float(os.getenv("CACHE_WARM_MIN_SCORE", "3"))  # decayed request count
+    cache_warm_max_tracked: int = int(os.getenv("CACHE_WARM_MAX_TRACKED", "1000"))
+    
+    # Dimension cache (stores, channels, products, categories)
+    dimension_cache_check_interval: int = int(os.getenv("DIMENSION_CACHE_CHECK_INTERVAL", "30"))  # seconds
+    
+    # Monthly partitions of sales and child tables
+    partition_months_ahead: int = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    partition_retention_months: int = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))  # 0 keeps all history
+    partition_drop_detached: bool = os.getenv("PARTITION_DROP_DETACHED", "false").lower() == "true"
+    partition_maintenance_interval: int = int(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "86400"))  # seconds
+    
+    # In-process columnar store of recent sales
+    columnar_enabled: bool = os.getenv("COLUMNAR_ENABLED", "true").lower() == "true"
+    columnar_days: int = int(os.getenv("COLUMNAR_DAYS", "35"))
+    columnar_refresh_interval: int = int(os.getenv("COLUMNAR_REFRESH_INTERVAL", "30"))  # seconds
+    columnar_lookback_hours: int = int(os.getenv("COLUMNAR_LOOKBACK_HOURS", "2"))
+    
+    # Daily per-store and per-channel materialized views (built from the hourly rollups)
+    daily_views_enabled: bool = os.getenv("DAILY_VIEWS_ENABLED", "true").lower() == "true"
+    daily_views_refresh_interval: int = int(os.getenv("DAILY_VIEWS_REFRESH_INTERVAL", "300"))  # seconds
+    
+    # Approximate query mode (TABLESAMPLE BERNOULLI)
+    approximate_sample_percent: float = float(os.getenv("APPROXIMATE_SAMPLE_PERCENT", "5"))
+    approximate_min_sample_rows: int = int(os.getenv("APPROXIMATE_MIN_SAMPLE_ROWS", "30"))  # fewer sampled sales: no margin
+    
+    # Streaming exports
+    export_chunk_size: int = int(os.getenv("EXPORT_CHUNK_SIZE", "10000"))  # rows per server-side cursor fetch
+    
+    # Slow-query log
+    slow_query_threshold_ms: int = int(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))  # per QueryService call
+    slow_query_sample_rate: float = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.1"))  # share of slow calls explained
+    slow_query_log_size: int = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+    slow_query_explain_timeout: int = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT", "30"))  # seconds
+    
+    @property
+    def async_database_url(self) -> str:
+        return self.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    
     @property
     def cors_origins_list(self) -> list[str]:
         return [origin.strip() for origin in self.cors_origins.split(",")]
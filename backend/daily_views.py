@@ -0,0 +1,122 @@
+"""Daily per-store and per-channel materialized views with concurrent refresh"""
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+import threading
+import time
+
+from config import settings
+from database import engine, SessionLocal
+from rollup_service import RollupService, SALES_HOURLY, DAILY_VIEWS, REFRESH_LOCK_ID
+import models
+
+# In the DAILY_VIEWS rollup_state row, refreshed_at truncated to the day is
+# the cutoff (only earlier days are materialized) and last_id the
+# sales_hourly high-water mark the views were built from
+
+# Materialized view -> grouping column
+VIEWS = {
+    models.SalesDailyStore.__table__.name: 'store_id',
+    models.SalesDailyChannel.__table__.name: 'channel_id'
+}
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_day(value: datetime) -> datetime:
+    floored = floor_day(value)
+    return floored if floored == value else floored + timedelta(days=1)
+
+
+def view_ddl(name: str, key: str) -> str:
+    """CREATE statements of one view and the unique index REFRESH CONCURRENTLY needs"""
+    return f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS
+        SELECT
+            bucket::date AS day,
+            {key},
+            sum(sales_count) AS sales_count,
+            sum(revenue) AS revenue,
+            sum(total_discount) AS total_discount
+        FROM sales_hourly_rollup
+        WHERE sale_status_desc = 'COMPLETED'
+          AND bucket < (SELECT date_trunc('day', refreshed_at) FROM rollup_state WHERE name = '{DAILY_VIEWS}')
+        GROUP BY bucket::date, {key};
+        CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} (day, {key});
+    """
+
+
+def ensure_views():
+    """Create the views (empty until the first refresh) on databases initialized before they existed"""
+    with engine.begin() as conn:
+        for name, key in VIEWS.items():
+            conn.execute(text(view_ddl(name, key)))
+
+
+class DailyViewService:
+    """Refreshes the daily views from sales_hourly_rollup
+    
+    Runs under the rollup advisory lock, so the sales_hourly high-water mark
+    copied into the views' state row is exactly the one they aggregate.
+    QueryService adds raw sales from the cutoff day on and above that mark.
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def refresh(self) -> Dict[str, Any]:
+        """Advance the cutoff to today and refresh every view concurrently"""
+        started = time.monotonic()
+        self.db.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_ID)))
+        # After a bulk load the views are rebuilt from emptied rollups plus raw sales
+        RollupService(self.db).reset_if_loaded()
+        
+        rollup_state = self.db.get(models.RollupState, SALES_HOURLY)
+        state = self.db.get(models.RollupState, DAILY_VIEWS)
+        if state is None:
+            state = models.RollupState(name=DAILY_VIEWS, last_id=0)
+            self.db.add(state)
+        state.last_id = rollup_state.last_id if rollup_state else 0
+        state.refreshed_at = self.db.execute(select(func.localtimestamp())).scalar()
+        self.db.flush()
+        result = {
+            'last_id': state.last_id,
+            'cutoff': floor_day(state.refreshed_at),
+            'refreshed_at': state.refreshed_at
+        }
+        
+        # Readers keep seeing the previous contents until commit
+        for name in VIEWS:
+            self.db.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+        self.db.commit()
+        
+        return {**result, 'seconds': round(time.monotonic() - started, 3)}
+
+
+def refresh_daily_views() -> Dict[str, Any]:
+    """Refresh the daily views on a dedicated session"""
+    db = SessionLocal()
+    try:
+        return DailyViewService(db).refresh()
+    finally:
+        db.close()
+
+
+def start_view_refresh_loop(interval: Optional[int] = None) -> threading.Thread:
+    """Refresh the daily views periodically in a daemon thread"""
+    interval = interval or settings.daily_views_refresh_interval
+    
+    def loop():
+        while True:
+            try:
+                refresh_daily_views()
+            except Exception as e:
+                print(f"Daily view refresh error: {e}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name="daily-view-refresh", daemon=True)
+    thread.start()
+    return thread
@@ -1,9 +1,11 @@
 """Database connection and session management"""
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
+# Sync engine for background maintenance jobs (rollup refresh)
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
@@ -11,14 +13,20 @@ engine = create_engine(
     max_overflow=20
 )
 
+# Async engine (asyncpg) for request handling
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
+async def get_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,84 @@
+"""In-memory cache of dimension tables used to label id-grouped results"""
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Optional, Tuple
+import threading
+import time
+
+from config import settings
+import models
+
+# Dimension name -> (model, attributes kept in memory besides id)
+DIMENSIONS = {
+    'stores': (models.Store, ['name', 'city', 'state', 'sub_brand_id', 'is_active']),
+    'channels': (models.Channel, ['name', 'type']),
+    'products': (models.Product, ['name', 'category_id', 'sub_brand_id']),
+    'categories': (models.Category, ['name', 'type'])
+}
+
+
+class DimensionCache:
+    """Stores, channels, products and categories keyed by id
+    
+    A version made of row count and max(xmin) per table is checked at most
+    every dimension_cache_check_interval seconds; the tables are reloaded
+    only when it changes.
+    """
+    
+    def __init__(self, check_interval: Optional[int] = None):
+        self.check_interval = check_interval or settings.dimension_cache_check_interval
+        self.tables: Dict[str, Dict[int, Dict[str, Any]]] = {name: {} for name in DIMENSIONS}
+        self.version: Optional[Tuple] = None
+        self.checked_at = 0.0
+        self.loads = 0
+        self._lock = threading.Lock()
+    
+    def ensure_fresh(self, db: Session, force: bool = False):
+        """Reload dimensions if their version changed since the last check"""
+        if not force and self.version is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return
+        # Never block: concurrent sessions may share this thread and the holder may be waiting on them
+        if not self._lock.acquire(blocking=False):
+            if self.version is None:
+                # Nothing loaded yet; labelling rows with bare ids would get them cached
+                self._load(db)
+            return
+        try:
+            version = self._get_version(db)
+            if version != self.version:
+                self._load(db)
+                self.version = version
+                self.loads += 1
+            self.checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+    
+    def get(self, dimension: str, id: Optional[int]) -> Dict[str, Any]:
+        return self.tables[dimension].get(id, {})
+    
+    def name(self, dimension: str, id: Optional[int]) -> Optional[str]:
+        """Name for an id, falling back to the id itself for unknown rows"""
+        if id is None:
+            return None
+        return self.get(dimension, id).get('name') or str(id)
+    
+    def _get_version(self, db: Session) -> Tuple:
+        parts = ", ".join(
+            f"(SELECT count(*) || ':' || coalesce(max(xmin::text::bigint), 0) FROM {model.__tablename__})"
+            for model, _ in DIMENSIONS.values()
+        )
+        return tuple(db.execute(text(f"SELECT {parts}")).one())
+    
+    def _load(self, db: Session):
+        tables = {}
+        for name, (model, attributes) in DIMENSIONS.items():
+            columns = [getattr(model, attribute) for attribute in attributes]
+            tables[name] = {
+                row.id: {attribute: getattr(row, attribute) for attribute in attributes}
+                for row in db.execute(select(model.id, *columns))
+            }
+        self.tables = tables
+
+
+# Global dimension cache instance
+dimension_cache = DimensionCache()
@@ -0,0 +1,223 @@
+"""Streaming exports of aggregations and raw sales rows"""
+from fastapi.responses import StreamingResponse
+from datetime import datetime, date
+from decimal import Decimal
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence
+import csv
+import io
+import json
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+from config import settings
+from database import AsyncSessionLocal
+from dimension_cache import dimension_cache
+from query_service import QueryService, DIMENSION_LABELS, RAW_EXPORTS
+
+MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+def check_format(fmt: str):
+    """Raise ValueError for unknown formats or a missing optional dependency"""
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of: {', '.join(MEDIA_TYPES)}")
+    if fmt == 'parquet' and pa is None:
+        raise ValueError("Parquet export requires pyarrow")
+
+
+def _json_default(value):
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+
+class CsvWriter:
+    def __init__(self, columns: List[str], types: List[type]):
+        self.columns = columns
+    
+    def start(self) -> bytes:
+        return self.write([self.columns])
+    
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+    
+    def finish(self) -> bytes:
+        return b''
+
+
+class NdjsonWriter:
+    def __init__(self, columns: List[str], types: List[type]):
+        self.columns = columns
+    
+    def start(self) -> bytes:
+        return b''
+    
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        if orjson is not None:
+            lines = [orjson.dumps(dict(zip(self.columns, row)), default=_json_default) for row in rows]
+        else:
+            lines = [json.dumps(dict(zip(self.columns, row)), default=_json_default).encode() for row in rows]
+        return b''.join(line + b'\n' for line in lines)
+    
+    def finish(self) -> bytes:
+        return b''
+
+
+class _ChunkSink:
+    """Write target for ParquetWriter, drained after every row group"""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetWriter:
+    """One row group per chunk; only the current chunk is held in memory"""
+    
+    ARROW_TYPES = {int: 'int64', float: 'float64', Decimal: 'float64', bool: 'bool', str: 'string'}
+    
+    def __init__(self, columns: List[str], types: List[type]):
+        fields = []
+        for name, python_type in zip(columns, types):
+            if python_type is datetime:
+                arrow_type = pa.timestamp('us')
+            elif python_type is date:
+                arrow_type = pa.date32()
+            else:
+                arrow_type = pa.type_for_alias(self.ARROW_TYPES.get(python_type, 'string'))
+            fields.append(pa.field(name, arrow_type))
+        self.schema = pa.schema(fields)
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode='w'), self.schema)
+    
+    def start(self) -> bytes:
+        return self.sink.drain()
+    
+    def write(self, rows: Sequence[Sequence]) -> bytes:
+        if not rows:
+            return b''
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if pa.types.is_floating(field.type):
+                values = [float(v) if v is not None else None for v in values]
+            elif pa.types.is_string(field.type):
+                values = [str(v) if v is not None else None for v in values]
+            arrays.append(pa.array(values, type=field.type))
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        return self.sink.drain()
+    
+    def finish(self) -> bytes:
+        self.writer.close()
+        return self.sink.drain()
+
+
+WRITERS = {'csv': CsvWriter, 'ndjson': NdjsonWriter, 'parquet': ParquetWriter}
+
+
+def _python_type(column) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+
+async def _stream(
+    db,
+    statement,
+    columns: List[str],
+    types: List[type],
+    fmt: str,
+    transform: Optional[Callable] = None
+) -> AsyncIterator[bytes]:
+    """Encode a statement's rows chunk by chunk from a server-side cursor"""
+    writer = WRITERS[fmt](columns, types)
+    yield writer.start()
+    
+    result = await db.stream(statement, execution_options={'yield_per': settings.export_chunk_size})
+    async for partition in result.partitions():
+        yield writer.write([transform(row) for row in partition] if transform else partition)
+    
+    yield writer.finish()
+
+
+async def stream_table(table: str, filters: Dict, fmt: str) -> AsyncIterator[bytes]:
+    """Stream raw sales or product_sales rows matching filters"""
+    columns = RAW_EXPORTS[table]
+    
+    async with AsyncSessionLocal() as db:
+        statement = QueryService(db.sync_session).build_export_query(table, filters)
+        async for chunk in _stream(
+            db, statement, [c.key for c in columns], [_python_type(c) for c in columns], fmt
+        ):
+            yield chunk
+
+
+async def stream_aggregation(
+    metric: str,
+    group_by: List[str],
+    filters: Dict,
+    fmt: str,
+    limit: Optional[int] = None,
+    approximate: bool = False
+) -> AsyncIterator[bytes]:
+    """Stream get_aggregation rows, read in chunks instead of one list"""
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(lambda session: dimension_cache.ensure_fresh(session))
+        qs = QueryService(db.sync_session)
+        built = qs.build_aggregation_query(metric, group_by, filters, limit, approximate)
+        if built is None:
+            return
+        query, dimensions, approximate = built
+        
+        # Same key order as format_aggregation_row
+        labels = [d['label'] for d in dimensions]
+        names = [name for id_label, (_, name) in DIMENSION_LABELS.items() if id_label in labels]
+        values = ['value', 'margin'] if approximate else ['value']
+        columns = labels + names + values
+        types = [str if label == 'date' else int for label in labels] + [str] * len(names) + [float] * len(values)
+        
+        def transform(row):
+            formatted = qs.format_aggregation_row(dimension_cache, metric, dimensions, row, approximate)
+            return [formatted.get(column) for column in columns]
+        
+        async for chunk in _stream(db, query.statement, columns, types, fmt, transform):
+            yield chunk
+
+
+def export_response(fmt: str, name: str, chunks: AsyncIterator[bytes]) -> StreamingResponse:
+    """Wrap export chunks in a download response"""
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{name}.{fmt}"'
+    })
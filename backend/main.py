@@ -1,22 +1,49 @@
 """Main FastAPI application"""
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from config import settings
-from database import get_db
+from database import get_db, SessionLocal, async_engine
 import models
 import schemas
-from query_service import QueryService
-from cache_service import cache_service
+from query_service import QueryService, run_in_session, run_parallel
+from cache_service import CacheService, cache_service, build_tags
+from cache_warmer import cache_warmer
+from rollup_service import RollupService, ensure_tables, start_refresh_loop, ceil_hour
+from partition_service import PartitionService, check_schema, start_maintenance_loop
+from daily_views import DailyViewService, ensure_views, start_view_refresh_loop
+from dimension_cache import dimension_cache
+from columnar_store import columnar_store
+from export_service import RAW_EXPORTS, check_format, export_response, stream_aggregation, stream_table
+from slow_query_log import slow_query_log
+import metrics
 
 app = FastAPI(
     title="Nola Restaurant Analytics API",
     description="Analytics platform for restaurant data",
     version="1.0.0"
 )
+app.router.route_class = metrics.InstrumentedRoute
+
+# Per-request DB, cache and serialization timings
+metrics.instrument_engine(async_engine.sync_engine)
+QUERY_METHODS = [
+    'get_revenue_metrics', 'get_previous_metrics', 'get_overview_aggregates', 'get_time_series',
+    'get_aggregation', 'get_top_products', 'get_hourly_distribution', 'get_channel_performance',
+    'get_store_comparison'
+]
+metrics.instrument_methods(QueryService, QUERY_METHODS, metrics.observe_query_method)
+metrics.instrument_methods(CacheService, [
+    'get', 'get_many', 'set', 'delete', '_acquire_lock', '_release_lock'
+], metrics.add_cache_time)
+slow_query_log.instrument_engine(async_engine.sync_engine)
+slow_query_log.instrument(QueryService, QUERY_METHODS)
 
 # CORS
 app.add_middleware(
@@ -28,18 +55,118 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """Report where the request's time went as Server-Timing and in the /metrics histograms"""
+    timings = metrics.RequestTimings()
+    token = metrics.current_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        metrics.current_timings.reset(token)
+    
+    route = request.scope.get('route')
+    if route is not None:
+        metrics.observe_request(request.method, route.path, response.status_code, timings)
+    response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+
+@app.on_event("startup")
+def check_database_schema():
+    """Refuse to start on a database created before sales was partitioned"""
+    try:
+        check_schema()
+    except OperationalError as e:
+        print(f"Schema check skipped, database unavailable: {e}")
+
+
+@app.on_event("startup")
+def start_rollups():
+    """Create rollup tables and keep them refreshed in the background"""
+    if not settings.rollup_enabled:
+        return
+    try:
+        ensure_tables()
+        start_refresh_loop()
+    except Exception as e:
+        print(f"Rollup startup error: {e}")
+
+
+@app.on_event("startup")
+def start_daily_views():
+    """Create the daily store and channel views and keep them refreshed in the background"""
+    if not (settings.rollup_enabled and settings.daily_views_enabled):
+        return
+    try:
+        ensure_views()
+        start_view_refresh_loop()
+    except Exception as e:
+        print(f"Daily view startup error: {e}")
+
+
+@app.on_event("startup")
+def load_dimensions():
+    """Warm the dimension cache used to label id-grouped results"""
+    db = SessionLocal()
+    try:
+        dimension_cache.ensure_fresh(db, force=True)
+    except Exception as e:
+        print(f"Dimension cache startup error: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_partitions():
+    """Keep monthly sales partitions created ahead of time"""
+    try:
+        start_maintenance_loop()
+    except Exception as e:
+        print(f"Partition startup error: {e}")
+
+
+@app.on_event("startup")
+def start_columnar():
+    """Load recent sales into the columnar store and keep it refreshed"""
+    if not settings.columnar_enabled:
+        return
+    try:
+        columnar_store.start_refresh_loop()
+    except Exception as e:
+        print(f"Columnar store startup error: {e}")
+
+
+@app.on_event("startup")
+async def start_cache():
+    """Subscribe to cross-worker cache invalidations"""
+    await cache_service.start()
+
+
+@app.on_event("startup")
+async def start_cache_warmer():
+    """Keep popular dashboard entries fresh in the background"""
+    if settings.cache_warm_enabled:
+        await cache_warmer.start()
+
+
+@app.on_event("shutdown")
+async def stop_cache():
+    await cache_warmer.stop()
+    await cache_service.stop()
+
+
 @app.get("/")
-def read_root():
+async def read_root():
     """Health check"""
     return {"status": "ok", "service": "Nola Restaurant Analytics API"}
 
 
 @app.get("/api/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     """Health check with database connection"""
     try:
-        from sqlalchemy import text
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "ok", "database": "connected"}
     except Exception as e:
         return {"status": "error", "database": str(e)}
@@ -47,104 +174,84 @@ def health_check(db: Session = Depends(get_db)):
 
 # Metadata endpoints
 @app.get("/api/stores", response_model=List[schemas.StoreBasic])
-def get_stores(db: Session = Depends(get_db)):
+async def get_stores(db: AsyncSession = Depends(get_db)):
     """Get all stores"""
     cache_key = "stores:all"
-    cached = cache_service.get(cache_key)
+    cached = await cache_service.get(cache_key)
     if cached:
         return cached
     
-    stores = db.query(models.Store).filter(models.Store.is_active == True).all()
+    stores = (await db.execute(
+        select(models.Store).where(models.Store.is_active == True)
+    )).scalars().all()
     result = [schemas.StoreBasic.from_orm(s) for s in stores]
-    cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
+    await cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
     return result
 
 
 @app.get("/api/channels", response_model=List[schemas.ChannelBasic])
-def get_channels(db: Session = Depends(get_db)):
+async def get_channels(db: AsyncSession = Depends(get_db)):
     """Get all channels"""
     cache_key = "channels:all"
-    cached = cache_service.get(cache_key)
+    cached = await cache_service.get(cache_key)
     if cached:
         return cached
     
-    channels = db.query(models.Channel).all()
+    channels = (await db.execute(select(models.Channel))).scalars().all()
     result = [schemas.ChannelBasic.from_orm(c) for c in channels]
-    cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
+    await cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
     return result
 
 
 @app.get("/api/products", response_model=List[schemas.ProductBasic])
-def get_products(
+async def get_products(
     limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get products"""
     cache_key = f"products:limit:{limit}"
-    cached = cache_service.get(cache_key)
+    cached = await cache_service.get(cache_key)
     if cached:
         return cached
     
-    products = db.query(models.Product).limit(limit).all()
+    products = (await db.execute(select(models.Product).limit(limit))).scalars().all()
     result = [schemas.ProductBasic.from_orm(p) for p in products]
-    cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
+    await cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
     return result
 
 
 @app.get("/api/categories", response_model=List[schemas.CategoryBasic])
-def get_categories(db: Session = Depends(get_db)):
+async def get_categories(db: AsyncSession = Depends(get_db)):
     """Get all categories"""
     cache_key = "categories:all"
-    cached = cache_service.get(cache_key)
+    cached = await cache_service.get(cache_key)
     if cached:
         return cached
     
-    categories = db.query(models.Category).filter(models.Category.type == 'P').all()
+    categories = (await db.execute(
+        select(models.Category).where(models.Category.type == 'P')
+    )).scalars().all()
     result = [schemas.CategoryBasic.from_orm(c) for c in categories]
-    cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
+    await cache_service.set(cache_key, [r.dict() for r in result], ttl=3600)
     return result
 
 
 # Dashboard endpoints
-@app.post("/api/dashboard/overview")
-def get_dashboard_overview(
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    store_ids: Optional[List[int]] = Query(None),
-    db: Session = Depends(get_db)
-):
-    """Get dashboard overview with key metrics"""
-    
-    # Default to last 30 days
-    if not end_date:
-        end_date_dt = datetime.now()
-    else:
-        end_date_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-    
-    if not start_date:
-        start_date_dt = end_date_dt - timedelta(days=30)
-    else:
-        start_date_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-    
-    filters = {
-        'date_range': {
-            'start_date': start_date_dt,
-            'end_date': end_date_dt
-        }
-    }
-    if store_ids:
-        filters['store_ids'] = store_ids
-    
-    # Cache key
-    cache_key = cache_service.generate_cache_key("dashboard:overview", filters)
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
-    
-    # Get metrics
-    metrics = query_service.get_revenue_metrics(filters)
+OVERVIEW_METRICS = ['revenue', 'sales_count', 'avg_ticket', 'total_discount', 'products']
+
+
+async def build_dashboard_overview(filters: dict, approximate: bool = False) -> dict:
+    """Compute the dashboard overview payload"""
+    # Independent queries run concurrently on separate pooled connections
+    results = await run_parallel({
+        'aggregates': lambda qs: qs.get_overview_aggregates(filters, approximate),
+        'previous': lambda qs: qs.get_previous_metrics(filters, approximate),
+        'top_products': lambda qs: qs.get_top_products(filters, limit=10),
+    })
+    
+    aggregates = results['aggregates']
+    metrics = aggregates['metrics']
+    metrics['previous'] = results['previous']
     
     # Calculate changes
     metric_cards = []
@@ -184,177 +291,32 @@ def get_dashboard_overview(
         }
     ]
     
-    # Get time series
-    time_series = query_service.get_time_series('revenue', 'day', filters)
-    
-    # Get channel performance
-    channel_perf = query_service.get_channel_performance(filters)
-    
-    # Get top products
-    top_products = query_service.get_top_products(filters, limit=10)
+    if metrics.get('margins'):
+        for card, metric in zip(metric_cards, ['revenue', 'sales_count', 'avg_ticket']):
+            card['margin'] = metrics['margins'][metric]
     
-    # Get hourly distribution
-    hourly = query_service.get_hourly_distribution(filters)
-    
-    result = {
+    return {
         'metrics': metric_cards,
-        'time_series': time_series,
-        'channel_performance': channel_perf,
-        'top_products': top_products,
-        'hourly_distribution': hourly
+        'time_series': aggregates['time_series'],
+        'channel_performance': aggregates['channel_performance'],
+        'top_products': results['top_products'],
+        'hourly_distribution': aggregates['hourly_distribution']
     }
-    
-    cache_service.set(cache_key, result, ttl=300)
-    return result
 
 
-@app.post("/api/analytics/time-series")
-def get_time_series(
-    request: schemas.TimeSeriesRequest,
-    db: Session = Depends(get_db)
-):
-    """Get time series data"""
-    filters = request.filters.dict() if request.filters else {}
-    
-    cache_key = cache_service.generate_cache_key(
-        f"timeseries:{request.metric}:{request.time_bucket}",
-        filters
-    )
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
-    data = query_service.get_time_series(request.metric, request.time_bucket, filters)
-    
-    cache_service.set(cache_key, data, ttl=300)
-    return data
-
-
-@app.post("/api/analytics/aggregation")
-def get_aggregation(
-    request: schemas.AggregationRequest,
-    db: Session = Depends(get_db)
-):
-    """Get aggregated data"""
-    filters = request.filters.dict() if request.filters else {}
-    
-    cache_key = cache_service.generate_cache_key(
-        f"aggregation:{request.metric}:{'_'.join(request.group_by)}",
-        filters
-    )
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
-    data = query_service.get_aggregation(
-        request.metric,
-        request.group_by,
-        filters,
-        request.limit
-    )
-    
-    cache_service.set(cache_key, data, ttl=300)
-    return data
-
-
-@app.post("/api/analytics/top-products")
-def get_top_products(
-    request: schemas.TopProductsRequest,
-    db: Session = Depends(get_db)
-):
-    """Get top products"""
-    filters = request.filters.dict() if request.filters else {}
-    
-    cache_key = cache_service.generate_cache_key(
-        f"top_products:{request.order_by}:{request.limit}",
-        filters
-    )
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
-    data = query_service.get_top_products(filters, request.limit, request.order_by)
-    
-    cache_service.set(cache_key, data, ttl=300)
-    return data
-
-
-@app.post("/api/analytics/store-comparison")
-def get_store_comparison(
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
-):
-    """Compare store performance"""
-    
-    if not end_date:
-        end_date_dt = datetime.now()
-    else:
-        end_date_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-    
-    if not start_date:
-        start_date_dt = end_date_dt - timedelta(days=30)
-    else:
-        start_date_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-    
-    filters = {
-        'date_range': {
-            'start_date': start_date_dt,
-            'end_date': end_date_dt
-        }
-    }
-    
-    cache_key = cache_service.generate_cache_key(f"store_comparison:{limit}", filters)
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
-    data = query_service.get_store_comparison(filters, limit)
-    
-    cache_service.set(cache_key, data, ttl=300)
-    return data
-
-
-@app.get("/api/analytics/insights")
-def get_insights(
-    start_date: Optional[str] = Query(None),
-    end_date: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
-):
-    """Get automated insights"""
-    
-    if not end_date:
-        end_date_dt = datetime.now()
-    else:
-        end_date_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-    
-    if not start_date:
-        start_date_dt = end_date_dt - timedelta(days=30)
-    else:
-        start_date_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-    
-    filters = {
-        'date_range': {
-            'start_date': start_date_dt,
-            'end_date': end_date_dt
-        }
-    }
-    
-    cache_key = cache_service.generate_cache_key("insights", filters)
-    cached = cache_service.get(cache_key)
-    if cached:
-        return cached
-    
-    query_service = QueryService(db)
+async def build_insights(filters: dict) -> dict:
+    """Compute automated insights"""
     insights = []
     
+    # Channel, hourly and total aggregates come from a single scan
+    results = await run_parallel({
+        'aggregates': lambda qs: qs.get_overview_aggregates(filters),
+        'previous': lambda qs: qs.get_previous_metrics(filters),
+    })
+    aggregates = results['aggregates']
+    
     # Get channel performance
-    channels = query_service.get_channel_performance(filters)
+    channels = aggregates['channel_performance']
     if channels:
         best_channel = max(channels, key=lambda x: x['revenue'])
         insights.append({
@@ -366,7 +328,7 @@ def get_insights(
         })
     
     # Get hourly patterns
-    hourly = query_service.get_hourly_distribution(filters)
+    hourly = aggregates['hourly_distribution']
     if hourly:
         peak_hour = max(hourly, key=lambda x: x['sales_count'])
         insights.append({
@@ -378,7 +340,8 @@ def get_insights(
         })
     
     # Get metrics for anomaly detection
-    metrics = query_service.get_revenue_metrics(filters)
+    metrics = aggregates['metrics']
+    metrics['previous'] = results['previous']
     if metrics.get('previous'):
         revenue_change = ((metrics['revenue'] - metrics['previous']['revenue']) / 
                          metrics['previous']['revenue'] * 100) if metrics['previous']['revenue'] > 0 else 0
@@ -400,20 +363,344 @@ def get_insights(
                 'action': 'Identificar fatores de sucesso para replicar.'
             })
     
-    result = {
+    return {
         'insights': insights,
         'generated_at': datetime.now()
     }
+
+
+def date_range_filters(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """Filters for an optional ISO date range, defaulting to the last 30 days"""
+    # The default end is the end of the current hour rather than now, so
+    # repeated loads of the default dashboard share one cache key per hour
+    if not end_date:
+        end_date_dt = ceil_hour(datetime.now())
+    else:
+        end_date_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
     
-    cache_service.set(cache_key, result, ttl=600)
-    return result
+    if not start_date:
+        start_date_dt = end_date_dt - timedelta(days=30)
+    else:
+        start_date_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+    
+    return {
+        'date_range': {
+            'start_date': start_date_dt,
+            'end_date': end_date_dt
+        }
+    }
+
+
+def plan_overview(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    store_ids: Optional[List[int]],
+    approximate: bool
+) -> dict:
+    """Cache key, computation and tags of a dashboard overview"""
+    filters = date_range_filters(start_date, end_date)
+    if store_ids:
+        filters['store_ids'] = store_ids
+    return {
+        'key': cache_service.generate_cache_key(
+            "dashboard:overview:approx" if approximate else "dashboard:overview", filters
+        ),
+        'compute': lambda: build_dashboard_overview(filters, approximate),
+        'ttl': 300,
+        'tags': build_tags(filters, OVERVIEW_METRICS)
+    }
+
+
+@app.post("/api/dashboard/overview")
+async def get_dashboard_overview(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    store_ids: Optional[List[int]] = Query(None),
+    approximate: bool = Query(False)
+):
+    """Get dashboard overview with key metrics (approximate=true samples sales)"""
+    plan = cache_warmer.track(
+        f"overview:{start_date}:{end_date}:{sorted(store_ids or [])}:{approximate}",
+        lambda: plan_overview(start_date, end_date, store_ids, approximate)
+    )
+    return await cache_service.get_or_compute(**plan)
+
+
+def plan_time_series(request: schemas.TimeSeriesRequest) -> dict:
+    """Cache key, computation and tags of a time-series query"""
+    filters = request.filters.dict() if request.filters else {}
+    
+    return {
+        'key': cache_service.generate_cache_key(
+            f"timeseries:{request.metric}:{request.time_bucket}{':approx' if request.approximate else ''}",
+            filters
+        ),
+        'compute': lambda: run_in_session(
+            lambda qs: qs.get_time_series(request.metric, request.time_bucket, filters, request.approximate)
+        ),
+        'ttl': 300,
+        'tags': build_tags(filters, [request.metric])
+    }
+
+
+def plan_aggregation(request: schemas.AggregationRequest) -> dict:
+    """Cache key, computation and tags of an aggregation query"""
+    filters = request.filters.dict() if request.filters else {}
+    
+    return {
+        'key': cache_service.generate_cache_key(
+            f"aggregation:{request.metric}:{'_'.join(request.group_by)}:{request.limit}"
+            f"{':approx' if request.approximate else ''}",
+            filters
+        ),
+        'compute': lambda: run_in_session(
+            lambda qs: qs.get_aggregation(
+                request.metric,
+                request.group_by,
+                filters,
+                request.limit,
+                request.approximate
+            )
+        ),
+        'ttl': 300,
+        'tags': build_tags(filters, [request.metric])
+    }
+
+
+def plan_top_products(request: schemas.TopProductsRequest) -> dict:
+    """Cache key, computation and tags of a top-products query"""
+    filters = request.filters.dict() if request.filters else {}
+    
+    return {
+        'key': cache_service.generate_cache_key(
+            f"top_products:{request.order_by}:{request.limit}",
+            filters
+        ),
+        'compute': lambda: run_in_session(
+            lambda qs: qs.get_top_products(filters, request.limit, request.order_by)
+        ),
+        'ttl': 300,
+        'tags': build_tags(filters, ['products'])
+    }
+
+
+BATCH_PLANS = {
+    'time_series': plan_time_series,
+    'aggregation': plan_aggregation,
+    'top_products': plan_top_products
+}
+
+
+@app.post("/api/analytics/time-series")
+async def get_time_series(request: schemas.TimeSeriesRequest):
+    """Get time series data"""
+    return await cache_service.get_or_compute(**plan_time_series(request))
+
+
+@app.post("/api/analytics/aggregation")
+async def get_aggregation(request: schemas.AggregationRequest):
+    """Get aggregated data"""
+    return await cache_service.get_or_compute(**plan_aggregation(request))
+
+
+@app.post("/api/analytics/top-products")
+async def get_top_products(request: schemas.TopProductsRequest):
+    """Get top products"""
+    return await cache_service.get_or_compute(**plan_top_products(request))
+
+
+@app.post("/api/analytics/batch")
+async def get_analytics_batch(request: schemas.BatchRequest):
+    """Run several widget queries with one multi-key cache read
+    
+    Identical queries are computed once; results and errors are keyed by
+    each query's id.
+    """
+    plans = {}
+    ids_by_key = {}
+    for query in request.queries:
+        plan = BATCH_PLANS[query.type](query)
+        plans.setdefault(plan['key'], plan)
+        ids_by_key.setdefault(plan['key'], []).append(query.id)
+    
+    values = await cache_service.get_or_compute_many(list(plans.values()))
+    
+    results = {}
+    errors = {}
+    for key, value in zip(plans, values):
+        for query_id in ids_by_key[key]:
+            if isinstance(value, Exception):
+                errors[query_id] = str(value)
+            else:
+                results[query_id] = value
+    return {"results": results, "errors": errors}
+
+
+def plan_store_comparison(start_date: Optional[str], end_date: Optional[str], limit: int) -> dict:
+    """Cache key, computation and tags of a store ranking"""
+    filters = date_range_filters(start_date, end_date)
+    return {
+        'key': cache_service.generate_cache_key(f"store_comparison:{limit}", filters),
+        'compute': lambda: run_in_session(lambda qs: qs.get_store_comparison(filters, limit)),
+        'ttl': 300,
+        'tags': build_tags(filters, ['revenue', 'sales_count', 'avg_ticket'])
+    }
+
+
+def plan_insights(start_date: Optional[str], end_date: Optional[str]) -> dict:
+    """Cache key, computation and tags of the automated insights"""
+    filters = date_range_filters(start_date, end_date)
+    return {
+        'key': cache_service.generate_cache_key("insights", filters),
+        'compute': lambda: build_insights(filters),
+        'ttl': 600,
+        'tags': build_tags(filters, ['revenue', 'sales_count'])
+    }
+
+
+@app.post("/api/analytics/store-comparison")
+async def get_store_comparison(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Compare store performance"""
+    plan = cache_warmer.track(
+        f"store_comparison:{start_date}:{end_date}:{limit}",
+        lambda: plan_store_comparison(start_date, end_date, limit)
+    )
+    return await cache_service.get_or_compute(**plan)
+
+
+@app.get("/api/analytics/insights")
+async def get_insights(
+    start_date: Optional[str] = Query(None),
+    end_date: Optional[str] = Query(None)
+):
+    """Get automated insights"""
+    plan = cache_warmer.track(
+        f"insights:{start_date}:{end_date}",
+        lambda: plan_insights(start_date, end_date)
+    )
+    return await cache_service.get_or_compute(**plan)
+
+
+@app.post("/api/export/aggregation")
+async def export_aggregation(request: schemas.AggregationExportRequest):
+    """Stream an aggregation as CSV, NDJSON or Parquet"""
+    try:
+        check_format(request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filters = request.filters.dict() if request.filters else {}
+    return export_response(request.format, f"aggregation_{request.metric}", stream_aggregation(
+        request.metric, request.group_by, filters, request.format, request.limit, request.approximate
+    ))
+
+
+@app.post("/api/export/{table}")
+async def export_table(table: str, request: schemas.ExportRequest):
+    """Stream raw sales or product_sales rows as CSV, NDJSON or Parquet"""
+    if table not in RAW_EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export table '{table}'")
+    try:
+        check_format(request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filters = request.filters.dict() if request.filters else {}
+    return export_response(request.format, table, stream_table(table, filters, request.format))
+
+
+@app.post("/api/rollups/refresh")
+async def refresh_rollups(
+    rebuild: bool = Query(False),
+    db: AsyncSession = Depends(get_db)
+):
+    """Refresh hourly sales rollups (rebuild=true recomputes all history)"""
+    def refresh(session):
+        rollup_service = RollupService(session)
+        return rollup_service.rebuild() if rebuild else rollup_service.refresh()
+    
+    result = await db.run_sync(refresh)
+    return {"status": "ok", **result}
+
+
+@app.post("/api/daily-views/refresh")
+async def refresh_daily_views(db: AsyncSession = Depends(get_db)):
+    """Refresh the daily store and channel materialized views"""
+    result = await db.run_sync(lambda session: DailyViewService(session).refresh())
+    return {"status": "ok", **result}
+
+
+@app.get("/api/partitions")
+async def get_partitions(db: AsyncSession = Depends(get_db)):
+    """List monthly sales partitions"""
+    partitions = await db.run_sync(lambda session: PartitionService(session).list_partitions())
+    return {"partitions": partitions}
+
+
+@app.post("/api/partitions/maintain")
+async def maintain_partitions(db: AsyncSession = Depends(get_db)):
+    """Create upcoming partitions and detach expired ones"""
+    result = await db.run_sync(lambda session: PartitionService(session).maintain())
+    return {"status": "ok", **result}
+
+
+@app.get("/api/columnar/stats")
+async def get_columnar_stats():
+    """Rows and memory held by the columnar store in this worker"""
+    return columnar_store.get_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus histograms of this worker"""
+    return metrics.render_metrics()
+
+
+@app.get("/api/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    method: Optional[str] = Query(None, description="Only calls of this QueryService method")
+):
+    """Recent QueryService calls over the slow-query threshold, with sampled EXPLAIN ANALYZE plans"""
+    return {
+        "threshold_ms": settings.slow_query_threshold_ms,
+        "sample_rate": settings.slow_query_sample_rate,
+        "entries": slow_query_log.get_entries(limit, method)
+    }
+
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Cache hit/miss counters per tier and warm-up activity for this worker"""
+    return {**cache_service.get_stats(), 'warmer': cache_warmer.get_stats()}
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(request: schemas.CacheInvalidationRequest):
+    """Invalidate cached entries by tag (e.g. store:12, date:2024-05-01, metric:revenue)"""
+    count = await cache_service.invalidate_tags(request.tags, request.match_all)
+    return {"status": "ok", "cleared": count}
+
+
+@app.post("/api/cache/invalidate/sales")
+async def invalidate_sales_cache(
+    store_id: int = Query(...),
+    day: date = Query(..., alias="date")
+):
+    """Invalidate entries affected by new sales of a store on a given day"""
+    count = await cache_service.invalidate_sales(store_id, day)
+    return {"status": "ok", "cleared": count}
 
 
 @app.delete("/api/cache/clear")
-def clear_cache(pattern: str = "*"):
+async def clear_cache(pattern: str = "*"):
     """Clear cache (for development)"""
     try:
-        count = cache_service.clear_pattern(pattern)
+        count = await cache_service.clear_pattern(pattern)
         return {"status": "ok", "cleared": count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
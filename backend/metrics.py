@@ -0,0 +1,220 @@
+"""Per-request timings, Server-Timing headers and Prometheus-style histograms"""
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import threading
+import time
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+# Latency buckets in seconds, and buckets for statement counts
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    """What one request spent in Postgres, the cache and response encoding"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.cache_seconds = 0.0
+        self.endpoint_seconds = 0.0
+        self.handler_seconds = 0.0
+    
+    @property
+    def serialize_seconds(self) -> float:
+        """Route handler time outside the endpoint function (validation and JSON encoding)"""
+        return max(self.handler_seconds - self.endpoint_seconds, 0.0)
+    
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"',
+            f'cache;dur={self.cache_seconds * 1000:.1f}',
+            f'serialize;dur={self.serialize_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}'
+        ])
+
+
+# Set by the middleware; tasks and run_sync greenlets started by the request share it
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar('current_timings', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label values"""
+    
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = SECONDS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self.series.items()):
+                labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+                prefix = f"{labels}," if labels else ""
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{labels}}} {total}")
+                lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status'))
+REQUEST_DB_SECONDS = Histogram('http_request_db_seconds', 'Time spent in Postgres per request', ('route',))
+REQUEST_DB_QUERIES = Histogram('http_request_db_queries', 'Statements executed per request', ('route',), COUNT_BUCKETS)
+REQUEST_CACHE_SECONDS = Histogram('http_request_cache_seconds', 'Time spent in CacheService per request', ('route',))
+REQUEST_SERIALIZE_SECONDS = Histogram('http_request_serialize_seconds', 'Time spent encoding the response', ('route',))
+QUERY_METHOD_SECONDS = Histogram('query_service_method_seconds', 'QueryService method latency', ('method',))
+
+HISTOGRAMS = [
+    REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_DB_QUERIES,
+    REQUEST_CACHE_SECONDS, REQUEST_SERIALIZE_SECONDS, QUERY_METHOD_SECONDS
+]
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of this worker's histograms"""
+    return "\n".join(line for histogram in HISTOGRAMS for line in histogram.render()) + "\n"
+
+
+def observe_request(method: str, route: str, status: int, timings: RequestTimings):
+    REQUEST_SECONDS.observe(time.perf_counter() - timings.started, method, route, str(status))
+    REQUEST_DB_SECONDS.observe(timings.db_seconds, route)
+    REQUEST_DB_QUERIES.observe(timings.db_queries, route)
+    REQUEST_CACHE_SECONDS.observe(timings.cache_seconds, route)
+    REQUEST_SERIALIZE_SECONDS.observe(timings.serialize_seconds, route)
+
+
+class InstrumentedRoute(APIRoute):
+    """Times the endpoint function apart from the whole handler, to derive serialization time"""
+    
+    def get_route_handler(self):
+        call = self.dependant.call
+        
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    _add_endpoint_time(time.perf_counter() - started)
+        else:
+            @functools.wraps(call)
+            def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    _add_endpoint_time(time.perf_counter() - started)
+        
+        self.dependant.call = timed_call
+        handler = super().get_route_handler()
+        
+        async def timed_handler(request):
+            started = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                timings = current_timings.get()
+                if timings is not None:
+                    timings.handler_seconds += time.perf_counter() - started
+        
+        return timed_handler
+
+
+def _add_endpoint_time(seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.endpoint_seconds += seconds
+
+
+def instrument_engine(sync_engine):
+    """Add statement counts and Postgres time to the current request's timings"""
+    
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+    
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        timings = current_timings.get()
+        if timings is not None:
+            timings.db_queries += 1
+            timings.db_seconds += elapsed
+
+
+def instrument_methods(cls, names: List[str], on_elapsed):
+    """Wrap methods (sync or async) of cls to report their duration to on_elapsed(name, seconds)
+    
+    Only the outermost call is reported: time spent in one wrapped method
+    calling another (get_revenue_metrics -> get_previous_metrics) would
+    otherwise be counted twice.
+    """
+    active: ContextVar[bool] = ContextVar(f'instrumented_{cls.__name__}', default=False)
+    
+    for name in names:
+        method = getattr(cls, name)
+        
+        if asyncio.iscoroutinefunction(method):
+            def wrap(method, name):
+                @functools.wraps(method)
+                async def timed(*args, **kwargs):
+                    if active.get():
+                        return await method(*args, **kwargs)
+                    token = active.set(True)
+                    started = time.perf_counter()
+                    try:
+                        return await method(*args, **kwargs)
+                    finally:
+                        on_elapsed(name, time.perf_counter() - started)
+                        active.reset(token)
+                return timed
+        else:
+            def wrap(method, name):
+                @functools.wraps(method)
+                def timed(*args, **kwargs):
+                    if active.get():
+                        return method(*args, **kwargs)
+                    token = active.set(True)
+                    started = time.perf_counter()
+                    try:
+                        return method(*args, **kwargs)
+                    finally:
+                        on_elapsed(name, time.perf_counter() - started)
+                        active.reset(token)
+                return timed
+        
+        setattr(cls, name, wrap(method, name))
+
+
+def add_cache_time(name: str, seconds: float):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.cache_seconds += seconds
+
+
+def observe_query_method(name: str, seconds: float):
+    QUERY_METHOD_SECONDS.observe(seconds, name)
@@ -1,5 +1,5 @@
 """SQLAlchemy models"""
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, DECIMAL, Text, CHAR
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, ForeignKeyConstraint, Index, DECIMAL, Text, CHAR, MetaData, Table, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -123,7 +123,19 @@ class Customer(Base):
 
 
 class Sale(Base):
+    """Partitioned by month on created_at, hence the composite primary key"""
     __tablename__ = "sales"
+    __table_args__ = (
+        Index(
+            "idx_sales_completed_covering", "created_at", "store_id", "channel_id",
+            postgresql_include=["total_amount", "total_discount", "id"],
+            postgresql_where=text("sale_status_desc = 'COMPLETED'")
+        ),
+        Index(
+            "idx_sales_created_at_brin", "created_at",
+            postgresql_using="brin", postgresql_with={"pages_per_range": 32}
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.id"), nullable=False, index=True)
@@ -133,7 +145,7 @@ class Sale(Base):
     
     cod_sale1 = Column(String(100))
     cod_sale2 = Column(String(100))
-    created_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, primary_key=True, nullable=False, index=True)
     customer_name = Column(String(100))
     sale_status_desc = Column(String(100), nullable=False, index=True)
     
@@ -163,10 +175,17 @@ class Sale(Base):
 
 
 class ProductSale(Base):
+    """Partitioned by month on sale_created_at, aligned with sales"""
     __tablename__ = "product_sales"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["sale_id", "sale_created_at"], ["sales.id", "sales.created_at"], ondelete="CASCADE"
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id", ondelete="CASCADE"), nullable=False, index=True)
+    sale_id = Column(Integer, nullable=False, index=True)
+    sale_created_at = Column(DateTime, primary_key=True, nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Float, nullable=False)
     base_price = Column(Float, nullable=False)
@@ -175,14 +194,19 @@ class ProductSale(Base):
     
     sale = relationship("Sale", back_populates="product_sales")
     product = relationship("Product")
-    item_product_sales = relationship("ItemProductSale", back_populates="product_sale")
+    item_product_sales = relationship(
+        "ItemProductSale",
+        primaryjoin="ProductSale.id == foreign(ItemProductSale.product_sale_id)",
+        back_populates="product_sale"
+    )
 
 
 class ItemProductSale(Base):
     __tablename__ = "item_product_sales"
     
     id = Column(Integer, primary_key=True, index=True)
-    product_sale_id = Column(Integer, ForeignKey("product_sales.id", ondelete="CASCADE"), nullable=False)
+    # No FK: product_sales is partitioned and its primary key includes sale_created_at
+    product_sale_id = Column(Integer, nullable=False)
     item_id = Column(Integer, ForeignKey("items.id"), nullable=False)
     option_group_id = Column(Integer, ForeignKey("option_groups.id"))
     quantity = Column(Float, nullable=False)
@@ -191,7 +215,11 @@ class ItemProductSale(Base):
     amount = Column(Float, default=1)
     observations = Column(String(300))
     
-    product_sale = relationship("ProductSale", back_populates="item_product_sales")
+    product_sale = relationship(
+        "ProductSale",
+        primaryjoin="ProductSale.id == foreign(ItemProductSale.product_sale_id)",
+        back_populates="item_product_sales"
+    )
     item = relationship("Item")
     option_group = relationship("OptionGroup")
 
@@ -210,10 +238,17 @@ class ItemItemProductSale(Base):
 
 
 class DeliverySale(Base):
+    """Partitioned by month on sale_created_at, aligned with sales"""
     __tablename__ = "delivery_sales"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["sale_id", "sale_created_at"], ["sales.id", "sales.created_at"], ondelete="CASCADE"
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id", ondelete="CASCADE"), nullable=False, index=True)
+    sale_id = Column(Integer, nullable=False, index=True)
+    sale_created_at = Column(DateTime, primary_key=True, nullable=False)
     courier_name = Column(String(200))
     courier_phone = Column(String(50))
     courier_type = Column(String(100))
@@ -224,15 +259,21 @@ class DeliverySale(Base):
     mode = Column(String(100))
     
     sale = relationship("Sale", back_populates="delivery_sale")
-    delivery_address = relationship("DeliveryAddress", back_populates="delivery_sale", uselist=False)
+    delivery_address = relationship(
+        "DeliveryAddress",
+        primaryjoin="DeliverySale.id == foreign(DeliveryAddress.delivery_sale_id)",
+        back_populates="delivery_sale",
+        uselist=False
+    )
 
 
 class DeliveryAddress(Base):
     __tablename__ = "delivery_addresses"
     
+    # No FKs: sales and delivery_sales are partitioned
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    delivery_sale_id = Column(Integer, ForeignKey("delivery_sales.id"))
+    sale_id = Column(Integer)
+    delivery_sale_id = Column(Integer)
     address_street = Column(String(200))
     address_number = Column(String(20))
     address_complement = Column(String(100))
@@ -244,7 +285,11 @@ class DeliveryAddress(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     
-    delivery_sale = relationship("DeliverySale", back_populates="delivery_address")
+    delivery_sale = relationship(
+        "DeliverySale",
+        primaryjoin="DeliverySale.id == foreign(DeliveryAddress.delivery_sale_id)",
+        back_populates="delivery_address"
+    )
 
 
 class PaymentType(Base):
@@ -256,10 +301,17 @@ class PaymentType(Base):
 
 
 class Payment(Base):
+    """Partitioned by month on sale_created_at, aligned with sales"""
     __tablename__ = "payments"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["sale_id", "sale_created_at"], ["sales.id", "sales.created_at"], ondelete="CASCADE"
+        ),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id", ondelete="CASCADE"), nullable=False, index=True)
+    sale_id = Column(Integer, nullable=False, index=True)
+    sale_created_at = Column(DateTime, primary_key=True, nullable=False)
     payment_type_id = Column(Integer, ForeignKey("payment_types.id"), nullable=False)
     value = Column(DECIMAL(10, 2), nullable=False)
     is_online = Column(Boolean, default=False)
@@ -286,7 +338,82 @@ class CouponSale(Base):
     __tablename__ = "coupon_sales"
     
     id = Column(Integer, primary_key=True, index=True)
-    sale_id = Column(Integer, ForeignKey("sales.id"))
+    sale_id = Column(Integer)  # no FK, sales is partitioned
     coupon_id = Column(Integer, ForeignKey("coupons.id"))
     discount_applied = Column(DECIMAL(10, 2))
     sponsorship = Column(String(100))
+
+
+class SalesHourlyRollup(Base):
+    __tablename__ = "sales_hourly_rollup"
+    
+    bucket = Column(DateTime, primary_key=True)
+    store_id = Column(Integer, primary_key=True)
+    channel_id = Column(Integer, primary_key=True)
+    sale_status_desc = Column(String(100), primary_key=True)
+    sales_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0)
+    revenue_sq = Column(DECIMAL(24, 4), nullable=False, default=0)
+    total_discount = Column(DECIMAL(14, 2), nullable=False, default=0)
+
+
+class ProductSalesFact(Base):
+    """One row per product sale, denormalized with its sale's attributes"""
+    __tablename__ = "product_sales_fact"
+    __table_args__ = (
+        Index(
+            "idx_product_sales_fact_completed", "sale_created_at", "store_id", "channel_id",
+            postgresql_include=["product_id", "category_id", "quantity", "total_price"],
+            postgresql_where=text("sale_status_desc = 'COMPLETED'")
+        ),
+    )
+    
+    product_sale_id = Column(Integer, primary_key=True)
+    sale_created_at = Column(DateTime, primary_key=True)
+    sale_id = Column(Integer, nullable=False)
+    store_id = Column(Integer, nullable=False)
+    channel_id = Column(Integer, nullable=False)
+    sale_status_desc = Column(String(100), nullable=False)
+    product_id = Column(Integer, nullable=False, index=True)
+    category_id = Column(Integer)
+    quantity = Column(Float, nullable=False)
+    total_price = Column(Float, nullable=False)
+
+
+# Materialized views are created by daily_views.py, so they live outside
+# Base.metadata and metadata.create_all() never turns them into tables
+views_metadata = MetaData()
+
+
+class SalesDailyStore(Base):
+    """Materialized view of completed sales per day and store (daily_views.py)"""
+    __table__ = Table(
+        "sales_daily_store_mv",
+        views_metadata,
+        Column("day", Date, primary_key=True),
+        Column("store_id", Integer, primary_key=True),
+        Column("sales_count", Integer, nullable=False),
+        Column("revenue", DECIMAL(16, 2), nullable=False),
+        Column("total_discount", DECIMAL(16, 2), nullable=False)
+    )
+
+
+class SalesDailyChannel(Base):
+    """Materialized view of completed sales per day and channel (daily_views.py)"""
+    __table__ = Table(
+        "sales_daily_channel_mv",
+        views_metadata,
+        Column("day", Date, primary_key=True),
+        Column("channel_id", Integer, primary_key=True),
+        Column("sales_count", Integer, nullable=False),
+        Column("revenue", DECIMAL(16, 2), nullable=False),
+        Column("total_discount", DECIMAL(16, 2), nullable=False)
+    )
+
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+    
+    name = Column(String(100), primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime)
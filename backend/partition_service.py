@@ -0,0 +1,176 @@
+"""Monthly partition maintenance for sales and its child tables"""
+from sqlalchemy import func, select, text
+from sqlalchemy.orm import Session
+from datetime import date
+from typing import List, Dict, Any, Optional
+import re
+import threading
+import time
+
+from config import settings
+from database import SessionLocal
+
+PARENT_TABLE = 'sales'
+
+# Detached before sales so their foreign keys can be dropped first
+CHILD_TABLES = ['product_sales', 'payments', 'delivery_sales']
+
+PARTITION_NAME = re.compile(r'^sales_(\d{4})_(\d{2})$')
+
+
+def add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class PartitionService:
+    """Creates partitions ahead of time and detaches expired ones
+    
+    Partitions are created by the create_sales_partitions() function from
+    database-schema.sql, so the schema and this service always agree on
+    names and bounds. Databases created before partitioning are not
+    migrated; check_schema() refuses to start the API on them.
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def is_partitioned(self) -> bool:
+        return bool(self.db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name))"
+        ), {'name': PARENT_TABLE}).scalar())
+    
+    def schema_problems(self) -> List[str]:
+        """Differences from database-schema.sql that break the partitioned models"""
+        problems = [] if self.is_partitioned() else [f"{PARENT_TABLE} is not partitioned"]
+        
+        upgraded = set(self.db.execute(text(
+            "SELECT table_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND column_name = 'sale_created_at' "
+            "AND table_name = ANY(:tables)"
+        ), {'tables': CHILD_TABLES}).scalars())
+        problems += [f"{table}.sale_created_at does not exist" for table in CHILD_TABLES if table not in upgraded]
+        return problems
+    
+    def list_partitions(self) -> List[Dict[str, Any]]:
+        """Monthly sales partitions currently attached, oldest first"""
+        rows = self.db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:name)"
+        ), {'name': PARENT_TABLE}).scalars()
+        
+        partitions = []
+        for name in rows:
+            match = PARTITION_NAME.match(name)
+            if match:
+                partitions.append({
+                    'name': name,
+                    'month': date(int(match.group(1)), int(match.group(2)), 1)
+                })
+        return sorted(partitions, key=lambda p: p['month'])
+    
+    def ensure_future_partitions(self, months_ahead: Optional[int] = None) -> int:
+        """Create partitions from the current month up to months_ahead"""
+        if months_ahead is None:
+            months_ahead = settings.partition_months_ahead
+        
+        current_month = date.today().replace(day=1)
+        created = self.db.execute(select(func.create_sales_partitions(
+            current_month, add_months(current_month, months_ahead)
+        ))).scalar()
+        self.db.commit()
+        return created or 0
+    
+    def detach_old_partitions(self, retention_months: Optional[int] = None, drop: bool = False) -> List[str]:
+        """Detach (or drop) partitions entirely older than retention_months"""
+        if retention_months is None:
+            retention_months = settings.partition_retention_months
+        if retention_months <= 0:
+            return []
+        
+        cutoff = add_months(date.today().replace(day=1), -retention_months)
+        detached = []
+        
+        for partition in self.list_partitions():
+            if partition['month'] >= cutoff:
+                break
+            
+            suffix = partition['month'].strftime('%Y_%m')
+            for parent in CHILD_TABLES:
+                self._detach(parent, f"{parent}_{suffix}", drop)
+            self._detach(PARENT_TABLE, partition['name'], drop)
+            self.db.commit()
+            detached.append(partition['name'])
+        
+        return detached
+    
+    def maintain(self) -> Dict[str, Any]:
+        """Create upcoming partitions and retire expired ones"""
+        if not self.is_partitioned():
+            return {'partitioned': False, 'created': 0, 'detached': []}
+        
+        return {
+            'partitioned': True,
+            'created': self.ensure_future_partitions(),
+            'detached': self.detach_old_partitions(drop=settings.partition_drop_detached)
+        }
+    
+    def _detach(self, parent: str, partition: str, drop: bool):
+        if self.db.execute(text("SELECT to_regclass(:name)"), {'name': partition}).scalar() is None:
+            return
+        
+        self.db.execute(text(f'ALTER TABLE "{parent}" DETACH PARTITION "{partition}"'))
+        
+        if drop:
+            self.db.execute(text(f'DROP TABLE "{partition}"'))
+            return
+        
+        # A detached child keeps its FK to sales, which would block detaching the sales partition
+        constraints = self.db.execute(text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:name) AND contype = 'f' AND confrelid = to_regclass(:parent)"
+        ), {'name': partition, 'parent': PARENT_TABLE}).scalars().all()
+        for constraint in constraints:
+            self.db.execute(text(f'ALTER TABLE "{partition}" DROP CONSTRAINT "{constraint}"'))
+
+
+def check_schema():
+    """Raise if the database was created from the schema before partitioning"""
+    db = SessionLocal()
+    try:
+        problems = PartitionService(db).schema_problems()
+    finally:
+        db.close()
+    
+    if problems:
+        raise RuntimeError(
+            f"Database schema is outdated ({'; '.join(problems)}). "
+            "Recreate it from database-schema.sql and reload the data: "
+            "docker compose down -v && docker compose up -d postgres && python generate_data.py"
+        )
+
+
+def maintain_partitions() -> Dict[str, Any]:
+    """Run partition maintenance on a dedicated session"""
+    db = SessionLocal()
+    try:
+        return PartitionService(db).maintain()
+    finally:
+        db.close()
+
+
+def start_maintenance_loop(interval: Optional[int] = None) -> threading.Thread:
+    """Run partition maintenance periodically in a daemon thread"""
+    interval = interval or settings.partition_maintenance_interval
+    
+    def loop():
+        while True:
+            try:
+                maintain_partitions()
+            except Exception as e:
+                print(f"Partition maintenance error: {e}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name="partition-maintenance", daemon=True)
+    thread.start()
+    return thread
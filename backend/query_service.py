@@ -1,11 +1,145 @@
 """Query service for building dynamic queries"""
-from sqlalchemy import func, cast, Date, extract, case
-from sqlalchemy.orm import Session
+import asyncio
+import math
+from sqlalchemy import func, cast, Date, Numeric, extract, case, select, literal, union_all, and_, or_, tuple_, tablesample
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from decimal import Decimal
+from typing import List, Dict, Any, Optional, Callable
+from config import settings
+from columnar_store import columnar_store
+from database import AsyncSessionLocal
+from dimension_cache import dimension_cache
+from rollup_service import SALES_HOURLY, PRODUCT_SALES_FACT, floor_hour, ceil_hour
+from daily_views import DAILY_VIEWS, floor_day, ceil_day
 import models
 import pandas as pd
 
+# Id column of a grouped row -> (dimension cache table, name column added to the result)
+DIMENSION_LABELS = {
+    'store_id': ('stores', 'store_name'),
+    'channel_id': ('channels', 'channel_name'),
+    'product_id': ('products', 'product_name'),
+    'category_id': ('categories', 'category_name')
+}
+
+# group_by dimensions for get_aggregation. Each reads a fact column or a part
+# of the sale time; joins are only needed when reading raw sales.
+DIMENSIONS = {
+    'store': {'label': 'store_id', 'column': 'store_id'},
+    'channel': {'label': 'channel_id', 'column': 'channel_id'},
+    'product': {'label': 'product_id', 'column': 'product_id', 'joins': ('product_sales',)},
+    'category': {'label': 'category_id', 'column': 'category_id', 'joins': ('product_sales', 'products')},
+    'date': {'label': 'date', 'time_part': 'date'},
+    'weekday': {'label': 'weekday', 'time_part': 'dow'},
+    'hour': {'label': 'hour', 'time_part': 'hour'}
+}
+
+# Raw-sales equivalents of the fact columns, and the joins that provide them
+RAW_DIMENSION_COLUMNS = {
+    'store_id': models.Sale.store_id,
+    'channel_id': models.Sale.channel_id,
+    'product_id': models.ProductSale.product_id,
+    'category_id': models.Product.category_id
+}
+RAW_JOINS = {
+    'product_sales': (models.ProductSale, and_(
+        models.ProductSale.sale_id == models.Sale.id,
+        models.ProductSale.sale_created_at == models.Sale.created_at
+    )),
+    'products': (models.Product, models.Product.id == models.ProductSale.product_id)
+}
+
+# Metrics that can be computed from additive per-hour aggregates
+FACT_METRICS = {'revenue', 'sales_count', 'avg_ticket', 'total_discount'}
+
+# Metrics that can be computed from product facts
+PRODUCT_METRICS = {'revenue', 'quantity', 'sales_count', 'avg_ticket'}
+
+# Raw tables that can be exported and the columns written for each.
+# product_sales rows carry their sale's store and channel.
+RAW_EXPORTS = {
+    'sales': [
+        models.Sale.id, models.Sale.created_at, models.Sale.store_id, models.Sale.channel_id,
+        models.Sale.customer_id, models.Sale.sale_status_desc, models.Sale.total_amount_items,
+        models.Sale.total_discount, models.Sale.total_increase, models.Sale.delivery_fee,
+        models.Sale.service_tax_fee, models.Sale.total_amount, models.Sale.value_paid,
+        models.Sale.production_seconds, models.Sale.delivery_seconds, models.Sale.people_quantity,
+        models.Sale.origin
+    ],
+    'product_sales': [
+        models.ProductSale.id, models.ProductSale.sale_id, models.ProductSale.sale_created_at,
+        models.Sale.store_id, models.Sale.channel_id, models.ProductSale.product_id,
+        models.ProductSale.quantity, models.ProductSale.base_price, models.ProductSale.total_price
+    ]
+}
+
+# Approximate mode: TABLESAMPLE seed (stable samples keep cached and fresh answers
+# consistent) and the z-score of the reported two-sided 95% interval
+SAMPLE_SEED = 42
+CONFIDENCE_Z = 1.96
+
+
+def columnar_metric(row: Dict[str, Any], metric: str) -> float:
+    """Value of a FACT_METRICS metric from a columnar group"""
+    if metric == 'avg_ticket':
+        return row['revenue'] / row['sales_count'] if row['sales_count'] else 0
+    return float(row[metric])
+
+
+def sample_margin(metric: str, count: float, revenue: float, revenue_sq: float) -> Optional[float]:
+    """95% margin of error of a scaled-up sample estimate
+    
+    count, revenue and revenue_sq are the weighted sums of a sample facts
+    group. The sample is BERNOULLI over rows, which these variances assume.
+    Groups backed by fewer than approximate_min_sample_rows sampled sales get
+    no margin (None): the normal approximation does not hold for them.
+    """
+    fraction = settings.approximate_sample_percent / 100
+    scale = (1 - fraction) / fraction
+    count, revenue, revenue_sq = float(count or 0), float(revenue or 0), float(revenue_sq or 0)
+    if count * fraction < settings.approximate_min_sample_rows:
+        return None
+    if metric == 'revenue':
+        variance = scale * revenue_sq
+    elif metric == 'sales_count':
+        variance = scale * count
+    elif metric == 'avg_ticket':
+        if not count:
+            return 0
+        ratio = revenue / count
+        variance = scale * max(revenue_sq - count * ratio * ratio, 0) / (count * count)
+    else:
+        return None
+    return CONFIDENCE_Z * math.sqrt(variance)
+
+
+async def run_query(db: AsyncSession, call: Callable[['QueryService'], Any]) -> Any:
+    """Run a QueryService call on an async session"""
+    return await db.run_sync(lambda session: call(QueryService(session)))
+
+
+async def run_in_session(call: Callable[['QueryService'], Any]) -> Any:
+    """Run a QueryService call on its own pooled session"""
+    async with AsyncSessionLocal() as db:
+        return await run_query(db, call)
+
+
+async def run_parallel(calls: Dict[str, Callable[['QueryService'], Any]]) -> Dict[str, Any]:
+    """Run independent QueryService calls concurrently, each on its own pooled session"""
+    results = await asyncio.gather(*(run_in_session(call) for call in calls.values()))
+    return dict(zip(calls.keys(), results))
+
+
+def parse_datetime(value):
+    """Parse ISO strings and drop tz offsets, since sales timestamps are naive"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        value = value.replace(tzinfo=None)
+    return value
+
 
 class QueryService:
     """Service for building and executing dynamic queries"""
@@ -13,46 +147,207 @@ class QueryService:
     def __init__(self, db: Session):
         self.db = db
     
-    def get_revenue_metrics(self, filters: Optional[Dict] = None) -> Dict[str, Any]:
+    def get_revenue_metrics(
+        self,
+        filters: Optional[Dict] = None,
+        include_previous: bool = True
+    ) -> Dict[str, Any]:
         """Get revenue metrics with comparison"""
-        query = self.db.query(
-            func.sum(models.Sale.total_amount).label('total_revenue'),
-            func.count(models.Sale.id).label('total_sales'),
-            func.avg(models.Sale.total_amount).label('avg_ticket'),
-            func.sum(models.Sale.total_discount).label('total_discount')
-        ).filter(models.Sale.sale_status_desc == 'COMPLETED')
-        
-        if filters:
-            query = self._apply_filters(query, filters)
+        view = self._columnar_view(filters)
+        if view is not None:
+            totals = view.totals()
+            return {
+                'revenue': totals['revenue'],
+                'sales_count': totals['sales_count'],
+                'avg_ticket': columnar_metric(totals, 'avg_ticket'),
+                'total_discount': totals['total_discount'],
+                'previous': self.get_previous_metrics(filters) if include_previous else None
+            }
         
-        result = query.first()
+        facts = self._sales_facts(filters)
         
-        # Get previous period for comparison
-        prev_result = None
-        if filters and filters.get('date_range'):
-            prev_query = self._get_previous_period_query(filters)
-            prev_result = prev_query.first()
+        result = self.db.query(
+            func.sum(facts.c.revenue).label('total_revenue'),
+            func.sum(facts.c.sales_count).label('total_sales'),
+            self._get_fact_metric_expression(facts, 'avg_ticket').label('avg_ticket'),
+            func.sum(facts.c.total_discount).label('total_discount')
+        ).first()
         
         return {
             'revenue': float(result.total_revenue or 0),
             'sales_count': int(result.total_sales or 0),
             'avg_ticket': float(result.avg_ticket or 0),
             'total_discount': float(result.total_discount or 0),
-            'previous': {
-                'revenue': float(prev_result.total_revenue or 0) if prev_result else None,
-                'sales_count': int(prev_result.total_sales or 0) if prev_result else None,
-                'avg_ticket': float(prev_result.avg_ticket or 0) if prev_result else None,
-            } if prev_result else None
+            'previous': self.get_previous_metrics(filters) if include_previous else None
         }
     
+    def get_previous_metrics(self, filters: Optional[Dict] = None, approximate: bool = False) -> Optional[Dict[str, Any]]:
+        """Get revenue metrics for the period preceding the filtered date range"""
+        if not filters or not filters.get('date_range'):
+            return None
+        
+        prev_query = self._get_previous_period_query(filters, approximate)
+        prev_result = prev_query.first() if prev_query is not None else None
+        if not prev_result:
+            return None
+        
+        return {
+            'revenue': float(prev_result.total_revenue or 0),
+            'sales_count': int(prev_result.total_sales or 0),
+            'avg_ticket': float(prev_result.avg_ticket or 0),
+        }
+    
+    def get_overview_aggregates(self, filters: Optional[Dict] = None, approximate: bool = False) -> Dict[str, Any]:
+        """Get totals, per-channel, per-hour and per-day aggregates in one scan
+        
+        Uses GROUPING SETS over the sales facts so Postgres reads the filtered
+        range once; GROUPING() tells the sets apart in the result rows. With
+        approximate=True the facts come from a sample and each group gets
+        95% margins of error.
+        """
+        view = self._columnar_view(filters)
+        if view is not None:
+            return self._get_columnar_overview(view, approximate)
+        
+        facts = self._sample_facts(filters) if approximate else self._sales_facts(filters)
+        hour_expr = extract('hour', facts.c.bucket)
+        day_expr = cast(facts.c.bucket, Date)
+        grouping_expr = func.grouping(facts.c.channel_id, hour_expr, day_expr)
+        
+        results = self.db.query(
+            grouping_expr.label('grouping_set'),
+            facts.c.channel_id.label('channel_id'),
+            hour_expr.label('hour'),
+            day_expr.label('day'),
+            func.sum(facts.c.sales_count).label('sales_count'),
+            func.sum(facts.c.revenue).label('revenue'),
+            func.sum(facts.c.revenue_sq).label('revenue_sq'),
+            func.sum(facts.c.total_discount).label('total_discount')
+        ).group_by(
+            func.grouping_sets(tuple_(), facts.c.channel_id, hour_expr, day_expr)
+        ).all()
+        dimensions = self._dimensions()
+        
+        # GROUPING() bits are set for the columns not grouped in that set
+        totals = next((r for r in results if r.grouping_set == 0b111), None)
+        channels = [r for r in results if r.grouping_set == 0b011]
+        hours = sorted((r for r in results if r.grouping_set == 0b101), key=lambda r: r.hour)
+        days = sorted((r for r in results if r.grouping_set == 0b110), key=lambda r: r.day)
+        
+        def avg_ticket(r):
+            return float(r.revenue or 0) / int(r.sales_count) if r.sales_count else 0
+        
+        def margins(r, metrics):
+            return {m: sample_margin(m, r.sales_count, r.revenue, r.revenue_sq) if r else 0 for m in metrics}
+        
+        overview = {
+            'metrics': {
+                'revenue': float(totals.revenue or 0) if totals else 0,
+                'sales_count': int(totals.sales_count or 0) if totals else 0,
+                'avg_ticket': avg_ticket(totals) if totals else 0,
+                'total_discount': float(totals.total_discount or 0) if totals else 0,
+                'previous': None
+            },
+            'channel_performance': [
+                {
+                    'channel_id': r.channel_id,
+                    'channel_name': dimensions.name('channels', r.channel_id),
+                    'sales_count': int(r.sales_count),
+                    'revenue': float(r.revenue or 0),
+                    'avg_ticket': avg_ticket(r),
+                    'total_discount': float(r.total_discount or 0)
+                }
+                for r in channels
+            ],
+            'hourly_distribution': [
+                {
+                    'hour': int(r.hour),
+                    'sales_count': int(r.sales_count),
+                    'revenue': float(r.revenue or 0)
+                }
+                for r in hours
+            ],
+            'time_series': [
+                {
+                    'period': r.day.isoformat(),
+                    'value': float(r.revenue) if r.revenue else 0
+                }
+                for r in days
+            ]
+        }
+        
+        if approximate:
+            overview['metrics']['margins'] = margins(totals, ('revenue', 'sales_count', 'avg_ticket'))
+            for row, r in zip(overview['channel_performance'], channels):
+                row['margins'] = margins(r, ('revenue', 'sales_count', 'avg_ticket'))
+            for row, r in zip(overview['hourly_distribution'], hours):
+                row['margins'] = margins(r, ('revenue', 'sales_count'))
+            for row, r in zip(overview['time_series'], days):
+                row['margin'] = margins(r, ('revenue',))['revenue']
+        
+        return overview
+    
+    def _get_columnar_overview(self, view, approximate: bool = False) -> Dict[str, Any]:
+        """Overview aggregates from a columnar view, shaped like the GROUPING SETS result
+        
+        The view is exact, so approximate=True only adds margins of 0 to keep
+        the response shape of the sampled path.
+        """
+        dimensions = self._dimensions()
+        totals = view.totals()
+        
+        overview = {
+            'metrics': {
+                'revenue': totals['revenue'],
+                'sales_count': totals['sales_count'],
+                'avg_ticket': columnar_metric(totals, 'avg_ticket'),
+                'total_discount': totals['total_discount'],
+                'previous': None
+            },
+            'channel_performance': [
+                {
+                    'channel_id': r['channel_id'],
+                    'channel_name': dimensions.name('channels', r['channel_id']),
+                    'sales_count': r['sales_count'],
+                    'revenue': r['revenue'],
+                    'avg_ticket': columnar_metric(r, 'avg_ticket'),
+                    'total_discount': r['total_discount']
+                }
+                for r in view.group('channel_id')
+            ],
+            'hourly_distribution': [
+                {'hour': r['hour'], 'sales_count': r['sales_count'], 'revenue': r['revenue']}
+                for r in view.group('hour')
+            ],
+            'time_series': [
+                {'period': r['period'].date().isoformat(), 'value': r['revenue']}
+                for r in view.buckets('day')
+            ]
+        }
+        
+        if approximate:
+            overview['metrics']['margins'] = dict.fromkeys(('revenue', 'sales_count', 'avg_ticket'), 0)
+            for row in overview['channel_performance']:
+                row['margins'] = dict.fromkeys(('revenue', 'sales_count', 'avg_ticket'), 0)
+            for row in overview['hourly_distribution']:
+                row['margins'] = dict.fromkeys(('revenue', 'sales_count'), 0)
+            for row in overview['time_series']:
+                row['margin'] = 0
+        
+        return overview
+    
     def get_time_series(
         self,
         metric: str,
         time_bucket: str = 'day',
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        approximate: bool = False
     ) -> List[Dict[str, Any]]:
         """Get time series data"""
         
+        if metric in FACT_METRICS:
+            return self._get_fact_time_series(metric, time_bucket, filters, approximate)
+        
         # Determine time bucket
         if time_bucket == 'hour':
             time_expr = func.date_trunc('hour', models.Sale.created_at)
@@ -93,78 +388,115 @@ class QueryService:
         metric: str,
         group_by: List[str],
         filters: Optional[Dict] = None,
-        limit: int = 100
+        limit: int = 100,
+        approximate: bool = False
     ) -> List[Dict[str, Any]]:
-        """Get aggregated data by dimensions"""
+        """Get aggregated data by any combination of dimensions in one statement
         
-        metric_expr = self._get_metric_expression(metric)
-        group_expressions = []
-        group_labels = []
-        
-        # Build group by expressions
-        for dimension in group_by:
-            if dimension == 'store':
-                group_expressions.append(models.Store.name)
-                group_labels.append('store_name')
-                query = self.db.query(
-                    models.Store.name.label('store_name'),
-                    metric_expr.label('value')
-                ).join(models.Sale.store)
-            elif dimension == 'channel':
-                group_expressions.append(models.Channel.name)
-                group_labels.append('channel_name')
-                query = self.db.query(
-                    models.Channel.name.label('channel_name'),
-                    metric_expr.label('value')
-                ).join(models.Sale.channel)
-            elif dimension == 'product':
-                group_expressions.append(models.Product.name)
-                group_labels.append('product_name')
-                query = self.db.query(
-                    models.Product.name.label('product_name'),
-                    metric_expr.label('value')
-                ).join(models.ProductSale).join(models.ProductSale.product)
-            elif dimension == 'weekday':
-                weekday_expr = extract('dow', models.Sale.created_at)
-                group_expressions.append(weekday_expr)
-                group_labels.append('weekday')
-                query = self.db.query(
-                    weekday_expr.label('weekday'),
-                    metric_expr.label('value')
-                )
-            elif dimension == 'hour':
-                hour_expr = extract('hour', models.Sale.created_at)
-                group_expressions.append(hour_expr)
-                group_labels.append('hour')
-                query = self.db.query(
-                    hour_expr.label('hour'),
-                    metric_expr.label('value')
-                )
-            else:
-                continue
+        approximate=True samples sales for the sales-facts metrics; product
+        dimensions and raw-only metrics are always exact.
+        """
         
-        if not group_expressions:
+        built = self.build_aggregation_query(metric, group_by, filters, limit, approximate)
+        if built is None:
             return []
         
-        query = query.filter(models.Sale.sale_status_desc == 'COMPLETED')
+        query, dimensions, approximate = built
+        results = query.all()
+        names = self._dimensions()
         
-        if filters:
-            query = self._apply_filters(query, filters)
+        return [self.format_aggregation_row(names, metric, dimensions, r, approximate) for r in results]
+    
+    def build_aggregation_query(
+        self,
+        metric: str,
+        group_by: List[str],
+        filters: Optional[Dict] = None,
+        limit: Optional[int] = 100,
+        approximate: bool = False
+    ):
+        """Build the get_aggregation query without running it
         
-        for expr in group_expressions:
-            query = query.group_by(expr)
+        Returns (query, dimensions, approximate), where approximate is False
+        if the chosen source cannot be sampled, or None for no known dimension.
+        """
+        dimensions = [DIMENSIONS[name] for name in dict.fromkeys(group_by) if name in DIMENSIONS]
+        if not dimensions:
+            return None
         
-        query = query.order_by(metric_expr.desc()).limit(limit)
+        needs_products = any('product_sales' in d.get('joins', ()) for d in dimensions)
         
-        results = query.all()
+        # Pick the narrowest source that can answer the metric exactly
+        if needs_products and metric in PRODUCT_METRICS:
+            approximate = False
+            facts = self._product_facts(filters)
+            metric_expr = self._get_product_metric_expression(facts, metric)
+            columns, time_column = facts.c, facts.c.sale_created_at
+            query = self.db.query(metric_expr.label('value'))
+        elif not needs_products and metric in FACT_METRICS:
+            facts = self._sample_facts(filters) if approximate else self._sales_facts(filters)
+            metric_expr = self._get_fact_metric_expression(facts, metric)
+            columns, time_column = facts.c, facts.c.bucket
+            query = self.db.query(metric_expr.label('value'))
+            if approximate:
+                query = query.add_columns(*self._get_sample_sums(facts))
+        else:
+            approximate = False
+            metric_expr = self._get_metric_expression(metric)
+            columns, time_column = RAW_DIMENSION_COLUMNS, models.Sale.created_at
+            query = self.db.query(metric_expr.label('value')).select_from(models.Sale)
+            for join in dict.fromkeys(j for d in dimensions for j in d.get('joins', ())):
+                query = query.join(*RAW_JOINS[join])
+            query = query.filter(models.Sale.sale_status_desc == 'COMPLETED')
+            if filters:
+                query = self._apply_filters(query, filters)
+                if needs_products:
+                    query = self._apply_partition_window(query, models.ProductSale.sale_created_at, filters)
         
-        return [
-            {
-                **{label: getattr(r, label) for label in group_labels},
-                'value': float(r.value) if r.value else 0
-            }
-            for r in results
-        ]
+        group_expressions = []
+        for dimension in dimensions:
+            if 'column' in dimension:
+                expr = columns[dimension['column']]
+            elif dimension['time_part'] == 'date':
+                expr = cast(time_column, Date)
+            else:
+                expr = extract(dimension['time_part'], time_column)
+            group_expressions.append(expr.label(dimension['label']))
+        
+        query = query.add_columns(*group_expressions).group_by(
+            *group_expressions
+        ).order_by(metric_expr.desc()).limit(limit)
+        
+        return query, dimensions, approximate
+    
+    def format_aggregation_row(self, names, metric: str, dimensions: List[Dict], r, approximate: bool) -> Dict[str, Any]:
+        """Shape a row of build_aggregation_query as returned by get_aggregation"""
+        def value_of(value):
+            if hasattr(value, 'isoformat'):
+                return value.isoformat()
+            return int(value) if value is not None else None
+        
+        return {
+            **self._label_dimensions(names, {
+                d['label']: value_of(getattr(r, d['label'])) for d in dimensions
+            }),
+            'value': float(r.value) if r.value else 0,
+            **({'margin': sample_margin(metric, r.sample_count, r.sample_revenue, r.sample_revenue_sq)} if approximate else {})
+        }
+    
+    def build_export_query(self, table: str, filters: Optional[Dict] = None):
+        """Select the RAW_EXPORTS columns of a raw table matching filters, without running it"""
+        filters = filters or {}
+        query = select(*RAW_EXPORTS[table])
+        if table == 'product_sales':
+            query = query.join(models.Sale, and_(
+                models.Sale.id == models.ProductSale.sale_id,
+                models.Sale.created_at == models.ProductSale.sale_created_at
+            ))
+            query = self._apply_partition_window(query, models.ProductSale.sale_created_at, filters)
+            if filters.get('product_ids'):
+                query = query.where(models.ProductSale.product_id.in_(filters['product_ids']))
+        return self._apply_filters(query, filters)
     
     def get_top_products(
         self,
@@ -174,41 +506,26 @@ class QueryService:
     ) -> List[Dict[str, Any]]:
         """Get top products"""
         
-        if order_by == 'revenue':
-            metric = func.sum(models.ProductSale.total_price).label('value')
-        elif order_by == 'quantity':
-            metric = func.sum(models.ProductSale.quantity).label('value')
-        else:
-            metric = func.count(models.ProductSale.id).label('value')
+        facts = self._product_facts(filters)
+        metric = self._get_product_metric_expression(facts, order_by).label('value')
         
         query = self.db.query(
-            models.Product.name.label('product_name'),
-            models.Category.name.label('category_name'),
+            facts.c.product_id.label('product_id'),
             metric
-        ).join(
-            models.ProductSale, models.ProductSale.product_id == models.Product.id
-        ).join(
-            models.Category, models.Category.id == models.Product.category_id
-        ).join(
-            models.Sale, models.Sale.id == models.ProductSale.sale_id
-        ).filter(
-            models.Sale.sale_status_desc == 'COMPLETED'
-        )
-        
-        if filters:
-            query = self._apply_filters(query, filters)
-        
-        query = query.group_by(
-            models.Product.name,
-            models.Category.name
+        ).group_by(
+            facts.c.product_id
         ).order_by(metric.desc()).limit(limit)
         
         results = query.all()
+        dimensions = self._dimensions()
         
         return [
             {
-                'product_name': r.product_name,
-                'category_name': r.category_name,
+                'product_id': r.product_id,
+                'product_name': dimensions.name('products', r.product_id),
+                'category_name': dimensions.name(
+                    'categories', dimensions.get('products', r.product_id).get('category_id')
+                ),
                 'value': float(r.value) if r.value else 0
             }
             for r in results
@@ -220,20 +537,21 @@ class QueryService:
     ) -> List[Dict[str, Any]]:
         """Get sales distribution by hour"""
         
-        hour_expr = extract('hour', models.Sale.created_at)
+        view = self._columnar_view(filters)
+        if view is not None:
+            return [
+                {'hour': r['hour'], 'sales_count': r['sales_count'], 'revenue': r['revenue']}
+                for r in view.group('hour')
+            ]
+        
+        facts = self._sales_facts(filters)
+        hour_expr = extract('hour', facts.c.bucket)
         
         query = self.db.query(
             hour_expr.label('hour'),
-            func.count(models.Sale.id).label('sales_count'),
-            func.sum(models.Sale.total_amount).label('revenue')
-        ).filter(
-            models.Sale.sale_status_desc == 'COMPLETED'
-        )
-        
-        if filters:
-            query = self._apply_filters(query, filters)
-        
-        query = query.group_by('hour').order_by('hour')
+            func.sum(facts.c.sales_count).label('sales_count'),
+            func.sum(facts.c.revenue).label('revenue')
+        ).group_by('hour').order_by('hour')
         
         results = query.all()
         
@@ -252,28 +570,40 @@ class QueryService:
     ) -> List[Dict[str, Any]]:
         """Get performance by channel"""
         
-        query = self.db.query(
-            models.Channel.name.label('channel_name'),
-            func.count(models.Sale.id).label('sales_count'),
-            func.sum(models.Sale.total_amount).label('revenue'),
-            func.avg(models.Sale.total_amount).label('avg_ticket'),
-            func.sum(models.Sale.total_discount).label('total_discount')
-        ).join(
-            models.Sale.channel
-        ).filter(
-            models.Sale.sale_status_desc == 'COMPLETED'
-        )
+        view = self._columnar_view(filters)
+        if view is not None:
+            dimensions = self._dimensions()
+            return [
+                {
+                    'channel_id': r['channel_id'],
+                    'channel_name': dimensions.name('channels', r['channel_id']),
+                    'sales_count': r['sales_count'],
+                    'revenue': r['revenue'],
+                    'avg_ticket': columnar_metric(r, 'avg_ticket'),
+                    'total_discount': r['total_discount']
+                }
+                for r in view.group('channel_id')
+            ]
         
-        if filters:
-            query = self._apply_filters(query, filters)
+        facts = self._daily_facts(filters, 'channel_id')
+        if facts is None:
+            facts = self._sales_facts(filters)
         
-        query = query.group_by(models.Channel.name)
+        query = self.db.query(
+            facts.c.channel_id.label('channel_id'),
+            func.sum(facts.c.sales_count).label('sales_count'),
+            func.sum(facts.c.revenue).label('revenue'),
+            self._get_fact_metric_expression(facts, 'avg_ticket').label('avg_ticket'),
+            func.sum(facts.c.total_discount).label('total_discount')
+        ).group_by(facts.c.channel_id)
         
         results = query.all()
+        dimensions = self._dimensions()
         
         return [
             {
-                'channel_name': r.channel_name,
+                'channel_id': r.channel_id,
+                'channel_name': dimensions.name('channels', r.channel_id),
                 'sales_count': int(r.sales_count),
                 'revenue': float(r.revenue or 0),
                 'avg_ticket': float(r.avg_ticket or 0),
@@ -289,34 +619,45 @@ class QueryService:
     ) -> List[Dict[str, Any]]:
         """Compare store performance"""
         
-        query = self.db.query(
-            models.Store.name.label('store_name'),
-            models.Store.city.label('city'),
-            func.count(models.Sale.id).label('sales_count'),
-            func.sum(models.Sale.total_amount).label('revenue'),
-            func.avg(models.Sale.total_amount).label('avg_ticket')
-        ).join(
-            models.Sale.store
-        ).filter(
-            models.Sale.sale_status_desc == 'COMPLETED'
-        )
+        view = self._columnar_view(filters)
+        if view is not None:
+            dimensions = self._dimensions()
+            stores = sorted(view.group('store_id'), key=lambda r: r['revenue'], reverse=True)[:limit]
+            return [
+                {
+                    'store_id': r['store_id'],
+                    'store_name': dimensions.name('stores', r['store_id']),
+                    'city': dimensions.get('stores', r['store_id']).get('city'),
+                    'sales_count': r['sales_count'],
+                    'revenue': r['revenue'],
+                    'avg_ticket': columnar_metric(r, 'avg_ticket')
+                }
+                for r in stores
+            ]
         
-        if filters:
-            query = self._apply_filters(query, filters)
+        facts = self._daily_facts(filters, 'store_id')
+        if facts is None:
+            facts = self._sales_facts(filters)
         
-        query = query.group_by(
-            models.Store.name,
-            models.Store.city
+        query = self.db.query(
+            facts.c.store_id.label('store_id'),
+            func.sum(facts.c.sales_count).label('sales_count'),
+            func.sum(facts.c.revenue).label('revenue'),
+            self._get_fact_metric_expression(facts, 'avg_ticket').label('avg_ticket')
+        ).group_by(
+            facts.c.store_id
         ).order_by(
-            func.sum(models.Sale.total_amount).desc()
+            func.sum(facts.c.revenue).desc()
         ).limit(limit)
         
         results = query.all()
+        dimensions = self._dimensions()
         
         return [
             {
-                'store_name': r.store_name,
-                'city': r.city,
+                'store_id': r.store_id,
+                'store_name': dimensions.name('stores', r.store_id),
+                'city': dimensions.get('stores', r.store_id).get('city'),
                 'sales_count': int(r.sales_count),
                 'revenue': float(r.revenue or 0),
                 'avg_ticket': float(r.avg_ticket or 0)
@@ -324,6 +665,337 @@ class QueryService:
             for r in results
         ]
     
+    def _get_fact_time_series(
+        self,
+        metric: str,
+        time_bucket: str,
+        filters: Optional[Dict],
+        approximate: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get time series for an additive metric from sales facts
+        
+        Columnar views are exact; with approximate=True their rows get a
+        margin of 0 so the response has the same shape either way.
+        """
+        view = self._columnar_view(filters) if time_bucket in ('hour', 'day', 'week') else None
+        if view is not None:
+            return [
+                {
+                    'period': r['period'].date().isoformat() if time_bucket == 'day' else r['period'].isoformat(),
+                    'value': columnar_metric(r, metric),
+                    **({'margin': 0} if approximate else {})
+                }
+                for r in view.buckets(time_bucket)
+            ]
+        
+        facts = self._sample_facts(filters) if approximate else self._sales_facts(filters)
+        
+        if time_bucket in ('hour', 'week', 'month'):
+            time_expr = func.date_trunc(time_bucket, facts.c.bucket)
+        else:
+            time_expr = cast(facts.c.bucket, Date)
+        
+        query = self.db.query(
+            time_expr.label('period'),
+            self._get_fact_metric_expression(facts, metric).label('value')
+        )
+        if approximate:
+            query = query.add_columns(*self._get_sample_sums(facts))
+        results = query.group_by('period').order_by('period').all()
+        
+        return [
+            {
+                'period': r.period.isoformat() if hasattr(r.period, 'isoformat') else str(r.period),
+                'value': float(r.value) if r.value else 0,
+                **({'margin': sample_margin(metric, r.sample_count, r.sample_revenue, r.sample_revenue_sq)} if approximate else {})
+            }
+            for r in results
+        ]
+    
+    def _get_fact_metric_expression(self, facts, metric: str):
+        """Get SQLAlchemy expression for an additive metric over sales facts"""
+        if metric == 'revenue':
+            return func.sum(facts.c.revenue)
+        elif metric == 'avg_ticket':
+            return func.sum(facts.c.revenue) / func.nullif(func.sum(facts.c.sales_count), 0)
+        elif metric == 'total_discount':
+            return func.sum(facts.c.total_discount)
+        else:
+            return func.sum(facts.c.sales_count)
+    
+    def _columnar_view(self, filters: Optional[Dict]):
+        """Matching completed sales from the columnar store, or None if it does not cover the range
+        
+        Sales inserted since the store's last refresh are read from Postgres
+        by id and added to the view, so results include them like the
+        rollup + raw remainder path does.
+        """
+        if not filters:
+            return None
+        start, end = self._get_date_bounds(filters)
+        if not columnar_store.covers(start):
+            return None
+        
+        data, last_id = columnar_store.snapshot
+        sale = models.Sale
+        recent = select(
+            sale.created_at, sale.store_id, sale.channel_id, sale.total_amount, sale.total_discount
+        ).where(sale.id > last_id, sale.sale_status_desc == 'COMPLETED')
+        recent = self.db.execute(self._apply_filters(recent, filters)).all()
+        return columnar_store.view(filters, start, end, data, recent)
+    
+    def _dimensions(self):
+        """Dimension cache, reloaded first if its version changed"""
+        dimension_cache.ensure_fresh(self.db)
+        return dimension_cache
+    
+    def _label_dimensions(self, dimensions, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach names to the id columns of a grouped row"""
+        for id_label, (dimension, name_label) in DIMENSION_LABELS.items():
+            if id_label in row:
+                row[name_label] = dimensions.name(dimension, row[id_label])
+        return row
+    
+    def _get_product_metric_expression(self, facts, metric: str):
+        """Get SQLAlchemy expression for a metric over product facts"""
+        if metric == 'revenue':
+            return func.sum(facts.c.total_price)
+        elif metric == 'quantity':
+            return func.sum(facts.c.quantity)
+        elif metric == 'sales_count':
+            return func.count(func.distinct(facts.c.sale_id))
+        elif metric == 'avg_ticket':
+            return func.sum(facts.c.total_price) / func.nullif(func.count(func.distinct(facts.c.sale_id)), 0)
+        else:
+            return func.count(facts.c.product_sale_id)
+    
+    def _product_facts(self, filters: Optional[Dict] = None):
+        """Completed product sales with their sale attributes, read from product_sales_fact
+        
+        Rows for sales newer than the fact table's high-water mark are joined
+        from product_sales/sales/products on the fly, so the union is exact.
+        """
+        filters = filters or {}
+        product_sale = models.ProductSale
+        
+        raw = select(
+            product_sale.id.label('product_sale_id'),
+            product_sale.sale_id.label('sale_id'),
+            product_sale.sale_created_at.label('sale_created_at'),
+            models.Sale.store_id.label('store_id'),
+            models.Sale.channel_id.label('channel_id'),
+            product_sale.product_id.label('product_id'),
+            models.Product.category_id.label('category_id'),
+            product_sale.quantity.label('quantity'),
+            product_sale.total_price.label('total_price')
+        ).join(
+            models.Sale, and_(
+                models.Sale.id == product_sale.sale_id,
+                models.Sale.created_at == product_sale.sale_created_at
+            )
+        ).join(
+            models.Product, models.Product.id == product_sale.product_id
+        ).where(models.Sale.sale_status_desc == 'COMPLETED')
+        raw = self._apply_filters(raw, filters)
+        raw = self._apply_partition_window(raw, product_sale.sale_created_at, filters)
+        
+        if not settings.rollup_enabled:
+            return raw.subquery('product_facts')
+        
+        fact = models.ProductSalesFact
+        high_water = select(models.RollupState.last_id).where(
+            models.RollupState.name == PRODUCT_SALES_FACT
+        ).scalar_subquery()
+        
+        stored = select(
+            fact.product_sale_id.label('product_sale_id'),
+            fact.sale_id.label('sale_id'),
+            fact.sale_created_at.label('sale_created_at'),
+            fact.store_id.label('store_id'),
+            fact.channel_id.label('channel_id'),
+            fact.product_id.label('product_id'),
+            fact.category_id.label('category_id'),
+            fact.quantity.label('quantity'),
+            fact.total_price.label('total_price')
+        ).where(fact.sale_status_desc == 'COMPLETED')
+        stored = self._apply_partition_window(stored, fact.sale_created_at, filters)
+        if filters.get('store_ids'):
+            stored = stored.where(fact.store_id.in_(filters['store_ids']))
+        if filters.get('channel_ids'):
+            stored = stored.where(fact.channel_id.in_(filters['channel_ids']))
+        if filters.get('status'):
+            stored = stored.where(fact.sale_status_desc == filters['status'])
+        
+        raw = raw.where(models.Sale.id > func.coalesce(high_water, 0))
+        
+        return union_all(stored, raw).subquery('product_facts')
+    
+    def _sales_facts(self, filters: Optional[Dict] = None):
+        """Completed sales as hourly fact rows, read from the rollup when possible
+        
+        Hour buckets fully inside the date range come from sales_hourly_rollup;
+        partial edge hours and sales newer than the rollup high-water mark are
+        read from the raw table, so the union is exact.
+        """
+        filters = filters or {}
+        
+        raw = select(
+            func.date_trunc('hour', models.Sale.created_at).label('bucket'),
+            models.Sale.store_id.label('store_id'),
+            models.Sale.channel_id.label('channel_id'),
+            literal(1).label('sales_count'),
+            models.Sale.total_amount.label('revenue'),
+            (models.Sale.total_amount * models.Sale.total_amount).label('revenue_sq'),
+            models.Sale.total_discount.label('total_discount')
+        ).where(models.Sale.sale_status_desc == 'COMPLETED')
+        raw = self._apply_filters(raw, filters)
+        
+        if not settings.rollup_enabled:
+            return raw.subquery('sales_facts')
+        
+        start, end = self._get_date_bounds(filters)
+        full_start = ceil_hour(start) if start else None
+        full_end = floor_hour(end) if end else None
+        if full_start and full_end and full_start >= full_end:
+            return raw.subquery('sales_facts')
+        
+        rollup = models.SalesHourlyRollup
+        high_water = select(models.RollupState.last_id).where(
+            models.RollupState.name == SALES_HOURLY
+        ).scalar_subquery()
+        
+        rolled = select(
+            rollup.bucket.label('bucket'),
+            rollup.store_id.label('store_id'),
+            rollup.channel_id.label('channel_id'),
+            rollup.sales_count.label('sales_count'),
+            rollup.revenue.label('revenue'),
+            rollup.revenue_sq.label('revenue_sq'),
+            rollup.total_discount.label('total_discount')
+        ).where(rollup.sale_status_desc == 'COMPLETED')
+        if full_start:
+            rolled = rolled.where(rollup.bucket >= full_start)
+        if full_end:
+            rolled = rolled.where(rollup.bucket < full_end)
+        if filters.get('store_ids'):
+            rolled = rolled.where(rollup.store_id.in_(filters['store_ids']))
+        if filters.get('channel_ids'):
+            rolled = rolled.where(rollup.channel_id.in_(filters['channel_ids']))
+        if filters.get('status'):
+            rolled = rolled.where(rollup.sale_status_desc == filters['status'])
+        
+        remainder = [models.Sale.id > func.coalesce(high_water, 0)]
+        if full_start:
+            remainder.append(models.Sale.created_at < full_start)
+        if full_end:
+            remainder.append(models.Sale.created_at >= full_end)
+        raw = raw.where(or_(*remainder))
+        
+        return union_all(rolled, raw).subquery('sales_facts')
+    
+    def _daily_facts(self, filters: Optional[Dict], key: str):
+        """Completed sales per store_id or channel_id, read from the daily views
+        
+        Whole days before the views' cutoff come from the materialized view;
+        partial edge days, the days since the cutoff and sales above the
+        views' high-water mark are read from raw sales, so the union is
+        exact. None when the views cannot answer the filters or have never
+        been refreshed (everything would be read from raw sales).
+        """
+        filters = filters or {}
+        other_ids = 'channel_ids' if key == 'store_id' else 'store_ids'
+        if not (settings.rollup_enabled and settings.daily_views_enabled):
+            return None
+        if filters.get(other_ids) or filters.get('status') not in (None, 'COMPLETED'):
+            return None
+        
+        start, end = self._get_date_bounds(filters)
+        full_start = ceil_day(start) if start else None
+        full_end = floor_day(end) if end else None
+        if full_start and full_end and full_start >= full_end:
+            return None
+        if self.db.get(models.RollupState, DAILY_VIEWS) is None:
+            return None
+        
+        view = models.SalesDailyStore if key == 'store_id' else models.SalesDailyChannel
+        state = models.RollupState
+        cutoff = select(func.date_trunc('day', state.refreshed_at)).where(state.name == DAILY_VIEWS).scalar_subquery()
+        high_water = select(state.last_id).where(state.name == DAILY_VIEWS).scalar_subquery()
+        
+        materialized = select(
+            getattr(view, key).label(key),
+            view.sales_count.label('sales_count'),
+            view.revenue.label('revenue'),
+            view.total_discount.label('total_discount')
+        ).where(view.day < cutoff)
+        if full_start:
+            materialized = materialized.where(view.day >= full_start.date())
+        if full_end:
+            materialized = materialized.where(view.day < full_end.date())
+        if filters.get(key + 's'):
+            materialized = materialized.where(getattr(view, key).in_(filters[key + 's']))
+        
+        live = select(
+            getattr(models.Sale, key).label(key),
+            literal(1).label('sales_count'),
+            models.Sale.total_amount.label('revenue'),
+            models.Sale.total_discount.label('total_discount')
+        ).where(models.Sale.sale_status_desc == 'COMPLETED')
+        live = self._apply_filters(live, filters)
+        
+        remainder = [models.Sale.id > func.coalesce(high_water, 0), models.Sale.created_at >= cutoff]
+        if full_start:
+            remainder.append(models.Sale.created_at < full_start)
+        if full_end:
+            remainder.append(models.Sale.created_at >= full_end)
+        live = live.where(or_(*remainder))
+        
+        return union_all(materialized, live).subquery('daily_facts')
+    
+    def _sample_facts(self, filters: Optional[Dict]):
+        """Sales facts from a TABLESAMPLE BERNOULLI subset of raw sales
+        
+        Each sampled sale is weighted by 100 / approximate_sample_percent, so
+        the fact metric expressions return scaled-up estimates. Rollups are
+        not read, which keeps wide ranges fast while they are being built.
+        BERNOULLI picks rows independently; SYSTEM would be cheaper but picks
+        whole pages, which holds sales of the same few hours and stores, so
+        estimates and per-row margins were far off on small ranges.
+        """
+        percent = settings.approximate_sample_percent
+        weight = literal(Decimal(100) / Decimal(str(percent)), Numeric)
+        sale = aliased(models.Sale, tablesample(
+            models.Sale.__table__, func.bernoulli(percent), name='sales_sample', seed=literal(SAMPLE_SEED)
+        ))
+        
+        sampled = select(
+            sale.created_at.label('bucket'),
+            sale.store_id.label('store_id'),
+            sale.channel_id.label('channel_id'),
+            weight.label('sales_count'),
+            (sale.total_amount * weight).label('revenue'),
+            (sale.total_amount * sale.total_amount * weight).label('revenue_sq'),
+            (sale.total_discount * weight).label('total_discount')
+        ).where(sale.sale_status_desc == 'COMPLETED')
+        
+        return self._apply_filters(sampled, filters or {}, sale).subquery('sales_facts')
+    
+    def _get_sample_sums(self, facts) -> List:
+        """Weighted sums of a sample facts group that sample_margin needs"""
+        return [
+            func.sum(facts.c.sales_count).label('sample_count'),
+            func.sum(facts.c.revenue).label('sample_revenue'),
+            func.sum(facts.c.revenue_sq).label('sample_revenue_sq')
+        ]
+    
+    def _get_date_bounds(self, filters: Dict):
+        """Get parsed (start, end) datetimes from filters"""
+        date_range = filters.get('date_range') or {}
+        bounds = []
+        for key in ('start_date', 'end_date'):
+            bounds.append(parse_datetime(date_range.get(key)))
+        return bounds[0], bounds[1]
+    
     def _get_metric_expression(self, metric: str):
         """Get SQLAlchemy expression for metric"""
         if metric == 'revenue':
@@ -341,35 +1013,38 @@ class QueryService:
         else:
             return func.count(models.Sale.id)
     
-    def _apply_filters(self, query, filters: Dict):
+    def _apply_filters(self, query, filters: Dict, sale=models.Sale):
         """Apply filters to query"""
         if filters.get('date_range'):
             date_range = filters['date_range']
             if date_range.get('start_date'):
-                start_date = date_range['start_date']
-                # Convert string to datetime if needed
-                if isinstance(start_date, str):
-                    start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(models.Sale.created_at >= start_date)
+                start_date = parse_datetime(date_range['start_date'])
+                query = query.filter(sale.created_at >= start_date)
             if date_range.get('end_date'):
-                end_date = date_range['end_date']
-                # Convert string to datetime if needed
-                if isinstance(end_date, str):
-                    end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(models.Sale.created_at <= end_date)
+                end_date = parse_datetime(date_range['end_date'])
+                query = query.filter(sale.created_at <= end_date)
         
         if filters.get('store_ids'):
-            query = query.filter(models.Sale.store_id.in_(filters['store_ids']))
+            query = query.filter(sale.store_id.in_(filters['store_ids']))
         
         if filters.get('channel_ids'):
-            query = query.filter(models.Sale.channel_id.in_(filters['channel_ids']))
+            query = query.filter(sale.channel_id.in_(filters['channel_ids']))
         
         if filters.get('status'):
-            query = query.filter(models.Sale.sale_status_desc == filters['status'])
+            query = query.filter(sale.sale_status_desc == filters['status'])
         
         return query
     
-    def _get_previous_period_query(self, filters: Dict):
+    def _apply_partition_window(self, query, column, filters: Dict):
+        """Repeat the date range on a child table's partition key so its partitions are pruned too"""
+        date_range = filters.get('date_range') or {}
+        if date_range.get('start_date'):
+            query = query.filter(column >= parse_datetime(date_range['start_date']))
+        if date_range.get('end_date'):
+            query = query.filter(column <= parse_datetime(date_range['end_date']))
+        return query
+    
+    def _get_previous_period_query(self, filters: Dict, approximate: bool = False):
         """Get query for previous period comparison"""
         date_range = filters.get('date_range', {})
         start = date_range.get('start_date')
@@ -379,10 +1054,8 @@ class QueryService:
             return None
         
         # Convert strings to datetime if needed
-        if isinstance(start, str):
-            start = datetime.fromisoformat(start.replace('Z', '+00:00'))
-        if isinstance(end, str):
-            end = datetime.fromisoformat(end.replace('Z', '+00:00'))
+        start = parse_datetime(start)
+        end = parse_datetime(end)
         
         # Calculate period length
         period_length = (end - start).days
@@ -395,10 +1068,10 @@ class QueryService:
             'end_date': prev_end
         }
         
-        query = self.db.query(
-            func.sum(models.Sale.total_amount).label('total_revenue'),
-            func.count(models.Sale.id).label('total_sales'),
-            func.avg(models.Sale.total_amount).label('avg_ticket')
-        ).filter(models.Sale.sale_status_desc == 'COMPLETED')
+        facts = self._sample_facts(prev_filters) if approximate else self._sales_facts(prev_filters)
         
-        return self._apply_filters(query, prev_filters)
+        return self.db.query(
+            func.sum(facts.c.revenue).label('total_revenue'),
+            func.sum(facts.c.sales_count).label('total_sales'),
+            self._get_fact_metric_expression(facts, 'avg_ticket').label('avg_ticket')
+        )
@@ -0,0 +1,274 @@
+"""Hourly sales rollups and product sales facts with incremental refresh"""
+from sqlalchemy import func, select, insert, delete, and_, or_
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+import threading
+import time
+
+from config import settings
+from database import engine, SessionLocal
+import models
+
+SALES_HOURLY = 'sales_hourly'
+PRODUCT_SALES_FACT = 'product_sales_fact'
+
+# rollup_state row of the daily views (daily_views.py)
+DAILY_VIEWS = 'sales_daily'
+
+# rollup_state row whose refreshed_at is when generate_data.py finished a
+# load. Parallel shards commit lower ids after higher ones with past
+# created_at, so anything built from an id high-water mark before that
+# may have skipped sales for good and is rebuilt.
+SALES_LOADED = 'sales_loaded'
+
+# Arbitrary key for pg_advisory_xact_lock so only one worker refreshes at a time
+REFRESH_LOCK_ID = 7301001
+
+
+def ensure_tables():
+    """Create rollup tables on databases initialized before they existed"""
+    models.SalesHourlyRollup.__table__.create(bind=engine, checkfirst=True)
+    models.ProductSalesFact.__table__.create(bind=engine, checkfirst=True)
+    models.RollupState.__table__.create(bind=engine, checkfirst=True)
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    floored = floor_hour(value)
+    return floored if floored == value else floored + timedelta(hours=1)
+
+
+def _merge_hours(hours: List[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Collapse hour buckets into contiguous [start, end) ranges"""
+    ranges = []
+    for hour in sorted(hours):
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1][1] = hour + timedelta(hours=1)
+        else:
+            ranges.append([hour, hour + timedelta(hours=1)])
+    return [(start, end) for start, end in ranges]
+
+
+class RollupService:
+    """Maintains sales_hourly_rollup from a high-water mark on sales.id
+    
+    Every refresh recomputes whole hour buckets: the ones touched by sales
+    inserted since the last refresh, plus a lookback window by created_at
+    that catches status changes and late-committed ids. Afterwards the
+    rollup equals the aggregate of all sales with id <= last_id, which is
+    what QueryService relies on when it reads rollup + raw remainder.
+    
+    product_sales_fact follows the same high-water mark in the same
+    transaction, with its own state row. Both start over after a bulk load
+    (see SALES_LOADED).
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def refresh(self, lookback_hours: Optional[int] = None) -> Dict[str, Any]:
+        """Incrementally refresh hourly rollups"""
+        if lookback_hours is None:
+            lookback_hours = settings.rollup_lookback_hours
+        
+        self.db.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_ID)))
+        self.reset_if_loaded()
+        state = self._get_state()
+        previous_id = state.last_id
+        # localtimestamp is the transaction start, no later than the snapshot max(id) is read from
+        high_water, started = self.db.execute(
+            select(func.coalesce(func.max(models.Sale.id), 0), func.localtimestamp())
+        ).one()
+        
+        hour_expr = func.date_trunc('hour', models.Sale.created_at)
+        touched = [
+            r.hour for r in self.db.query(hour_expr.label('hour')).filter(
+                models.Sale.id > previous_id,
+                models.Sale.id <= high_water
+            ).distinct()
+        ]
+        ranges = _merge_hours(touched)
+        if lookback_hours > 0:
+            ranges.append((floor_hour(datetime.now() - timedelta(hours=lookback_hours)), None))
+        
+        if ranges:
+            self._recompute(ranges, high_water)
+        
+        lookback_start = floor_hour(datetime.now() - timedelta(hours=lookback_hours)) if lookback_hours > 0 else None
+        self._refresh_product_facts(high_water, lookback_start)
+        
+        state.last_id = high_water
+        state.refreshed_at = started
+        self.db.commit()
+        
+        return {
+            'previous_id': previous_id,
+            'last_id': high_water,
+            'hours_touched': len(touched),
+            'refreshed_at': state.refreshed_at
+        }
+    
+    def rebuild(self) -> Dict[str, Any]:
+        """Drop all rollup rows and rebuild from scratch"""
+        self.db.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_ID)))
+        self._reset()
+        return self.refresh(lookback_hours=0)
+    
+    def reset_if_loaded(self) -> bool:
+        """Empty the rollups if sales were bulk loaded since they were last refreshed
+        
+        The next refresh then rebuilds them from every sale. The daily views'
+        state row is dropped too, so queries skip the views until they are
+        refreshed from the rebuilt rollups. Callers hold REFRESH_LOCK_ID.
+        """
+        loaded = self.db.get(models.RollupState, SALES_LOADED)
+        state = self._get_state()
+        if loaded is None or (state.refreshed_at is not None and loaded.refreshed_at < state.refreshed_at):
+            return False
+        
+        self._reset()
+        state.refreshed_at = self.db.execute(select(func.localtimestamp())).scalar()
+        self.db.execute(delete(models.RollupState).where(models.RollupState.name == DAILY_VIEWS))
+        self.db.flush()
+        return True
+    
+    def _reset(self):
+        self.db.execute(delete(models.SalesHourlyRollup))
+        self.db.execute(delete(models.ProductSalesFact))
+        self._get_state().last_id = 0
+        self._get_state(PRODUCT_SALES_FACT).last_id = 0
+        self.db.flush()
+    
+    def _get_state(self, name: str = SALES_HOURLY) -> models.RollupState:
+        state = self.db.get(models.RollupState, name)
+        if state is None:
+            state = models.RollupState(name=name, last_id=0)
+            self.db.add(state)
+            self.db.flush()
+        return state
+    
+    def _recompute(self, ranges: List[Tuple[datetime, Optional[datetime]]], high_water: int):
+        """Replace rollup rows for the given hour ranges"""
+        rollup = models.SalesHourlyRollup
+        sale = models.Sale
+        
+        def in_ranges(column):
+            return or_(*[
+                and_(column >= start, column < end) if end else column >= start
+                for start, end in ranges
+            ])
+        
+        self.db.execute(delete(rollup).where(in_ranges(rollup.bucket)))
+        
+        hour_expr = func.date_trunc('hour', sale.created_at)
+        aggregated = select(
+            hour_expr,
+            sale.store_id,
+            sale.channel_id,
+            sale.sale_status_desc,
+            func.count(sale.id),
+            func.coalesce(func.sum(sale.total_amount), 0),
+            func.coalesce(func.sum(sale.total_amount * sale.total_amount), 0),
+            func.coalesce(func.sum(sale.total_discount), 0)
+        ).where(
+            sale.id <= high_water,
+            in_ranges(sale.created_at)
+        ).group_by(
+            hour_expr,
+            sale.store_id,
+            sale.channel_id,
+            sale.sale_status_desc
+        )
+        
+        self.db.execute(insert(rollup).from_select([
+            rollup.bucket,
+            rollup.store_id,
+            rollup.channel_id,
+            rollup.sale_status_desc,
+            rollup.sales_count,
+            rollup.revenue,
+            rollup.revenue_sq,
+            rollup.total_discount
+        ], aggregated))
+    
+    def _refresh_product_facts(self, high_water: int, lookback_start: Optional[datetime]):
+        """Append product facts for new sales and resync the lookback window"""
+        fact = models.ProductSalesFact
+        sale = models.Sale
+        product_sale = models.ProductSale
+        state = self._get_state(PRODUCT_SALES_FACT)
+        
+        pending = sale.id > state.last_id
+        if lookback_start:
+            # Status changes only touch recent sales; replace their rows wholesale
+            self.db.execute(delete(fact).where(fact.sale_created_at >= lookback_start))
+            pending = or_(pending, sale.created_at >= lookback_start)
+        
+        rows = select(
+            product_sale.id,
+            product_sale.sale_created_at,
+            sale.id,
+            sale.store_id,
+            sale.channel_id,
+            sale.sale_status_desc,
+            product_sale.product_id,
+            models.Product.category_id,
+            product_sale.quantity,
+            product_sale.total_price
+        ).join(
+            sale, and_(
+                sale.id == product_sale.sale_id,
+                sale.created_at == product_sale.sale_created_at
+            )
+        ).join(
+            models.Product, models.Product.id == product_sale.product_id
+        ).where(
+            sale.id <= high_water,
+            pending
+        )
+        
+        self.db.execute(insert(fact).from_select([
+            fact.product_sale_id,
+            fact.sale_created_at,
+            fact.sale_id,
+            fact.store_id,
+            fact.channel_id,
+            fact.sale_status_desc,
+            fact.product_id,
+            fact.category_id,
+            fact.quantity,
+            fact.total_price
+        ], rows))
+        
+        state.last_id = high_water
+        state.refreshed_at = datetime.now()
+
+
+def refresh_rollups() -> Dict[str, Any]:
+    """Refresh rollups on a dedicated session"""
+    db = SessionLocal()
+    try:
+        return RollupService(db).refresh()
+    finally:
+        db.close()
+
+
+def start_refresh_loop(interval: Optional[int] = None) -> threading.Thread:
+    """Refresh rollups periodically in a daemon thread"""
+    interval = interval or settings.rollup_refresh_interval
+    
+    def loop():
+        while True:
+            try:
+                refresh_rollups()
+            except Exception as e:
+                print(f"Rollup refresh error: {e}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name="rollup-refresh", daemon=True)
+    thread.start()
+    return thread
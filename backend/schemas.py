@@ -1,7 +1,7 @@
 """Pydantic schemas for API"""
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime, date
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal, Union, Annotated
 
 
 # Filters and Query Schemas
@@ -20,10 +20,11 @@ class QueryFilter(BaseModel):
 
 class AggregationRequest(BaseModel):
     metric: str  # revenue, sales_count, avg_ticket, etc
-    group_by: List[str]  # store, channel, product, date, hour, weekday
+    group_by: List[str]  # any combination of store, channel, product, category, date, hour, weekday
     filters: Optional[QueryFilter] = None
     time_bucket: Optional[str] = None  # day, week, month
     limit: Optional[int] = 100
+    approximate: bool = False  # sampled estimates with 95% margins
 
 
 class TimeSeriesRequest(BaseModel):
@@ -31,6 +32,17 @@ class TimeSeriesRequest(BaseModel):
     filters: Optional[QueryFilter] = None
     time_bucket: str = "day"  # hour, day, week, month
     compare_previous: bool = False
+    approximate: bool = False  # sampled estimates with 95% margins
+
+
+class ExportRequest(BaseModel):
+    format: str = "csv"  # csv, ndjson, parquet
+    filters: Optional[QueryFilter] = None
+
+
+class AggregationExportRequest(AggregationRequest):
+    format: str = "csv"  # csv, ndjson, parquet
+    limit: Optional[int] = None  # every group by default
 
 
 class TopProductsRequest(BaseModel):
@@ -39,6 +51,33 @@ class TopProductsRequest(BaseModel):
     order_by: str = "revenue"  # revenue, quantity, frequency
 
 
+class BatchTimeSeriesQuery(TimeSeriesRequest):
+    id: str
+    type: Literal["time_series"]
+
+
+class BatchAggregationQuery(AggregationRequest):
+    id: str
+    type: Literal["aggregation"]
+
+
+class BatchTopProductsQuery(TopProductsRequest):
+    id: str
+    type: Literal["top_products"]
+
+
+class BatchRequest(BaseModel):
+    queries: List[Annotated[
+        Union[BatchTimeSeriesQuery, BatchAggregationQuery, BatchTopProductsQuery],
+        Field(discriminator="type")
+    ]] = Field(max_length=50)
+
+
+class CacheInvalidationRequest(BaseModel):
+    tags: List[str]  # store:<id>, date:<yyyy-mm-dd>, month:<yyyy-mm>, metric:<name>
+    match_all: bool = False  # only entries carrying every tag
+
+
 class CustomQueryRequest(BaseModel):
     """Flexible query builder"""
     select: List[str]  # Fields to select
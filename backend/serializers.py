@@ -0,0 +1,129 @@
+"""Serializers for cached payloads
+
+Encoded payloads start with a 3-byte header: a magic byte, the format tag
+and the compression tag. Payloads without the magic byte are plain JSON
+written before this header existed and are still decoded.
+"""
+import json
+import zlib
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # optional dependency
+    lz4_frame = None
+
+MAGIC = 0xFE
+
+
+class JsonSerializer:
+    tag = b'j'
+    
+    def dumps(self, value: Any) -> bytes:
+        return json.dumps(value, default=str).encode()
+    
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    tag = b'o'
+    
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer:
+    tag = b'm'
+    
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=str, use_bin_type=True)
+    
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class NoCompression:
+    tag = b'-'
+    
+    def compress(self, data: bytes) -> bytes:
+        return data
+    
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompression:
+    tag = b'z'
+    
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 6)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Lz4Compression:
+    tag = b'l'
+    
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+    
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+SERIALIZERS: Dict[str, Any] = {'json': JsonSerializer()}
+if orjson is not None:
+    SERIALIZERS['orjson'] = OrjsonSerializer()
+if msgpack is not None:
+    SERIALIZERS['msgpack'] = MsgpackSerializer()
+
+COMPRESSIONS: Dict[str, Any] = {'none': NoCompression(), 'zlib': ZlibCompression()}
+if lz4_frame is not None:
+    COMPRESSIONS['lz4'] = Lz4Compression()
+
+_SERIALIZERS_BY_TAG = {s.tag: s for s in SERIALIZERS.values()}
+_COMPRESSIONS_BY_TAG = {c.tag: c for c in COMPRESSIONS.values()}
+
+
+class PayloadCodec:
+    """Encodes values with the configured format, compressing large payloads"""
+    
+    def __init__(self, serializer: str = 'json', compression: str = 'none', compress_min_bytes: int = 1024):
+        if serializer not in SERIALIZERS:
+            print(f"Cache serializer '{serializer}' unavailable, using json")
+        if compression not in COMPRESSIONS:
+            print(f"Cache compression '{compression}' unavailable, using zlib")
+        self.serializer = SERIALIZERS.get(serializer, SERIALIZERS['json'])
+        self.compression = COMPRESSIONS.get(compression, COMPRESSIONS['zlib'])
+        self.compress_min_bytes = compress_min_bytes
+    
+    def encode(self, value: Any) -> bytes:
+        data = self.serializer.dumps(value)
+        compression = COMPRESSIONS['none']
+        if len(data) >= self.compress_min_bytes:
+            compression = self.compression
+        return bytes([MAGIC]) + self.serializer.tag + compression.tag + compression.compress(data)
+    
+    def decode(self, payload: bytes) -> Any:
+        if not payload or payload[0] != MAGIC:
+            return json.loads(payload)
+        serializer = _SERIALIZERS_BY_TAG.get(payload[1:2])
+        compression = _COMPRESSIONS_BY_TAG.get(payload[2:3])
+        if serializer is None or compression is None:
+            raise ValueError(f"Unsupported cache payload format {payload[1:3]!r}")
+        return serializer.loads(compression.decompress(payload[3:]))
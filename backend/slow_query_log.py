@@ -0,0 +1,163 @@
+"""Slow QueryService calls with their SQL, arguments and sampled EXPLAIN ANALYZE plans"""
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import functools
+import inspect
+import itertools
+import queue
+import random
+import re
+import threading
+import time
+
+from sqlalchemy import event, text
+
+from config import settings
+from database import engine
+
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+# Statements executed by the outermost QueryService call of the current context
+current_statements: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar('current_statements', default=None)
+
+
+class SlowQueryLog:
+    """Ring buffer of QueryService calls slower than slow_query_threshold_ms
+    
+    Each entry keeps the call's arguments and its statements. For a sample of
+    entries the slowest SELECT is re-run under EXPLAIN (ANALYZE, BUFFERS) by a
+    background thread on the sync engine, off the request path; the plan and
+    the tables it seq-scans are added to the entry when ready.
+    """
+    
+    def __init__(self, size: Optional[int] = None):
+        self.entries = deque(maxlen=size or settings.slow_query_log_size)
+        self.pending: queue.Queue = queue.Queue(maxsize=10)
+        self._ids = itertools.count(1)
+        self._worker: Optional[threading.Thread] = None
+    
+    def instrument_engine(self, sync_engine):
+        """Collect statements executed inside instrumented calls"""
+        
+        @event.listens_for(sync_engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if current_statements.get() is not None:
+                conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+        
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements = current_statements.get()
+            if statements is None or not conn.info.get('slow_query_started'):
+                return
+            statements.append({
+                'sql': statement,
+                'parameters': parameters,
+                'clause': context.compiled.statement if context.compiled is not None else None,
+                'duration_ms': (time.perf_counter() - conn.info['slow_query_started'].pop()) * 1000
+            })
+    
+    def instrument(self, cls, names: List[str]):
+        """Time the given methods of cls and log the slow calls"""
+        for name in names:
+            setattr(cls, name, self._wrap(getattr(cls, name)))
+    
+    def record(self, method: str, arguments: Dict[str, Any], duration_ms: float, statements: List[Dict[str, Any]]):
+        entry = {
+            'id': next(self._ids),
+            'method': method,
+            'captured_at': datetime.now().isoformat(),
+            'duration_ms': round(duration_ms, 1),
+            'arguments': arguments,
+            'statements': [
+                {'sql': s['sql'], 'parameters': _jsonable(s['parameters']), 'duration_ms': round(s['duration_ms'], 1)}
+                for s in statements
+            ],
+            'plan': None,
+            'seq_scans': None
+        }
+        self.entries.append(entry)
+        
+        selects = [s for s in statements if s['clause'] is not None and s['sql'].lstrip()[:6].upper() in ('SELECT', 'WITH')]
+        if selects and random.random() < settings.slow_query_sample_rate:
+            try:
+                self.pending.put_nowait((entry, max(selects, key=lambda s: s['duration_ms'])['clause']))
+                self._start_worker()
+            except queue.Full:
+                pass  # plans are best effort; drop while the worker is behind
+    
+    def get_entries(self, limit: int = 50, method: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest first"""
+        entries = [e for e in reversed(self.entries) if method is None or e['method'] == method]
+        return entries[:limit]
+    
+    def explain(self, clause) -> Dict[str, Any]:
+        """EXPLAIN (ANALYZE, BUFFERS) of a statement, rolled back and under a timeout"""
+        sql = str(clause.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+        with engine.connect() as conn:
+            conn.execute(text(f"SET LOCAL statement_timeout = {settings.slow_query_explain_timeout * 1000}"))
+            lines = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")]
+            conn.rollback()
+        return {
+            'explained_sql': sql,
+            'plan': "\n".join(lines),
+            'seq_scans': sorted(set(SEQ_SCAN.findall("\n".join(lines))))
+        }
+    
+    def _wrap(self, method):
+        signature = inspect.signature(method)
+        
+        @functools.wraps(method)
+        def logged(*args, **kwargs):
+            # Nested calls are part of the outermost call's entry
+            if current_statements.get() is not None:
+                return method(*args, **kwargs)
+            
+            statements = []
+            token = current_statements.set(statements)
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                duration_ms = (time.perf_counter() - started) * 1000
+                current_statements.reset(token)
+                if duration_ms >= settings.slow_query_threshold_ms:
+                    bound = signature.bind(*args, **kwargs)
+                    bound.apply_defaults()
+                    arguments = dict(bound.arguments)
+                    arguments.pop('self', None)
+                    self.record(method.__name__, _jsonable(arguments), duration_ms, statements)
+        
+        return logged
+    
+    def _start_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        
+        def loop():
+            while True:
+                entry, clause = self.pending.get()
+                try:
+                    entry.update(self.explain(clause))
+                except Exception as e:
+                    print(f"Slow query explain error: {e}")
+                    entry['plan'] = f"EXPLAIN failed: {e}"
+        
+        self._worker = threading.Thread(target=loop, name="slow-query-explain", daemon=True)
+        self._worker.start()
+
+
+def _jsonable(value):
+    """Plain copy of arguments and bound parameters for the admin endpoint"""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonable(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+# Global slow-query log instance
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,79 @@
+"""Invalidation tags of cache entries"""
+from datetime import date, datetime, timedelta
+import asyncio
+
+import fakeredis
+from fastapi.testclient import TestClient
+
+from cache_service import MAX_DAY_TAGS, CacheService, build_tags
+
+
+def date_range(start, end):
+    return {'date_range': {'start_date': start, 'end_date': end}}
+
+
+def test_day_tags_up_to_max_day_tags():
+    start = date(2024, 1, 1)
+    end = start + timedelta(days=MAX_DAY_TAGS)
+    tags = build_tags({'store_ids': [3], **date_range(start.isoformat(), end.isoformat())})
+    
+    days = [t for t in tags if t.startswith('date:')]
+    assert len(days) == MAX_DAY_TAGS + 1
+    assert days[0] == "date:2024-01-01" and days[-1] == f"date:{end}"
+    assert not [t for t in tags if t.startswith('month:')]
+
+
+def test_month_tags_past_max_day_tags():
+    start = date(2024, 1, 20)
+    end = start + timedelta(days=MAX_DAY_TAGS + 1)
+    tags = build_tags(date_range(start.isoformat(), end.isoformat()))
+    
+    assert [t for t in tags if t.startswith('month:')] == ["month:2024-01", "month:2024-02", "month:2024-03"]
+    assert not [t for t in tags if t.startswith('date:')]
+
+
+def test_datetime_bounds_tag_their_days():
+    tags = build_tags(date_range("2024-05-01T23:30:00", datetime(2024, 5, 2, 8)))
+    assert tags == ["store:all", "date:2024-05-01", "date:2024-05-02"]
+
+
+def test_store_all_without_store_filter():
+    assert "store:all" in build_tags(date_range("2024-05-01", "2024-05-01"))
+    assert "store:all" in build_tags({'store_ids': [], **date_range("2024-05-01", "2024-05-01")})
+    tags = build_tags({'store_ids': [1, 2]})
+    assert "store:1" in tags and "store:2" in tags and "store:all" not in tags
+
+
+def test_date_all_without_complete_range():
+    assert build_tags(None) == ["store:all", "date:all"]
+    assert "date:all" in build_tags({'date_range': {'start_date': "2024-05-01"}})
+    assert "date:all" in build_tags({'date_range': {'end_date': "2024-05-01"}})
+
+
+def test_metric_tags():
+    assert build_tags({}, ['revenue', 'sales_count'])[:2] == ["metric:revenue", "metric:sales_count"]
+
+
+def test_invalidate_sales_rejects_invalid_date():
+    from main import app
+    
+    response = TestClient(app).post("/api/cache/invalidate/sales", params={'store_id': 1, 'date': "garbage"})
+    assert response.status_code == 422
+
+
+def test_tag_sets_expire_with_their_longest_lived_member():
+    async def run():
+        service = CacheService()
+        # Redis 6 has no EXPIRE NX/GT
+        service.redis_client = fakeredis.FakeAsyncRedis(version=(6, 2))
+        
+        assert await service.set('a', 1, ttl=600, tags=['store:1', 'date:2024-05-01'])
+        assert await service.set('b', 2, ttl=60, tags=['store:1'])
+        assert await service.redis_client.smembers('tag:store:1') == {b'a', b'b'}
+        assert 590 < await service.redis_client.ttl('tag:store:1') <= 600
+        assert 590 < await service.redis_client.ttl('tag:date:2024-05-01') <= 600
+        
+        assert await service.set('c', 3, ttl=900, tags=['store:1'])
+        assert 890 < await service.redis_client.ttl('tag:store:1') <= 900
+    
+    asyncio.run(run())
@@ -0,0 +1,95 @@
+"""Background refreshes and the cache warmer's counters"""
+import asyncio
+
+import fakeredis
+import pytest
+
+import cache_warmer as warmer_module
+from cache_service import CacheService
+from cache_warmer import CacheWarmer
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    service = CacheService()
+    service.redis_client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(warmer_module, 'cache_service', service)
+    return service
+
+
+def computing(value, calls):
+    async def compute():
+        calls.append(value)
+        return value
+    return compute
+
+
+def test_refresh_reports_computed(cache):
+    async def run():
+        calls = []
+        
+        assert await cache.refresh('k', computing(1, calls)) == 'computed'
+        assert (await cache.peek('k'))['value'] == 1
+        assert calls == [1]
+        assert cache.stats['refreshes'] == {'computed': 1, 'skipped': 0, 'failed': 0}
+    
+    asyncio.run(run())
+
+
+def test_refresh_skips_entries_locked_elsewhere(cache):
+    async def run():
+        calls = []
+        await cache.redis_client.set('lock:k', 'other-worker')
+        
+        assert await cache.refresh('k', computing(1, calls)) == 'skipped'
+        assert calls == []
+        assert cache.stats['refreshes'] == {'computed': 0, 'skipped': 1, 'failed': 0}
+    
+    asyncio.run(run())
+
+
+def test_refresh_reports_failures(cache):
+    async def broken():
+        raise ValueError("boom")
+    
+    async def run():
+        assert await cache.refresh('k', broken) == 'failed'
+        assert await cache.peek('k') is None
+        assert cache.stats['refreshes'] == {'computed': 0, 'skipped': 0, 'failed': 1}
+    
+    asyncio.run(run())
+
+
+def test_miss_does_not_join_a_background_refresh(cache, monkeypatch):
+    monkeypatch.setattr('cache_service.settings.cache_lock_timeout', 1)
+    
+    async def run():
+        calls = []
+        await cache.redis_client.set('lock:k', 'other-worker', px=300)
+        
+        # The refresh gives up on the lock; the request waits for it and computes
+        refreshed, value = await asyncio.gather(
+            cache.refresh('k', computing(1, calls)),
+            cache.get_or_compute('k', computing(2, calls))
+        )
+        assert refreshed == 'skipped'
+        assert value == 2
+    
+    asyncio.run(run())
+
+
+def test_warmer_counts_only_recomputed_entries(cache, monkeypatch):
+    monkeypatch.setattr(warmer_module.settings, 'cache_warm_min_score', 1)
+    
+    async def run():
+        calls = []
+        warmer = CacheWarmer()
+        for name in ('free', 'locked'):
+            warmer.track(name, lambda name=name: {'key': name, 'compute': computing(name, calls)})
+        await cache.redis_client.set('lock:locked', 'other-worker')
+        
+        assert await warmer.warm() == 1
+        assert calls == ['free']
+        assert warmer.stats == {'cycles': 1, 'warmed': 1, 'skipped': 1, 'errors': 0}
+    
+    asyncio.run(run())
@@ -0,0 +1,158 @@
+"""Columnar store refresh, bucketing and exactness against Postgres"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, update
+
+from columnar_store import ColumnarStore, ColumnarView, to_epoch, from_epoch
+from query_service import QueryService
+from rollup_service import SALES_LOADED
+import models
+import query_service
+
+
+def make_view(times):
+    created_at = np.array(sorted(to_epoch(t) for t in times), dtype=np.int64)
+    ones = np.ones(len(times))
+    ids = np.ones(len(times), dtype=np.int32)
+    return ColumnarView(created_at, {'store_id': ids, 'channel_id': ids}, ones, ones / 10)
+
+
+def test_epoch_keeps_microseconds():
+    value = datetime(2024, 3, 10, 14, 0, 0, 500000)
+    assert to_epoch(value) > to_epoch(value.replace(microsecond=0))
+    assert from_epoch(to_epoch(value)) == value
+
+
+def test_week_buckets_start_on_monday():
+    view = make_view([
+        datetime(2024, 3, 10, 23, 59),  # Sunday
+        datetime(2024, 3, 11, 0, 0),  # Monday
+        datetime(2024, 3, 17, 12, 0),  # Sunday
+        datetime(2024, 3, 18, 8, 30)  # Monday
+    ])
+    buckets = view.buckets('week')
+    
+    assert [(b['period'], b['sales_count']) for b in buckets] == [
+        (datetime(2024, 3, 4), 1),
+        (datetime(2024, 3, 11), 2),
+        (datetime(2024, 3, 18), 1)
+    ]
+
+
+def test_hour_and_day_buckets():
+    view = make_view([datetime(2024, 3, 10, 9, 5), datetime(2024, 3, 10, 9, 55), datetime(2024, 3, 11, 0, 1)])
+    
+    assert [(b['period'], b['sales_count']) for b in view.buckets('hour')] == [
+        (datetime(2024, 3, 10, 9), 2), (datetime(2024, 3, 11, 0), 1)
+    ]
+    assert [(b['period'], b['sales_count']) for b in view.buckets('day')] == [
+        (datetime(2024, 3, 10), 2), (datetime(2024, 3, 11), 1)
+    ]
+    assert [(g['hour'], g['sales_count']) for g in view.group('hour')] == [(0, 1), (9, 2)]
+
+
+def recent_sales(add_sales, now):
+    """Two old sales outside any lookback and two inside the last hour"""
+    add_sales([
+        (1, now - timedelta(days=3), 1, 1, 'COMPLETED', 10),
+        (2, now - timedelta(days=2), 2, 1, 'COMPLETED', 20),
+        (3, now - timedelta(minutes=30), 1, 2, 'COMPLETED', 30),
+        (4, now - timedelta(minutes=20), 2, 2, 'COMPLETED', 40)
+    ])
+
+
+def test_incremental_refresh_merges_without_duplicates(db, add_sales):
+    now = datetime.now().replace(microsecond=0)
+    recent_sales(add_sales, now)
+    store = ColumnarStore(days=7)
+    assert store.refresh(db, lookback_hours=2)['rows'] == 4
+    
+    # A status change inside the lookback and a new id
+    db.execute(update(models.Sale).where(models.Sale.id == 3).values(sale_status_desc='CANCELLED'))
+    db.commit()
+    add_sales([(5, now - timedelta(minutes=5), 1, 1, 'COMPLETED', 50)])
+    result = store.refresh(db, lookback_hours=2)
+    
+    assert result['fetched'] == 3  # ids 3 and 4 reloaded, 5 appended
+    assert result['rows'] == 5 and result['last_id'] == 5
+    assert sorted(store.data['id'].tolist()) == [1, 2, 3, 4, 5]
+    assert np.all(np.diff(store.data['created_at']) >= 0)
+    assert store.view({}, None, None).totals()['sales_count'] == 4
+
+
+def test_view_includes_sales_newer_than_the_snapshot(db, add_sales, monkeypatch):
+    now = datetime.now().replace(microsecond=0)
+    recent_sales(add_sales, now)
+    store = ColumnarStore(days=7)
+    store.refresh(db, lookback_hours=2)
+    monkeypatch.setattr(query_service, 'columnar_store', store)
+    
+    # Not refreshed yet: one inside the range, one after it, one cancelled
+    add_sales([
+        (5, now - timedelta(days=1), 1, 1, 'COMPLETED', 50),
+        (6, now + timedelta(minutes=1), 1, 1, 'COMPLETED', 60),
+        (7, now - timedelta(days=1), 1, 1, 'CANCELLED', 70)
+    ])
+    filters = {'date_range': {'start_date': (now - timedelta(days=4)).isoformat(), 'end_date': now.isoformat()}}
+    
+    view = QueryService(db)._columnar_view(filters)
+    assert view is not None
+    assert view.totals() == {'sales_count': 5, 'revenue': 150.0, 'total_discount': 15.0}
+    assert np.all(np.diff(view.created_at) >= 0)
+    
+    filters['store_ids'] = [2]
+    assert QueryService(db)._columnar_view(filters).totals()['revenue'] == 60.0
+
+
+def test_refresh_reloads_after_a_bulk_load(db, add_sales):
+    now = datetime.now().replace(microsecond=0)
+    add_sales([(10, now - timedelta(days=2), 1, 1, 'COMPLETED', 100)])
+    store = ColumnarStore(days=7)
+    store.refresh(db, lookback_hours=2)
+    
+    # A lower id committed late by another shard, before the lookback
+    add_sales([(5, now - timedelta(days=3), 1, 1, 'COMPLETED', 50)])
+    store.refresh(db, lookback_hours=2)
+    assert store.data['id'].tolist() == [10]
+    
+    db.merge(models.RollupState(name=SALES_LOADED, last_id=10, refreshed_at=db.execute(select(func.localtimestamp())).scalar()))
+    db.commit()
+    assert store.refresh(db, lookback_hours=2)['fetched'] == 2
+    assert store.data['id'].tolist() == [5, 10]
+    assert store.refresh(db, lookback_hours=2)['fetched'] == 0
+
+
+def shape(value):
+    """Keys of nested dicts, following the first element of lists"""
+    if isinstance(value, dict):
+        return {k: shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shape(v) for v in value[:1]]
+    return None
+
+
+def test_approximate_responses_keep_the_sampled_shape(db, add_sales, monkeypatch):
+    now = datetime.now().replace(microsecond=0)
+    recent_sales(add_sales, now)
+    store = ColumnarStore(days=7)
+    store.refresh(db, lookback_hours=2)
+    monkeypatch.setattr(query_service, 'columnar_store', store)
+    filters = {'date_range': {'start_date': (now - timedelta(days=4)).isoformat(), 'end_date': now.isoformat()}}
+    
+    columnar = (
+        QueryService(db).get_overview_aggregates(filters, approximate=True),
+        QueryService(db).get_time_series('revenue', 'day', filters, approximate=True)
+    )
+    assert columnar[0]['metrics']['margins'] == {'revenue': 0, 'sales_count': 0, 'avg_ticket': 0}
+    assert all(row['margin'] == 0 for row in columnar[1])
+    
+    # Every sale sampled, so each group has rows to compare
+    monkeypatch.setattr(query_service.settings, 'columnar_enabled', False)
+    monkeypatch.setattr(query_service.settings, 'approximate_sample_percent', 100)
+    sampled = (
+        QueryService(db).get_overview_aggregates(filters, approximate=True),
+        QueryService(db).get_time_series('revenue', 'day', filters, approximate=True)
+    )
+    assert shape(columnar) == shape(sampled)
+    assert columnar[0]['metrics']['revenue'] == sampled[0]['metrics']['revenue'] == 100.0
@@ -0,0 +1,27 @@
+"""Dimension labels while another session holds the reload lock"""
+from dimension_cache import DimensionCache
+
+
+def test_first_load_does_not_skip_when_lock_is_held(db):
+    cache = DimensionCache()
+    cache._lock.acquire()
+    try:
+        cache.ensure_fresh(db)
+    finally:
+        cache._lock.release()
+    
+    assert cache.name('stores', 2) == 'Store 2'
+    assert cache.name('channels', 1) == 'Presencial'
+
+
+def test_loaded_data_is_kept_when_lock_is_held(db):
+    cache = DimensionCache()
+    cache.ensure_fresh(db)
+    cache._lock.acquire()
+    try:
+        cache.ensure_fresh(db, force=True)
+    finally:
+        cache._lock.release()
+    
+    assert cache.loads == 1
+    assert cache.name('stores', 1) == 'Store 1'
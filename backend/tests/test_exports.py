@@ -0,0 +1,39 @@
+"""Raw export queries"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+from query_service import QueryService, RAW_EXPORTS
+
+DAY = datetime(2024, 3, 10)
+FILTERS = {'date_range': {'start_date': "2024-03-10T10:00", 'end_date': "2024-03-10T12:00"}, 'store_ids': [1]}
+
+
+def seed(db, add_sales):
+    add_sales([
+        (1, DAY.replace(hour=9), 1, 1, 'COMPLETED', 10),
+        (2, DAY.replace(hour=11), 1, 2, 'COMPLETED', 20),
+        (3, DAY.replace(hour=11), 2, 1, 'COMPLETED', 30),
+        (4, DAY.replace(hour=12), 1, 1, 'CANCELLED', 40)
+    ])
+    db.execute(text("INSERT INTO products (id, brand_id, name) VALUES (1, 1, 'A'), (2, 1, 'B')"))
+    db.execute(text("""
+        INSERT INTO product_sales (id, sale_id, sale_created_at, product_id, quantity, base_price, total_price)
+        SELECT s.id * 10 + p.id, s.id, s.created_at, p.id, 1, 5, 5 FROM sales s CROSS JOIN products p
+    """))
+    db.commit()
+
+
+def test_sales_export_applies_filters(db, add_sales):
+    seed(db, add_sales)
+    rows = db.execute(QueryService(db).build_export_query('sales', FILTERS)).all()
+    
+    assert sorted(r.id for r in rows) == [2, 4]
+    assert list(rows[0]._fields) == [c.key for c in RAW_EXPORTS['sales']]
+
+
+def test_product_sales_export_carries_sale_columns(db, add_sales):
+    seed(db, add_sales)
+    rows = db.execute(QueryService(db).build_export_query('product_sales', {**FILTERS, 'product_ids': [2]})).all()
+    
+    assert sorted((r.sale_id, r.product_id, r.store_id, r.channel_id) for r in rows) == [(2, 2, 1, 2), (4, 2, 1, 1)]
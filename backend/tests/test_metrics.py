@@ -0,0 +1,49 @@
+"""Method instrumentation"""
+import asyncio
+
+import metrics
+
+
+class Service:
+    def outer(self):
+        return self.inner() + 1
+    
+    def inner(self):
+        return 1
+    
+    async def outer_async(self):
+        return await self.inner_async() + 1
+    
+    async def inner_async(self):
+        return 1
+
+
+def instrumented():
+    calls = []
+    
+    class Instrumented(Service):
+        pass
+    
+    metrics.instrument_methods(
+        Instrumented, ['outer', 'inner', 'outer_async', 'inner_async'], lambda name, seconds: calls.append(name)
+    )
+    return Instrumented(), calls
+
+
+def test_nested_calls_are_reported_once():
+    service, calls = instrumented()
+    
+    assert service.outer() == 2
+    assert service.inner() == 1
+    assert calls == ['outer', 'inner']
+
+
+def test_nested_async_calls_are_reported_once():
+    service, calls = instrumented()
+    
+    async def run():
+        await service.outer_async()
+        await asyncio.gather(service.inner_async(), service.inner_async())
+    
+    asyncio.run(run())
+    assert calls == ['outer_async', 'inner_async', 'inner_async']
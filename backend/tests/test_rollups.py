@@ -0,0 +1,155 @@
+"""sales_hourly_rollup plus the raw remainder must equal a plain aggregate over sales"""
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from conftest import hours
+from query_service import QueryService
+from rollup_service import RollupService, DAILY_VIEWS, SALES_HOURLY, SALES_LOADED
+import models
+
+DAY = datetime(2024, 3, 10)
+
+
+def seed(add_sales, first_id=1):
+    """Sales on every quarter hour from 09:00 to 16:45, alternating stores/channels, one in five cancelled"""
+    times = hours(DAY, *[f"{h:02d}:{m:02d}" for h in range(9, 17) for m in (0, 15, 30, 45)])
+    add_sales([
+        (
+            first_id + i,
+            created_at,
+            1 + i % 2,
+            1 + (i // 2) % 2,
+            'CANCELLED' if i % 5 == 0 else 'COMPLETED',
+            10 + i
+        )
+        for i, created_at in enumerate(times)
+    ])
+    return first_id + len(times)
+
+
+def date_filters(start: str, end: str, **filters):
+    return {'date_range': {'start_date': f"{DAY.date()}T{start}", 'end_date': f"{DAY.date()}T{end}"}, **filters}
+
+
+def from_facts(db, filters):
+    facts = QueryService(db)._sales_facts(filters)
+    rows = db.execute(select(
+        facts.c.store_id,
+        facts.c.channel_id,
+        func.sum(facts.c.sales_count),
+        func.sum(facts.c.revenue),
+        func.sum(facts.c.revenue_sq),
+        func.sum(facts.c.total_discount)
+    ).group_by(facts.c.store_id, facts.c.channel_id))
+    return {(r[0], r[1]): tuple(float(v) for v in r[2:]) for r in rows}
+
+
+def from_sales(db, filters):
+    sale = models.Sale
+    query = select(
+        sale.store_id,
+        sale.channel_id,
+        func.count(sale.id),
+        func.sum(sale.total_amount),
+        func.sum(sale.total_amount * sale.total_amount),
+        func.sum(sale.total_discount)
+    ).where(sale.sale_status_desc == 'COMPLETED').group_by(sale.store_id, sale.channel_id)
+    query = QueryService(db)._apply_filters(query, filters)
+    return {(r[0], r[1]): tuple(float(v) for v in r[2:]) for r in db.execute(query)}
+
+
+def assert_exact(db, filters):
+    expected = from_sales(db, filters)
+    assert expected, "scenario selects no sales"
+    assert from_facts(db, filters) == expected
+
+
+def test_partial_edge_hours(db, add_sales):
+    seed(add_sales)
+    RollupService(db).refresh(lookback_hours=0)
+    
+    assert_exact(db, date_filters('10:20', '14:35'))
+    assert_exact(db, date_filters('10:20', '14:35', store_ids=[2], channel_ids=[1]))
+    # Start and end inside the same hour never touch the rollup
+    assert_exact(db, date_filters('11:10', '11:50'))
+
+
+def test_rows_above_high_water_mark(db, add_sales):
+    next_id = seed(add_sales)
+    RollupService(db).refresh(lookback_hours=0)
+    
+    # Not rolled up yet, inside hours the rollup fully covers
+    add_sales([
+        (next_id, DAY.replace(hour=12, minute=5), 1, 1, 'COMPLETED', 500),
+        (next_id + 1, DAY.replace(hour=13, minute=55), 2, 2, 'COMPLETED', 700),
+        (next_id + 2, DAY.replace(hour=13, minute=56), 2, 2, 'CANCELLED', 900)
+    ])
+    
+    assert_exact(db, date_filters('10:20', '14:35'))
+    assert_exact(db, date_filters('12:00', '14:00'))
+
+
+def test_range_ending_exactly_on_an_hour(db, add_sales):
+    next_id = seed(add_sales)
+    add_sales([(next_id, DAY.replace(hour=14), 1, 1, 'COMPLETED', 300)])
+    RollupService(db).refresh(lookback_hours=0)
+    
+    # end_date is inclusive: the sale at 14:00:00 counts, the 14:00 bucket does not
+    filters = date_filters('10:00', '14:00')
+    assert_exact(db, filters)
+    assert from_facts(db, filters) != from_facts(db, date_filters('10:00', '13:59:59'))
+
+
+def test_refresh_after_new_inserts(db, add_sales):
+    next_id = seed(add_sales)
+    RollupService(db).refresh(lookback_hours=0)
+    
+    add_sales([
+        (next_id, DAY.replace(hour=10, minute=7), 1, 2, 'COMPLETED', 42),
+        (next_id + 1, DAY.replace(hour=18, minute=30), 2, 1, 'COMPLETED', 58)
+    ])
+    result = RollupService(db).refresh(lookback_hours=0)
+    
+    assert result['previous_id'] == next_id - 1
+    assert result['last_id'] == next_id + 1
+    assert result['hours_touched'] == 2
+    assert db.get(models.RollupState, SALES_HOURLY).last_id == next_id + 1
+    
+    # The rollup alone now matches the raw aggregate of every hour
+    rollup = models.SalesHourlyRollup
+    rolled = db.execute(select(
+        rollup.store_id, rollup.channel_id, func.sum(rollup.sales_count), func.sum(rollup.revenue)
+    ).where(rollup.sale_status_desc == 'COMPLETED').group_by(rollup.store_id, rollup.channel_id))
+    expected = from_sales(db, {})
+    assert {(r[0], r[1]): (float(r[2]), float(r[3])) for r in rolled} == {k: v[:2] for k, v in expected.items()}
+    
+    assert_exact(db, date_filters('09:30', '19:00'))
+
+
+def mark_sales_loaded(db):
+    """What generate_data.py records when a load finishes"""
+    now = db.execute(select(func.localtimestamp())).scalar()
+    db.merge(models.RollupState(name=SALES_LOADED, last_id=0, refreshed_at=now))
+    db.commit()
+
+
+def test_refresh_rebuilds_after_a_bulk_load(db, add_sales):
+    # A parallel load: the higher id block commits first and gets rolled up
+    seed(add_sales, first_id=100)
+    RollupService(db).refresh(lookback_hours=0)
+    db.add(models.RollupState(name=DAILY_VIEWS, last_id=131))
+    db.commit()
+    seed(add_sales, first_id=1)
+    
+    filters = date_filters('10:20', '14:35')
+    RollupService(db).refresh(lookback_hours=0)
+    assert from_facts(db, filters) != from_sales(db, filters)
+    
+    mark_sales_loaded(db)
+    assert RollupService(db).refresh(lookback_hours=0)['previous_id'] == 0
+    assert_exact(db, filters)
+    assert db.get(models.RollupState, DAILY_VIEWS) is None
+    
+    # Rebuilt once per load
+    assert RollupService(db).refresh(lookback_hours=0)['previous_id'] == 131
@@ -0,0 +1,105 @@
+"""Approximate mode: sampled estimates and their margins of error"""
+from datetime import datetime
+import asyncio
+import json
+
+import fakeredis
+import httpx
+from sqlalchemy import text
+
+from database import async_engine
+from dimension_cache import dimension_cache
+from query_service import QueryService
+import main
+import query_service
+
+FILTERS = {'date_range': {'start_date': "2024-01-01", 'end_date': "2024-01-30T23:59:59"}}
+
+
+def seed_month(db):
+    """20k completed sales every ~2 minutes across January, amounts varying by hour and store"""
+    db.execute(text("""
+        INSERT INTO sales (id, created_at, store_id, channel_id, sale_status_desc, total_amount_items, total_amount, total_discount)
+        SELECT
+            i,
+            timestamp '2024-01-01' + i * interval '129 seconds',
+            1 + i % 2,
+            1 + (i / 7) % 2,
+            'COMPLETED',
+            20 + (i * 37) % 80,
+            20 + (i * 37) % 80,
+            (i * 37) % 80 / 10.0
+        FROM generate_series(1, 20000) AS i
+    """))
+    db.commit()
+
+
+def test_estimates_fall_within_their_margins(db):
+    seed_month(db)
+    exact = QueryService(db).get_overview_aggregates(FILTERS)
+    approximate = QueryService(db).get_overview_aggregates(FILTERS, approximate=True)
+    
+    for metric in ('revenue', 'sales_count', 'avg_ticket'):
+        margin = approximate['metrics']['margins'][metric]
+        assert margin is not None and margin > 0
+        assert abs(approximate['metrics'][metric] - exact['metrics'][metric]) <= margin
+    
+    # Every day is represented, not just the few pages a block sample hits
+    assert len(approximate['time_series']) == len(exact['time_series']) == 30
+
+
+def test_small_groups_get_no_margin(db, monkeypatch):
+    seed_month(db)
+    monkeypatch.setattr(query_service.settings, 'approximate_min_sample_rows', 1000)
+    approximate = QueryService(db).get_overview_aggregates(FILTERS, approximate=True)
+    
+    # About 1000 sampled sales in total, ~35 per day
+    assert all(row['margin'] is None for row in approximate['time_series'])
+    assert query_service.sample_margin('revenue', 100, 5000, 300000) is None
+
+
+PRODUCT_AGGREGATION = {'metric': 'revenue', 'group_by': ['category', 'product'], 'filters': FILTERS, 'approximate': True}
+
+
+def seed_products(db, add_sales):
+    add_sales([(i, datetime(2024, 1, i), 1, 1, 'COMPLETED', 10 * i) for i in range(1, 4)])
+    db.execute(text("INSERT INTO categories (id, brand_id, name) VALUES (1, 1, 'Burgers')"))
+    db.execute(text("INSERT INTO products (id, brand_id, category_id, name) VALUES (1, 1, 1, 'A'), (2, 1, 1, 'B')"))
+    db.execute(text("""
+        INSERT INTO product_sales (id, sale_id, sale_created_at, product_id, quantity, base_price, total_price)
+        SELECT s.id * 10 + p.id, s.id, s.created_at, p.id, 1, p.id * 5, p.id * 5 FROM sales s CROSS JOIN products p
+    """))
+    db.commit()
+    # Earlier tests may have loaded the shared cache without these names
+    dimension_cache.ensure_fresh(db, force=True)
+
+
+def test_product_dimensions_are_exact(db, add_sales, monkeypatch):
+    seed_products(db, add_sales)
+    rows = QueryService(db).get_aggregation('revenue', ['product'], FILTERS, approximate=True)
+    assert [(r['product_id'], r['value']) for r in rows] == [(2, 30.0), (1, 15.0)]
+    assert all('margin' not in r for r in rows)
+    
+    # The endpoints share the builder and the row formatter
+    monkeypatch.setattr(main.cache_service, 'redis_client', fakeredis.FakeAsyncRedis())
+    
+    async def call():
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+                aggregation = await client.post('/api/analytics/aggregation', json=PRODUCT_AGGREGATION)
+                batch = await client.post('/api/analytics/batch', json={
+                    'queries': [{'id': 'a', 'type': 'aggregation', **PRODUCT_AGGREGATION}]
+                })
+                export = await client.post('/api/export/aggregation', json={**PRODUCT_AGGREGATION, 'format': 'ndjson'})
+            return aggregation, batch, export
+        finally:
+            await async_engine.dispose()
+    
+    aggregation, batch, export = asyncio.run(call())
+    expected = [
+        {'category_id': 1, 'product_id': 2, 'category_name': 'Burgers', 'product_name': 'B', 'value': 30.0},
+        {'category_id': 1, 'product_id': 1, 'category_name': 'Burgers', 'product_name': 'A', 'value': 15.0}
+    ]
+    assert aggregation.status_code == 200 and aggregation.json() == expected
+    assert batch.json() == {'results': {'a': expected}, 'errors': {}}
+    assert [json.loads(line) for line in export.text.splitlines()] == expected
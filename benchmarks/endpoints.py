@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark
+Runs the API's read endpoints in-process through the ASGI app (httpx
+ASGITransport) at several concurrency levels, with a cold and a warm cache,
+and reports p50/p95/p99 latency, throughput and DB queries per request.
+Results are checked against benchmarks/baseline.json; any regression makes
+the script exit with status 1.
+
+--seed-data loads a fixed-size, fixed-seed dataset with generate_data.py
+first - it expects an empty database (docker compose down -v).
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+
+import httpx
+from sqlalchemy import event, text
+
+from config import settings
+from database import async_engine, SessionLocal
+from cache_service import cache_service
+from rollup_service import RollupService, ensure_tables
+import main as api
+
+# generate_data.py arguments of the benchmark dataset (~3 months, 10 stores)
+DATASET = {
+    'stores': 10,
+    'products': 100,
+    'items': 50,
+    'customers': 2000,
+    'months': 3,
+    'seed': 20240101
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Absolute slack on top of --tolerance, so millisecond jitter on cache hits and
+# the odd background statement (dimension version checks) are not regressions
+LATENCY_SLACK_MS = 5.0
+QUERY_SLACK = 0.05
+
+
+def date_filters(i: int, days: int = 30) -> dict:
+    """Last `days` days; i shifts the start by i minutes so each cold request misses the cache"""
+    end = datetime.now().replace(second=0, microsecond=0)
+    start = end - timedelta(days=days, minutes=i)
+    return {'date_range': {'start_date': start.isoformat(), 'end_date': end.isoformat()}}
+
+
+def date_params(i: int, days: int = 30) -> dict:
+    date_range = date_filters(i, days)['date_range']
+    return {'start_date': date_range['start_date'], 'end_date': date_range['end_date']}
+
+
+# name -> (method, path, request kwargs for request number i, cache key patterns)
+# Cache keys are cleared before each cold level, so entries left by an earlier
+# level or run are never hit.
+ENDPOINTS = {
+    'health': ('GET', '/api/health', lambda i: {}, ()),
+    'stores': ('GET', '/api/stores', lambda i: {}, ('stores:*',)),
+    'channels': ('GET', '/api/channels', lambda i: {}, ('channels:*',)),
+    'products': ('GET', '/api/products', lambda i: {'params': {'limit': 100}}, ('products:*',)),
+    'categories': ('GET', '/api/categories', lambda i: {}, ('categories:*',)),
+    'overview': ('POST', '/api/dashboard/overview', lambda i: {'params': date_params(i)}, ('dashboard:overview*',)),
+    'time-series': ('POST', '/api/analytics/time-series', lambda i: {'json': {
+        'metric': 'revenue', 'time_bucket': 'day', 'filters': date_filters(i)
+    }}, ('timeseries:*',)),
+    'aggregation': ('POST', '/api/analytics/aggregation', lambda i: {'json': {
+        'metric': 'revenue', 'group_by': ['store', 'channel'], 'filters': date_filters(i)
+    }}, ('aggregation:*',)),
+    'top-products': ('POST', '/api/analytics/top-products', lambda i: {'json': {
+        'filters': date_filters(i), 'limit': 10
+    }}, ('top_products:*',)),
+    'store-comparison': ('POST', '/api/analytics/store-comparison', lambda i: {'params': {
+        **date_params(i), 'limit': 20
+    }}, ('store_comparison:*',)),
+    'insights': ('GET', '/api/analytics/insights', lambda i: {'params': date_params(i)}, ('insights:*',)),
+    'batch': ('POST', '/api/analytics/batch', lambda i: {'json': {'queries': [
+        {'id': 'ts', 'type': 'time_series', 'metric': 'revenue', 'filters': date_filters(i)},
+        {'id': 'channels', 'type': 'aggregation', 'metric': 'revenue', 'group_by': ['channel'], 'filters': date_filters(i)},
+        {'id': 'hours', 'type': 'aggregation', 'metric': 'sales_count', 'group_by': ['hour'], 'filters': date_filters(i)},
+        {'id': 'top', 'type': 'top_products', 'filters': date_filters(i)}
+    ]}}, ('timeseries:*', 'aggregation:*', 'top_products:*'))
+}
+
+# Endpoints whose requests never vary; their keys are also cleared before each cold request
+UNPARAMETERIZED = {'stores', 'channels', 'products', 'categories'}
+
+
+class QueryCounter:
+    """Counts statements sent by the request engine"""
+    
+    def __init__(self):
+        self.count = 0
+    
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def seed_dataset(db_url: str):
+    """Load the benchmark dataset and build rollups from scratch"""
+    command = [sys.executable, os.path.join(ROOT, 'generate_data.py'), '--db-url', db_url, '--vectorized']
+    for name, value in DATASET.items():
+        command += [f'--{name}', str(value)]
+    print(f"Seeding: {' '.join(command[1:])}")
+    subprocess.run(command, check=True)
+    
+    if settings.rollup_enabled:
+        ensure_tables()
+        db = SessionLocal()
+        try:
+            RollupService(db).rebuild()
+        finally:
+            db.close()
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+async def clear_cache(patterns):
+    for pattern in patterns:
+        await cache_service.clear_pattern(pattern)
+
+
+async def server_versions() -> dict:
+    """Redis and PostgreSQL versions the numbers were measured against"""
+    async with async_engine.connect() as conn:
+        postgres = (await conn.execute(text("SHOW server_version"))).scalar()
+    redis_info = await cache_service.redis_client.info('server')
+    return {'postgres': postgres, 'redis': redis_info['redis_version']}
+
+
+async def run_level(client, counter, name, phase, concurrency, requests, first=1):
+    """Send `requests` requests to one endpoint, `concurrency` at a time
+    
+    Cold requests are built with numbers first..first + requests - 1, which
+    the caller keeps distinct across levels so no request repeats another.
+    """
+    method, path, build, cache_patterns = ENDPOINTS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+    
+    if phase == 'warm':
+        await client.request(method, path, **build(0))  # prime
+    
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            kwargs = build(first + i if phase == 'cold' else 0)
+            if phase == 'cold' and name in UNPARAMETERIZED:
+                await clear_cache(cache_patterns)
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+    
+    queries_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    
+    return {
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'mean_ms': statistics.mean(latencies),
+        'throughput_rps': requests / elapsed if elapsed else 0,
+        'queries_per_request': (counter.count - queries_before) / requests,
+        'errors': errors
+    }
+
+
+def budget_for(baseline, key):
+    """Exact endpoint:phase:cN entry, then endpoint:phase, then the phase default"""
+    name, phase, _ = key.split(':')
+    endpoints = baseline.get('endpoints', {})
+    budget = dict(baseline.get('defaults', {}).get(phase, {}))
+    budget.update(endpoints.get(f"{name}:{phase}", {}))
+    budget.update(endpoints.get(key, {}))
+    return budget
+
+
+def check_regressions(results, baseline, tolerance):
+    failures = []
+    for key, result in results.items():
+        budget = budget_for(baseline, key)
+        if result['errors']:
+            failures.append(f"{key}: {result['errors']} error responses")
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if metric in budget and result[metric] > budget[metric] * (1 + tolerance) + LATENCY_SLACK_MS:
+                failures.append(f"{key}: {metric} {result[metric]:.1f} > {budget[metric]:.1f}")
+        if 'queries_per_request' in budget and result['queries_per_request'] > budget['queries_per_request'] + QUERY_SLACK:
+            failures.append(
+                f"{key}: queries/request {result['queries_per_request']:.2f} > {budget['queries_per_request']:.2f}"
+            )
+        if 'min_throughput_rps' in budget and result['throughput_rps'] < budget['min_throughput_rps'] * (1 - tolerance):
+            failures.append(f"{key}: throughput {result['throughput_rps']:.1f} < {budget['min_throughput_rps']:.1f}")
+    return failures
+
+
+def write_baseline(path, baseline, results, versions):
+    """Record measured numbers as per-level budgets, keeping the defaults"""
+    baseline['recorded_with'] = versions
+    endpoints = baseline.setdefault('endpoints', {})
+    for key, result in results.items():
+        endpoints[key] = {
+            'p95_ms': round(result['p95_ms'], 1),
+            'p99_ms': round(result['p99_ms'], 1),
+            'queries_per_request': result['queries_per_request']
+        }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+async def run(args):
+    counter = QueryCounter()
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', counter)
+    
+    # Background refresh loops are not started: they would compete with the measurement
+    api.load_dimensions()
+    
+    results = {}
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=120) as client:
+        for name in args.endpoints.split(','):
+            first = 1
+            for phase in args.phases.split(','):
+                for concurrency in [int(c) for c in args.concurrency.split(',')]:
+                    if phase == 'cold':
+                        cache_service.local.entries.clear()
+                        await clear_cache(ENDPOINTS[name][3])
+                    key = f"{name}:{phase}:c{concurrency}"
+                    results[key] = await run_level(client, counter, name, phase, concurrency, args.requests, first)
+                    if phase == 'cold':
+                        first += args.requests
+                    r = results[key]
+                    print(
+                        f"{name:<18}{phase:<6}{concurrency:>5}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+                        f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>10.1f}{r['queries_per_request']:>10.2f}"
+                    )
+    
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', counter)
+    versions = await server_versions()
+    await async_engine.dispose()
+    return results, versions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark API endpoints in-process against a latency baseline')
+    parser.add_argument('--endpoints', type=str, default=','.join(ENDPOINTS))
+    parser.add_argument('--phases', type=str, default='cold,warm', help='cold: every request misses the cache')
+    parser.add_argument('--concurrency', type=str, default='1,8,32', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=64, help='Requests per endpoint, phase and level')
+    parser.add_argument('--seed-data', action='store_true', help='Load the fixed benchmark dataset first (empty DB)')
+    parser.add_argument('--no-rollup', action='store_true', help='Read raw sales only, bypassing hourly rollups')
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed latency regression (0.2 = 20%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='Write these results as the new baseline')
+    parser.add_argument('--json', type=str, default=None, help='Write full results to this file')
+    args = parser.parse_args()
+    
+    if args.no_rollup:
+        settings.rollup_enabled = False
+    settings.columnar_enabled = False
+    
+    print("=" * 60)
+    print("Endpoint benchmark")
+    print("=" * 60)
+    
+    if args.seed_data:
+        seed_dataset(settings.database_url)
+    
+    print(f"\n{'endpoint':<18}{'phase':<6}{'conc':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}{'queries':>10}")
+    results, versions = asyncio.run(run(args))
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'dataset': DATASET, 'versions': versions, 'results': results}, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+    
+    if args.update_baseline:
+        write_baseline(args.baseline, baseline, results, versions)
+        print(f"✓ Baseline updated: {args.baseline}")
+        return
+    
+    if baseline.get('recorded_with', versions) != versions:
+        print(f"\n⚠ Baseline recorded with {baseline['recorded_with']}, running against {versions}")
+    
+    failures = check_regressions(results, baseline, args.tolerance)
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s) against {args.baseline}:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\n✓ Within baseline ({args.baseline})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Index plan benchmark
+Runs every endpoint's queries under EXPLAIN (ANALYZE, BUFFERS) with each
+index variant in place. Indexes are dropped/created inside a transaction
+that is rolled back, so the database is left untouched (but the sales
+table is locked while it runs - use a dev database).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from config import settings
+from database import engine
+from query_service import QueryService
+import models
+
+# Indexes under test, as declared on models.Sale (mirrors database-schema.sql)
+CANDIDATES = {
+    index.name: index for index in models.Sale.__table__.indexes
+    if index.name in ('idx_sales_completed_covering', 'idx_sales_created_at_brin')
+}
+
+VARIANTS = {
+    'baseline': [],
+    'covering': ['idx_sales_completed_covering'],
+    'brin': ['idx_sales_created_at_brin'],
+    'both': ['idx_sales_completed_covering', 'idx_sales_created_at_brin']
+}
+
+ENDPOINTS = {
+    'overview': lambda qs, f: (
+        qs.get_overview_aggregates(f), qs.get_previous_metrics(f), qs.get_top_products(f, limit=10)
+    ),
+    'time-series': lambda qs, f: qs.get_time_series('revenue', 'day', f),
+    'aggregation': lambda qs, f: qs.get_aggregation('revenue', ['channel'], f),
+    'top-products': lambda qs, f: qs.get_top_products(f, limit=10),
+    'store-comparison': lambda qs, f: qs.get_store_comparison(f, limit=20),
+    'hourly-distribution': lambda qs, f: qs.get_hourly_distribution(f),
+    'channel-performance': lambda qs, f: qs.get_channel_performance(f)
+}
+
+
+def capture_statements(conn, filters):
+    """Run each endpoint once and record the SQL it sends"""
+    captured = {}
+    current = []
+    
+    def record(connection, cursor, statement, parameters, context, executemany):
+        current.append((statement, parameters))
+    
+    event.listen(conn, 'before_cursor_execute', record)
+    try:
+        session = Session(bind=conn)
+        qs = QueryService(session)
+        for name, call in ENDPOINTS.items():
+            current.clear()
+            call(qs, filters)
+            captured[name] = list(current)
+    finally:
+        event.remove(conn, 'before_cursor_execute', record)
+    return captured
+
+
+def explain(conn, statement, parameters):
+    plan = conn.exec_driver_sql(
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+    ).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def plan_indexes(node, found=None):
+    """Collect scan node types and index names used anywhere in a plan"""
+    found = found if found is not None else set()
+    if 'Index Name' in node:
+        found.add(f"{node['Node Type']}:{node['Index Name']}")
+    elif node.get('Node Type', '').endswith('Scan') and 'Relation Name' in node:
+        found.add(f"{node['Node Type']}:{node['Relation Name']}")
+    for child in node.get('Plans', []):
+        plan_indexes(child, found)
+    return found
+
+
+def apply_variant(conn, keep):
+    """Drop candidate indexes not in the variant and create missing ones"""
+    existing = set(conn.exec_driver_sql(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'sales'"
+    ).scalars())
+    for name, index in CANDIDATES.items():
+        if name in keep and name not in existing:
+            conn.execute(CreateIndex(index))
+        elif name not in keep and name in existing:
+            conn.execute(DropIndex(index))
+
+
+def run_variant(conn, captured, keep, runs):
+    results = {}
+    savepoint = conn.begin_nested()
+    try:
+        apply_variant(conn, keep)
+        for endpoint, statements in captured.items():
+            timings = []
+            buffers = 0
+            scans = set()
+            for _ in range(runs):
+                total = 0.0
+                buffers = 0
+                for statement, parameters in statements:
+                    plan = explain(conn, statement, parameters)
+                    total += plan['Planning Time'] + plan['Execution Time']
+                    buffers += plan['Plan'].get('Shared Hit Blocks', 0) + plan['Plan'].get('Shared Read Blocks', 0)
+                    plan_indexes(plan['Plan'], scans)
+                timings.append(total)
+            results[endpoint] = {
+                'ms': statistics.median(timings),
+                'buffers': buffers,
+                'scans': sorted(scans)
+            }
+    finally:
+        savepoint.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare query plans across sales index variants')
+    parser.add_argument('--days', type=int, default=30, help='Date range ending now')
+    parser.add_argument('--store-ids', type=str, default=None, help='Comma-separated store filter')
+    parser.add_argument('--runs', type=int, default=3, help='EXPLAIN ANALYZE runs per endpoint (median)')
+    parser.add_argument('--variants', type=str, default=','.join(VARIANTS))
+    parser.add_argument('--no-rollup', action='store_true', help='Read raw sales only, bypassing hourly rollups')
+    parser.add_argument('--json', type=str, default=None, help='Write full results to this file')
+    args = parser.parse_args()
+    
+    if args.no_rollup:
+        settings.rollup_enabled = False
+    
+    end = datetime.now()
+    filters = {
+        'date_range': {
+            'start_date': (end - timedelta(days=args.days)).isoformat(),
+            'end_date': end.isoformat()
+        }
+    }
+    if args.store_ids:
+        filters['store_ids'] = [int(s) for s in args.store_ids.split(',')]
+    
+    print("=" * 60)
+    print("Index plan benchmark")
+    print("=" * 60)
+    
+    results = {}
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        try:
+            captured = capture_statements(conn, filters)
+            print(f"✓ Captured {sum(len(s) for s in captured.values())} statements from {len(captured)} endpoints")
+            
+            for variant in args.variants.split(','):
+                print(f"\nRunning variant '{variant}'...")
+                results[variant] = run_variant(conn, captured, VARIANTS[variant], args.runs)
+        finally:
+            transaction.rollback()
+    
+    baseline = results.get('baseline')
+    print(f"\n{'endpoint':<22}{'variant':<12}{'ms':>10}{'buffers':>10}{'vs base':>10}")
+    for endpoint in ENDPOINTS:
+        for variant, by_endpoint in results.items():
+            r = by_endpoint[endpoint]
+            speedup = f"{baseline[endpoint]['ms'] / r['ms']:.1f}x" if baseline and r['ms'] else '-'
+            print(f"{endpoint:<22}{variant:<12}{r['ms']:>10.1f}{r['buffers']:>10}{speedup:>10}")
+        for variant, by_endpoint in results.items():
+            print(f"  {variant}: {', '.join(by_endpoint[endpoint]['scans'])}")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'filters': filters, 'results': results}, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -97,8 +97,11 @@ CREATE TABLE customers (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Vendas e tabelas filhas são particionadas por mês em created_at.
+-- A chave de partição precisa fazer parte da PK, então as filhas carregam
+-- sale_created_at e referenciam (id, created_at).
 CREATE TABLE sales (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     store_id INTEGER NOT NULL REFERENCES stores(id),
     sub_brand_id INTEGER REFERENCES sub_brands(id),
     customer_id INTEGER REFERENCES customers(id),
@@ -124,22 +127,27 @@ CREATE TABLE sales (
     
     discount_reason VARCHAR(300),
     increase_reason VARCHAR(300),
-    origin VARCHAR(100) DEFAULT 'POS'
-);
+    origin VARCHAR(100) DEFAULT 'POS',
+    
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 CREATE TABLE product_sales (
-    id SERIAL PRIMARY KEY,
-    sale_id INTEGER NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+    id SERIAL,
+    sale_id INTEGER NOT NULL,
+    sale_created_at TIMESTAMP NOT NULL,
     product_id INTEGER NOT NULL REFERENCES products(id),
     quantity FLOAT NOT NULL,
     base_price FLOAT NOT NULL,
     total_price FLOAT NOT NULL,
-    observations VARCHAR(300)
-);
+    observations VARCHAR(300),
+    PRIMARY KEY (id, sale_created_at),
+    FOREIGN KEY (sale_id, sale_created_at) REFERENCES sales(id, created_at) ON DELETE CASCADE
+) PARTITION BY RANGE (sale_created_at);
 
 CREATE TABLE item_product_sales (
     id SERIAL PRIMARY KEY,
-    product_sale_id INTEGER NOT NULL REFERENCES product_sales(id) ON DELETE CASCADE,
+    product_sale_id INTEGER NOT NULL, -- sem FK: product_sales é particionada
     item_id INTEGER NOT NULL REFERENCES items(id),
     option_group_id INTEGER REFERENCES option_groups(id),
     quantity FLOAT NOT NULL,
@@ -161,8 +169,9 @@ CREATE TABLE item_item_product_sales (
 );
 
 CREATE TABLE delivery_sales (
-    id SERIAL PRIMARY KEY,
-    sale_id INTEGER NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+    id SERIAL,
+    sale_id INTEGER NOT NULL,
+    sale_created_at TIMESTAMP NOT NULL,
     courier_name VARCHAR(200),
     courier_phone VARCHAR(50),
     courier_type VARCHAR(100),
@@ -170,13 +179,15 @@ CREATE TABLE delivery_sales (
     status VARCHAR(100),
     delivery_fee DECIMAL(10,2),
     courier_fee DECIMAL(10,2),
-    mode VARCHAR(100)
-);
+    mode VARCHAR(100),
+    PRIMARY KEY (id, sale_created_at),
+    FOREIGN KEY (sale_id, sale_created_at) REFERENCES sales(id, created_at) ON DELETE CASCADE
+) PARTITION BY RANGE (sale_created_at);
 
 CREATE TABLE delivery_addresses (
     id SERIAL PRIMARY KEY,
-    sale_id INTEGER REFERENCES sales(id),
-    delivery_sale_id INTEGER REFERENCES delivery_sales(id),
+    sale_id INTEGER, -- sem FKs: sales e delivery_sales são particionadas
+    delivery_sale_id INTEGER,
     address_street VARCHAR(200),
     address_number VARCHAR(20),
     address_complement VARCHAR(100),
@@ -196,13 +207,16 @@ CREATE TABLE payment_types (
 );
 
 CREATE TABLE payments (
-    id SERIAL PRIMARY KEY,
-    sale_id INTEGER NOT NULL REFERENCES sales(id) ON DELETE CASCADE,
+    id SERIAL,
+    sale_id INTEGER NOT NULL,
+    sale_created_at TIMESTAMP NOT NULL,
     payment_type_id INTEGER NOT NULL REFERENCES payment_types(id),
     value DECIMAL(10,2) NOT NULL,
     is_online BOOLEAN DEFAULT false,
-    currency VARCHAR(10) DEFAULT 'BRL'
-);
+    currency VARCHAR(10) DEFAULT 'BRL',
+    PRIMARY KEY (id, sale_created_at),
+    FOREIGN KEY (sale_id, sale_created_at) REFERENCES sales(id, created_at) ON DELETE CASCADE
+) PARTITION BY RANGE (sale_created_at);
 
 CREATE TABLE coupons (
     id SERIAL PRIMARY KEY,
@@ -217,12 +231,51 @@ CREATE TABLE coupons (
 
 CREATE TABLE coupon_sales (
     id SERIAL PRIMARY KEY,
-    sale_id INTEGER REFERENCES sales(id),
+    sale_id INTEGER, -- sem FK: sales é particionada
     coupon_id INTEGER REFERENCES coupons(id),
     discount_applied DECIMAL(10,2),
     sponsorship VARCHAR(100)
 );
 
+-- Partições mensais (mantidas por backend/partition_service.py)
+CREATE OR REPLACE FUNCTION create_sales_partitions(from_date DATE, to_date DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_date)::DATE;
+    month_end DATE;
+    parent TEXT;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= to_date LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        FOREACH parent IN ARRAY ARRAY['sales', 'product_sales', 'payments', 'delivery_sales'] LOOP
+            partition_name := parent || '_' || to_char(month_start, 'YYYY_MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, parent, month_start, month_end
+                );
+                created := created + 1;
+            END IF;
+        END LOOP;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partições default recebem datas fora da janela criada
+CREATE TABLE sales_default PARTITION OF sales DEFAULT;
+CREATE TABLE product_sales_default PARTITION OF product_sales DEFAULT;
+CREATE TABLE payments_default PARTITION OF payments DEFAULT;
+CREATE TABLE delivery_sales_default PARTITION OF delivery_sales DEFAULT;
+
+SELECT create_sales_partitions(
+    (CURRENT_DATE - INTERVAL '24 months')::DATE,
+    (CURRENT_DATE + INTERVAL '3 months')::DATE
+);
+
 -- Índices para performance
 CREATE INDEX idx_sales_created_at ON sales(created_at);
 CREATE INDEX idx_sales_store_id ON sales(store_id);
@@ -233,3 +286,78 @@ CREATE INDEX idx_product_sales_sale_id ON product_sales(sale_id);
 CREATE INDEX idx_product_sales_product_id ON product_sales(product_id);
 CREATE INDEX idx_payments_sale_id ON payments(sale_id);
 CREATE INDEX idx_delivery_sales_sale_id ON delivery_sales(sale_id);
+
+-- Vendas concluídas no formato que o QueryService lê: range em created_at,
+-- IN-lists de loja/canal e valores no INCLUDE para index-only scan
+-- (id entra no INCLUDE por causa do filtro de high-water mark dos rollups)
+CREATE INDEX idx_sales_completed_covering ON sales (created_at, store_id, channel_id)
+    INCLUDE (total_amount, total_discount, id)
+    WHERE sale_status_desc = 'COMPLETED';
+
+-- Alternativa compacta para histórico append-only (created_at cresce com a inserção)
+CREATE INDEX idx_sales_created_at_brin ON sales USING brin (created_at) WITH (pages_per_range = 32);
+
+-- Rollups pré-agregados (mantidos por backend/rollup_service.py)
+CREATE TABLE sales_hourly_rollup (
+    bucket TIMESTAMP NOT NULL,
+    store_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    sale_status_desc VARCHAR(100) NOT NULL,
+    sales_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    revenue_sq DECIMAL(24,4) NOT NULL DEFAULT 0,
+    total_discount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, store_id, channel_id, sale_status_desc)
+);
+
+CREATE TABLE product_sales_fact (
+    product_sale_id INTEGER NOT NULL,
+    sale_created_at TIMESTAMP NOT NULL,
+    sale_id INTEGER NOT NULL,
+    store_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    sale_status_desc VARCHAR(100) NOT NULL,
+    product_id INTEGER NOT NULL,
+    category_id INTEGER,
+    quantity FLOAT NOT NULL,
+    total_price FLOAT NOT NULL,
+    PRIMARY KEY (product_sale_id, sale_created_at)
+);
+CREATE INDEX idx_product_sales_fact_completed ON product_sales_fact (sale_created_at, store_id, channel_id)
+    INCLUDE (product_id, category_id, quantity, total_price)
+    WHERE sale_status_desc = 'COMPLETED';
+CREATE INDEX ix_product_sales_fact_product_id ON product_sales_fact (product_id);
+
+CREATE TABLE rollup_state (
+    name VARCHAR(100) PRIMARY KEY,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+-- Vendas concluídas por dia e loja/canal (atualizadas com REFRESH CONCURRENTLY por backend/daily_views.py;
+-- só dias anteriores ao corte registrado em rollup_state 'sales_daily')
+CREATE MATERIALIZED VIEW sales_daily_store_mv AS
+SELECT
+    bucket::date AS day,
+    store_id,
+    sum(sales_count) AS sales_count,
+    sum(revenue) AS revenue,
+    sum(total_discount) AS total_discount
+FROM sales_hourly_rollup
+WHERE sale_status_desc = 'COMPLETED'
+  AND bucket < (SELECT date_trunc('day', refreshed_at) FROM rollup_state WHERE name = 'sales_daily')
+GROUP BY bucket::date, store_id;
+CREATE UNIQUE INDEX sales_daily_store_mv_key ON sales_daily_store_mv (day, store_id);
+
+CREATE MATERIALIZED VIEW sales_daily_channel_mv AS
+SELECT
+    bucket::date AS day,
+    channel_id,
+    sum(sales_count) AS sales_count,
+    sum(revenue) AS revenue,
+    sum(total_discount) AS total_discount
+FROM sales_hourly_rollup
+WHERE sale_status_desc = 'COMPLETED'
+  AND bucket < (SELECT date_trunc('day', refreshed_at) FROM rollup_state WHERE name = 'sales_daily')
+GROUP BY bucket::date, channel_id;
+CREATE UNIQUE INDEX sales_daily_channel_mv_key ON sales_daily_channel_mv (day, channel_id);
@@ -34,12 +34,14 @@ export interface MetricCard {
   title: string;
   value: number;
   change?: number;
+  margin?: number;
   format: string;
 }
 
 export interface TimeSeriesData {
   period: string;
   value: number;
+  margin?: number;
 }
 
 export interface ChannelPerformance {
@@ -84,6 +86,17 @@ export interface DateRange {
   end_date?: string;
 }
 
+export interface BatchQuery {
+  id: string;
+  type: 'time_series' | 'aggregation' | 'top_products';
+  [param: string]: any;
+}
+
+export interface BatchResponse {
+  results: Record<string, any>;
+  errors: Record<string, string>;
+}
+
 // API Functions
 export const getStores = async (): Promise<Store[]> => {
   const response = await api.get('/api/stores');
@@ -103,12 +116,14 @@ export const getProducts = async (limit = 100): Promise<Product[]> => {
 export const getDashboardOverview = async (
   startDate?: string,
   endDate?: string,
-  storeIds?: number[]
+  storeIds?: number[],
+  approximate = false
 ): Promise<DashboardData> => {
   const params: any = {};
   if (startDate) params.start_date = startDate;
   if (endDate) params.end_date = endDate;
   if (storeIds && storeIds.length > 0) params.store_ids = storeIds;
+  if (approximate) params.approximate = true;
 
   const response = await api.post('/api/dashboard/overview', null, { params });
   return response.data;
@@ -117,12 +132,14 @@ export const getDashboardOverview = async (
 export const getTimeSeries = async (
   metric: string,
   timeBucket: string,
-  filters?: any
+  filters?: any,
+  approximate = false
 ): Promise<TimeSeriesData[]> => {
   const response = await api.post('/api/analytics/time-series', {
     metric,
     time_bucket: timeBucket,
     filters,
+    approximate,
   });
   return response.data;
 };
@@ -131,17 +148,39 @@ export const getAggregation = async (
   metric: string,
   groupBy: string[],
   filters?: any,
-  limit = 100
+  limit = 100,
+  approximate = false
 ): Promise<any[]> => {
   const response = await api.post('/api/analytics/aggregation', {
     metric,
     group_by: groupBy,
     filters,
     limit,
+    approximate,
   });
   return response.data;
 };
 
+export const getAnalyticsBatch = async (queries: BatchQuery[]): Promise<BatchResponse> => {
+  const response = await api.post('/api/analytics/batch', { queries });
+  return response.data;
+};
+
+export const exportAggregation = async (
+  metric: string,
+  groupBy: string[],
+  filters?: any,
+  format = 'csv'
+): Promise<Blob> => {
+  const response = await api.post('/api/export/aggregation', {
+    metric,
+    group_by: groupBy,
+    filters,
+    format,
+  }, { responseType: 'blob' });
+  return response.data;
+};
+
 export const getTopProducts = async (
   filters?: any,
   limit = 10,
@@ -2,12 +2,13 @@ import { useQuery } from '@tanstack/react-query';
 import { useState } from 'react';
 import { format, subDays } from 'date-fns';
 import { BarChart, Bar, LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
-import { getAggregation, getTimeSeries } from '../api';
+import { exportAggregation, getAnalyticsBatch } from '../api';
 
 export default function Analytics() {
   const [metric, setMetric] = useState('revenue');
   const [groupBy, setGroupBy] = useState(['channel']);
   const [timeBucket, setTimeBucket] = useState('day');
+  const [approximate, setApproximate] = useState(false);
   const [dateRange, setDateRange] = useState({
     start: format(subDays(new Date(), 30), 'yyyy-MM-dd'),
     end: format(new Date(), 'yyyy-MM-dd'),
@@ -20,15 +21,26 @@ export default function Analytics() {
     },
   };
 
-  const { data: aggregationData, isLoading: aggLoading } = useQuery({
-    queryKey: ['aggregation', metric, groupBy, filters],
-    queryFn: () => getAggregation(metric, groupBy, filters),
-  });
-
-  const { data: timeSeriesData, isLoading: tsLoading } = useQuery({
-    queryKey: ['timeseries', metric, timeBucket, filters],
-    queryFn: () => getTimeSeries(metric, timeBucket, filters),
+  // Both widgets are fetched in one batch request
+  const { data: batch, isLoading } = useQuery({
+    queryKey: ['analytics', metric, groupBy, timeBucket, filters, approximate],
+    queryFn: () => getAnalyticsBatch([
+      { id: 'aggregation', type: 'aggregation', metric, group_by: groupBy, filters, limit: 100, approximate },
+      { id: 'timeseries', type: 'time_series', metric, time_bucket: timeBucket, filters, approximate },
+    ]),
   });
+  const aggregationData: any[] | undefined = batch?.results.aggregation;
+  const timeSeriesData: any[] | undefined = batch?.results.timeseries;
+
+  const handleExport = async () => {
+    const blob = await exportAggregation(metric, groupBy, filters);
+    const url = URL.createObjectURL(blob);
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = `aggregation_${metric}.csv`;
+    link.click();
+    URL.revokeObjectURL(url);
+  };
 
   const metricOptions = [
     { value: 'revenue', label: 'Faturamento' },
@@ -42,6 +54,7 @@ export default function Analytics() {
     { value: 'store', label: 'Loja' },
     { value: 'channel', label: 'Canal' },
     { value: 'product', label: 'Produto' },
+    { value: 'category', label: 'Categoria' },
     { value: 'weekday', label: 'Dia da Semana' },
     { value: 'hour', label: 'Horário' },
   ];
@@ -135,6 +148,11 @@ export default function Analytics() {
             />
           </div>
         </div>
+
+        <label style={{ display: 'flex', alignItems: 'center', gap: '0.5rem', marginTop: '1rem', fontSize: '0.875rem' }}>
+          <input type="checkbox" checked={approximate} onChange={(e) => setApproximate(e.target.checked)} />
+          Modo aproximado (amostragem, resultados com margem de erro de 95%)
+        </label>
       </div>
 
       {/* Results */}
@@ -144,7 +162,7 @@ export default function Analytics() {
           <h3 style={{ fontSize: '1.125rem', fontWeight: '600', marginBottom: '1rem' }}>
             Série Temporal
           </h3>
-          {tsLoading ? (
+          {isLoading ? (
             <div style={{ display: 'flex', justifyContent: 'center', padding: '2rem' }}>
               <div className="spinner" />
             </div>
@@ -167,7 +185,7 @@ export default function Analytics() {
           <h3 style={{ fontSize: '1.125rem', fontWeight: '600', marginBottom: '1rem' }}>
             Agregação por {groupByOptions.find(g => g.value === groupBy[0])?.label}
           </h3>
-          {aggLoading ? (
+          {isLoading ? (
             <div style={{ display: 'flex', justifyContent: 'center', padding: '2rem' }}>
               <div className="spinner" />
             </div>
@@ -189,9 +207,14 @@ export default function Analytics() {
       {/* Data Table */}
       {aggregationData && (
         <div className="card" style={{ marginTop: '1.5rem' }}>
-          <h3 style={{ fontSize: '1.125rem', fontWeight: '600', marginBottom: '1rem' }}>
-            Dados Detalhados
-          </h3>
+          <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1rem' }}>
+            <h3 style={{ fontSize: '1.125rem', fontWeight: '600' }}>
+              Dados Detalhados
+            </h3>
+            <button className="btn btn-secondary" onClick={handleExport}>
+              Exportar CSV
+            </button>
+          </div>
           <div style={{ overflowX: 'auto' }}>
             <table style={{ width: '100%', borderCollapse: 'collapse' }}>
               <thead>
@@ -214,6 +237,7 @@ export default function Analytics() {
                       {metric.includes('revenue') || metric.includes('ticket')
                         ? `R$ ${Number(row.value).toFixed(2)}`
                         : Number(row.value).toFixed(2)}
+                      {row.margin != null && ` ± ${Number(row.margin).toFixed(2)}`}
                     </td>
                   </tr>
                 ))}